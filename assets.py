@@ -0,0 +1,19 @@
+"""
+Process-wide cache of the images and fonts : each file is loaded (and scaled) once and the same Surface is shared by
+all the sprites. Everything is loaded on first use, so headless games and workers never touch the image files.
+"""
+import functools
+import pygame
+
+
+@functools.lru_cache(maxsize=None)
+def get_image(path, size=None):
+    image = pygame.image.load(path)
+    if size is not None:
+        image = pygame.transform.scale(image, size)
+    return image
+
+
+@functools.lru_cache(maxsize=None)
+def get_font(size):
+    return pygame.font.Font(pygame.font.get_default_font(), size)
@@ -0,0 +1,296 @@
+"""
+Benchmarks of the hot paths of the training : steps per second of the games (scalar and vectorised engines) at several
+population sizes, creation and activation of the networks, local views of the monsters, and checkpoints save/restore.
+
+Everything runs headless with fixed seeds on frozen genomes (restored from checkpoints, or created from the neat
+configs with the seed of the run). The results are written as JSON and compared with a baseline, a regression being a
+result worse than the baseline by more than the tolerance:
+
+    python benchmark.py --output benchmark.json --baseline benchmark_baseline.json
+    python benchmark.py --monster-checkpoint checkpoint_monster/checkpoint-50 --update-baseline benchmark_baseline.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+import config
+
+config.HEADLESS = True
+
+from evaluation import create_game, create_player_trajectory
+from main import load_neat_config
+from monster import Monster
+from neat_modified.batch_feed_forward import BatchFeedForwardNetwork
+from neat_modified.checkpoint_reporter import Checkpointer
+from neat_modified.feed_forward import FeedForwardNetwork
+from neat_modified.fixed_topology import ArrayGenome
+from neat_modified.genome_reporter import GenomeReporter
+from neat_modified.hall_of_fame import HallOfFame
+from neat_modified.population import Population
+from player import Player
+from vectorized_game import get_local_views, local_view_windows
+
+
+def best_time(function, repeat: int, number: int = 1) -> float:
+    """Best mean duration (s) of a call of function, over repeat runs of number calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def result(value: float, unit: str, higher_is_better: bool):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def load_genomes(checkpoint, neat_config, directory):
+    """Population restored from a checkpoint, or created from the neat config with the seed of the run."""
+    if checkpoint is not None:
+        return Checkpointer.restore_checkpoint(checkpoint, neat_config)
+    random.seed(config.RUN_SEED)
+    return Population(neat_config, directory)
+
+
+def sized(genomes, size: int):
+    """The first size genomes (the genomes are repeated if there are not enough)."""
+    return [genomes[i % len(genomes)] for i in range(size)]
+
+
+def bench_games(training_number: int, genomes, neat_config, sizes, repeat: int):
+    """Steps per second of the episodes of a training with the scalar and the vectorised engines."""
+    results = {}
+    name = "update_monsters" if training_number % 2 else "update_players"
+    for vectorized in (False, True):
+        config.VECTORIZED_SIMULATION = vectorized
+        engine = "vectorized" if vectorized else "scalar"
+        for size in sizes:
+            episode_genomes = sized(genomes, size)
+            nets = BatchFeedForwardNetwork.create(episode_genomes, neat_config)
+            best_steps_per_sec = 0
+            for _ in range(repeat):
+                for genome in episode_genomes:
+                    genome.fitness = 0
+                player_trajectory = create_player_trajectory(training_number, config.RUN_SEED, 1, 1, [])
+                game = create_game(1, training_number, 1, size, [], player_trajectory, config.RUN_SEED)
+                start = time.perf_counter()
+                game.run_episode(nets, episode_genomes, GenomeReporter(), None)
+                best_steps_per_sec = max(best_steps_per_sec, game.current_step / (time.perf_counter() - start))
+            results[f"game.{name}.{engine}.{size}"] = result(best_steps_per_sec, "steps/s", True)
+    return results
+
+
+def network_topologies(genomes, neat_config):
+    """
+    Smallest, median and largest genomes (enabled connections) of the population, and a grown copy of the largest one
+    (20 added nodes and 40 added connections, seeded) for deeper networks.
+    """
+    by_size = sorted(genomes, key=lambda genome: (sum(c.enabled for c in genome.connections.values()),
+                                                  len(genome.nodes), genome.key))
+    grown = HallOfFame.copy(by_size[-1])
+    random.seed(config.RUN_SEED)
+    for _ in range(20):
+        grown.mutate_add_node(neat_config.genome_config)
+    for _ in range(40):
+        grown.mutate_add_connection(neat_config.genome_config)
+    return {"small": by_size[0], "median": by_size[len(by_size) // 2], "large": by_size[-1], "grown": grown}
+
+
+def bench_networks(prefix: str, genomes, neat_config, sizes, repeat: int):
+    """
+    Creation and activation (single and batched) of the networks of several topologies. The single networks are built
+    from neat genomes, the batch from the genomes of the population (FixedTopologyNetworks for the ArrayGenomes).
+    """
+    results, topologies = {}, {}
+    rng = np.random.default_rng(config.RUN_SEED)
+    num_inputs = neat_config.genome_config.num_inputs
+    neat_genomes = [genome.to_genome(neat_config.genome_config) if isinstance(genome, ArrayGenome) else genome
+                    for genome in genomes]
+    for topology, genome in network_topologies(neat_genomes, neat_config).items():
+        topologies[f"{prefix}.{topology}"] = {
+            "nodes": len(genome.nodes), "connections": sum(c.enabled for c in genome.connections.values())
+        }
+        inputs = rng.uniform(-1, 1, num_inputs).tolist()
+        for compiled in (False, True):
+            suffix = "_compiled" if compiled else ""
+            net = FeedForwardNetwork.create(genome, neat_config, compiled)
+            results[f"network.{prefix}.{topology}.create{suffix}"] = result(
+                1e6 * best_time(lambda: FeedForwardNetwork.create(genome, neat_config, compiled), repeat, 20), "us",
+                False
+            )
+            results[f"network.{prefix}.{topology}.activate{suffix}"] = result(
+                1e6 * best_time(lambda: net.activate(inputs), repeat, 200), "us", False
+            )
+
+    # Whole population activated at once at each step
+    size = max(sizes)
+    batch_genomes = sized(genomes, size)
+    results[f"network.{prefix}.batch_{size}.create"] = result(
+        1e3 * best_time(lambda: BatchFeedForwardNetwork.create(batch_genomes, neat_config), repeat), "ms", False
+    )
+    nets = BatchFeedForwardNetwork.create(batch_genomes, neat_config)
+    batch_inputs = rng.uniform(-1, 1, (size, num_inputs))
+    results[f"network.{prefix}.batch_{size}.activate"] = result(
+        1e6 * best_time(lambda: nets.activate(batch_inputs), repeat, 50), "us", False
+    )
+    return results, topologies
+
+
+def bench_local_views(sizes, repeat: int):
+    """Local views of the monsters : one monster (Monster.get_local_view_optimized) and all of them at once."""
+    results = {}
+    rng = np.random.default_rng(config.RUN_SEED)
+    grid = create_game(1, 1, 1, 0, [], None, config.RUN_SEED).grid
+    positions = rng.integers(
+        [0, config.WINDOW_STATS_HEIGHT],
+        [config.WINDOW_WIDTH - config.IMAGE_SIZE[0], config.WINDOW_HEIGHT - config.IMAGE_SIZE[1]],
+        size=(max(sizes), 2),
+    )
+    monster = Monster(*positions[0], 0)
+    player = Player(*positions[1], 1, np.random.default_rng(config.RUN_SEED))
+    results["local_view.optimized"] = result(
+        1e6 * best_time(lambda: monster.get_local_view_optimized(player, grid).flatten(), repeat, 1000), "us", False
+    )
+    windows = local_view_windows(grid)
+    for size in sizes:
+        rect_x, rect_y = positions[:size, 0], positions[:size, 1]
+        results[f"local_view.vectorized.{size}"] = result(
+            1e6 * best_time(lambda: get_local_views(windows, grid, rect_x, rect_y, *positions[0]), repeat, 200), "us",
+            False
+        )
+    return results
+
+
+def bench_checkpoints(population, neat_config, directory, repeat: int):
+    """Snapshot (on the training thread), complete save and restore of the population, for both formats."""
+    results = {}
+    checkpoint_format = config.CHECKPOINT_FORMAT
+    for checkpoint_format_bench in ("array", "pickle"):
+        config.CHECKPOINT_FORMAT = checkpoint_format_bench
+        checkpoint_dir = os.path.join(directory, f"bench_{checkpoint_format_bench}")
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpointer = Checkpointer(checkpoint_dir)
+        snapshot_times, save_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            checkpointer.save_checkpoint(population)
+            snapshot_times.append(time.perf_counter() - start)
+            checkpointer.wait()
+            save_times.append(time.perf_counter() - start)
+        filename = os.path.join(checkpoint_dir, Checkpointer.list_checkpoints(checkpoint_dir)[-1])
+        restore_time = best_time(lambda: Checkpointer.restore_checkpoint(filename, neat_config), repeat)
+        prefix = f"checkpoint.{checkpoint_format_bench}"
+        results[f"{prefix}.snapshot"] = result(1e3 * min(snapshot_times), "ms", False)
+        results[f"{prefix}.save"] = result(1e3 * min(save_times), "ms", False)
+        results[f"{prefix}.restore"] = result(1e3 * restore_time, "ms", False)
+        results[f"{prefix}.size"] = result(os.path.getsize(filename), "bytes", False)
+    config.CHECKPOINT_FORMAT = checkpoint_format
+    return results
+
+
+def compare(results, baseline, tolerance: float):
+    """
+    Prints the results next to the baseline and returns the names of the regressions. The change is positive when the
+    result is better than the baseline (faster, higher throughput or smaller).
+    """
+    rows, regressions = [], []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None or not base["value"] or not current["value"]:
+            rows.append([name, current["unit"], None, current["value"], None, ""])
+            continue
+        ratio = current["value"] / base["value"]
+        change = ratio - 1 if current["higher_is_better"] else 1 / ratio - 1
+        regression = change < -tolerance
+        if regression:
+            regressions.append(name)
+        rows.append([name, current["unit"], base["value"], current["value"], f"{100 * change:+.1f}%",
+                     "REGRESSION" if regression else ""])
+    print(tabulate(rows, headers=["benchmark", "unit", "baseline", "current", "change", ""], floatfmt=".4g"))
+    return regressions
+
+
+def run_benchmarks(args):
+    directory = tempfile.mkdtemp()
+    try:
+        neat_config_monster = load_neat_config(os.path.join(os.getcwd(), "config_monster.txt"))
+        neat_config_player = load_neat_config(os.path.join(os.getcwd(), "config_player.txt"))
+        monster_population = load_genomes(args.monster_checkpoint, neat_config_monster,
+                                          os.path.join(directory, "checkpoint_monster"))
+        player_population = load_genomes(args.player_checkpoint, neat_config_player,
+                                         os.path.join(directory, "checkpoint_player"))
+        monster_genomes = sorted(monster_population.population.values(), key=lambda genome: genome.key)
+        player_genomes = sorted(player_population.population.values(), key=lambda genome: genome.key)
+        config.MAX_STEP_EPISODE = args.steps
+
+        results = {}
+        results.update(bench_games(1, monster_genomes, neat_config_monster, args.sizes, args.repeat))
+        results.update(bench_games(2, player_genomes, neat_config_player, args.sizes, args.repeat))
+        monster_results, monster_topologies = bench_networks("monster", monster_genomes, neat_config_monster,
+                                                             args.sizes, args.repeat)
+        player_results, player_topologies = bench_networks("player", player_genomes, neat_config_player,
+                                                           args.sizes, args.repeat)
+        results.update(monster_results)
+        results.update(player_results)
+        results.update(bench_local_views(args.sizes, args.repeat))
+        results.update(bench_checkpoints(monster_population, neat_config_monster, directory, args.repeat))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    metadata = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "monster_checkpoint": args.monster_checkpoint,
+        "player_checkpoint": args.player_checkpoint,
+        "steps": args.steps,
+        "sizes": args.sizes,
+        "repeat": args.repeat,
+        "topologies": {**monster_topologies, **player_topologies},
+    }
+    return {"metadata": metadata, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the simulation, network and checkpoint hot paths")
+    parser.add_argument("--monster-checkpoint", default=None,
+                        help="checkpoint of the frozen monster genomes (default : new population from the run seed)")
+    parser.add_argument("--player-checkpoint", default=None,
+                        help="checkpoint of the frozen player genomes (default : new population from the run seed)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 40, 200], help="population sizes of the games")
+    parser.add_argument("--steps", type=int, default=1000, help="maximum number of steps of the benchmark episodes")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each benchmark (the best is kept)")
+    parser.add_argument("--output", default=None, help="JSON file where the results are written")
+    parser.add_argument("--baseline", default=None, help="JSON results the new results are compared with")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown from the baseline reported as a regression")
+    parser.add_argument("--update-baseline", default=None, help="JSON file where the results are saved as baseline")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    for path in (args.output, args.update_baseline):
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(report["results"], baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) : {', '.join(regressions)}")
+        sys.exit(1)
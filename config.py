@@ -6,15 +6,67 @@ NUMBER_GEN_PER_TRAINING = 50
 NUMBER_TRAININGS = 10
 MAX_NUMBER_EPISODE = 5
 NUMBER_NETS_TRAINING = 10
+# Seed of the run : the evolution is seeded with it and the random streams of each episode (random players, monsters
+# without net) are derived from (RUN_SEED, generation, episode)
+RUN_SEED = 10
+# New episodes at each generation, else the same episodes at every generation (see evaluation.episode_seed)
+RESAMPLE_EPISODES = True
+# Number of most fit genomes ever seen kept by the genome reporter (and of best fitnesses kept per generation)
+HALL_OF_FAME_SIZE = 50
+# Simulate the monster trainings with the NumPy engine (VectorizedGame) instead of the sprites
+VECTORIZED_SIMULATION = True
+# Compute the genomic distances of the speciation with NumPy (VectorizedSpeciesSet, same species as neat)
+VECTORIZED_SPECIATION = True
+# Evolve the genomes without hidden nodes as NumPy weight arrays (see neat_modified.fixed_topology)
+FIXED_TOPOLOGY_ENGINE = True
+# Maximum number of networks kept in the network cache (genomes unchanged between generations are built once)
+NETWORK_CACHE_SIZE = 1000
+# Maximum number of (genome, episode) fitnesses in the fitness cache, 0 : no cache (see neat_modified.fitness_cache)
+FITNESS_CACHE_SIZE = 0 if RESAMPLE_EPISODES else 20000
+# Number of worker processes simulating the episodes (1 : everything runs in the main process)
+NUMBER_WORKERS = 1
+# Racing evaluation : stop simulating the genomes unlikely to survive (see evaluation.racing_contenders)
+RACING_EVALUATION = False
+# Number of standard errors of the upper confidence bound of the racing evaluation
+RACING_CONFIDENCE = 2.33
+# Timing of the phases of the steps (init, update, net activation, display and event pump), only 1 step out of
+# STEP_TIMING_SAMPLING_PERIOD is timed
+STEP_TIMING = True
+STEP_TIMING_SAMPLING_PERIOD = 1
+# Append a JSON record per episode, generation and checkpoint to checkpoint_<monster/player>_metrics.jsonl
+METRICS_EXPORT = True
+# Format of the checkpoints : "array" (genomes packed in NumPy arrays, fast to restore, see array_checkpoint) or
+# "pickle" (gzipped pickle of the whole Population)
+CHECKPOINT_FORMAT = "array"
+# Co-evolution : the monsters and players populations are trained at the same time in two processes, sending the nets
+# of their best genomes to each other every COEVOLUTION_EXCHANGE_INTERVAL generations
+COEVOLUTION = False
+COEVOLUTION_EXCHANGE_INTERVAL = 5
+# Keep the fitnesses of all the generations in memory-mapped files next to the checkpoints instead of in memory
+FITNESS_STORE_ON_DISK = False
+# Keep the trajectories of the NUMBER_NETS_TRAINING best genomes for DemoGame (see neat_modified.trajectory_store)
+TRAJECTORY_RECORDING = True
+# CPU profiling of the selected generations ("3,10-12", "*" : all, "" : none), see neat_modified.profiler
+PROFILE_GENERATIONS = os.environ.get("GAME_IA_PROFILE_GENERATIONS", "")
+# Only these episodes of the selected generations ("" : the whole generations)
+PROFILE_EPISODES = os.environ.get("GAME_IA_PROFILE_EPISODES", "")
+# "deterministic" (cProfile) or "sampling"
+PROFILE_MODE = os.environ.get("GAME_IA_PROFILE_MODE", "deterministic")
+# Number of functions in the summaries of the profiles
+PROFILE_TOP = 30
 # During an episode, if the evolution of the mean fitness is less than this %, it ends the generation
 THRESHOLD_EVOL_RANKING = 50
 
 # Game settings
+MAX_STEP_EPISODE = 6000
 PLAYER_LIFE = 1000
 MONSTER_LIFE = 3000
 SPEED: Final = 0.25
 
 # Display settings
+# Headless mode : no window, no fonts, no images and no events (for training on machines without display)
+# Can also be enabled with the --headless command line argument
+HEADLESS = False
 IMAGE_PLAYER_PATH: Final = os.path.join(os.getcwd(), "assets", "player.png")
 IMAGE_MONSTER_PATH: Final = os.path.join(os.getcwd(), "assets", "monster.png")
 IMAGE_BACKGROUND_PATH: Final = os.path.join(os.getcwd(), "assets", "bg.jpg")
@@ -22,3 +74,8 @@ WINDOW_STATS_HEIGHT: Final = 100
 WINDOW_WIDTH: Final = 200
 WINDOW_HEIGHT: Final = 300
 IMAGE_SIZE: Final = (40, 40)
+# Number of frames (redraw and event polling) per second during the trainings
+DISPLAY_FPS = 10
+# Replays of the trajectory files : number of recorded steps shown per frame and number of frames per second
+REPLAY_SPEED = 10
+REPLAY_FPS = 60
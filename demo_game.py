@@ -1,41 +1,51 @@
-from neat_modified.feed_forward import FeedForwardNetwork
+import argparse
+import os
+
+from neat_modified.network_cache import network_cache
+from neat_modified.trajectory_store import TrajectoryStore
 from random import randint
 import pygame
 import numpy as np
 
+from game import create_grid
 from monster import Monster
 from player import Player
 import config
+from assets import get_font, get_image
 
 
 class DemoGame:
+    """
+    Demo of a monster genome : either simulated live (show_demo) or replayed from a trajectory file recorded during the
+    training (replay), which needs neither simulation nor network activation and can export the frames as images.
+    """
 
-    def __init__(self, genome_monster, neat_config_monster, generation):
+    def __init__(self, genome_monster=None, neat_config_monster=None, generation=None):
         self.generation = generation
         self.genome_monster = genome_monster
         self.neat_config_monster = neat_config_monster
-        self.net_monster = FeedForwardNetwork.create(self.genome_monster, neat_config_monster)
+        self.net_monster = None
         self.monster = None
         self.player = None
         self.fitness_demo = None
 
-        self.empty_grid = np.zeros((12, 12), dtype=int)
-        # Set walls on the borders
-        self.empty_grid[0, :] = -1
-        self.empty_grid[-1, :] = -1
-        self.empty_grid[:, 0] = -1
-        self.empty_grid[:, -1] = -1
-
-        # Pygame initialization
-        self.background = pygame.image.load(config.IMAGE_BACKGROUND_PATH)
-        self.font = pygame.font.Font(pygame.font.get_default_font(), 10)
-        self.backup_caption = pygame.display.get_caption()[0]
-        pygame.display.set_caption(
-            "DEMO : AI alternative reinforcement training using genetic algorithm"
-        )
+        # Same grid as the trainings, for the local views of the monster
+        self.empty_grid = create_grid()
+
+        # Pygame initialization (the frames are drawn on a surface of the window size when there is no window)
+        pygame.font.init()
+        self.background = get_image(config.IMAGE_BACKGROUND_PATH)
+        self.font = get_font(10)
         self.screen = pygame.display.get_surface()
+        self.backup_caption = None
+        if self.screen is not None:
+            self.backup_caption = pygame.display.get_caption()[0]
+            pygame.display.set_caption(
+                "DEMO : AI alternative reinforcement training using genetic algorithm"
+            )
 
     def show_demo(self, number_episodes: int):
+        self.net_monster = network_cache.get(self.genome_monster, self.neat_config_monster)
         for episode in range(1, number_episodes + 1):
             self.fitness_demo = 0
             x_player = config.IMAGE_SIZE[0] * 3
@@ -50,7 +60,6 @@ class DemoGame:
 
             while running and current_step < max_step and self.player.life[0] > 0 and self.monster.life > 0:
                 current_step += 1
-                self.monster.get_local_view(self.player, self.empty_grid)
                 self.display_demo()
                 self.update_demo()
 
@@ -62,40 +71,87 @@ class DemoGame:
                     elif event.type == pygame.QUIT:
                         running = False
                         pygame.quit()
-        pygame.display.set_caption(self.backup_caption)
-
-    def display_demo(self):
-        self.screen.blit(self.background, (0, 0))
-
-        generation_and_fitness_text = self.font.render(
-            f"Best monster generation n°{self.generation}", True, (30, 0, 0)
-        )
-        self.screen.blit(generation_and_fitness_text, (30, 10))
+        self.restore_caption()
+
+    def replay(self, filename: str, speed: float = config.REPLAY_SPEED, frames_dir=None):
+        """
+        Replays the episodes of a trajectory file (see TrajectoryStore) showing `speed` recorded steps per frame
+        (less than 1 for a slow motion), at REPLAY_FPS frames per second.
+        If frames_dir is given, the frames are saved in it (frame_<episode>_<frame>.png) as fast as possible instead,
+        which also works without window.
+        """
+        metadata, trajectories = TrajectoryStore.read(filename)
+        type_genome = "monster" if metadata["training_number"] % 2 else "player"
+        screen = self.screen if self.screen is not None else pygame.Surface((config.WINDOW_WIDTH, config.WINDOW_HEIGHT))
+        if frames_dir is not None:
+            os.makedirs(frames_dir, exist_ok=True)
+        clock = pygame.time.Clock()
+
+        running = True
+        for episode, fitness_episode, positions, opponent_positions, actions in trajectories:
+            # Last recorded step shown by each frame (starting at 1)
+            frame_steps = np.minimum(np.ceil(np.arange(1, len(positions) / speed + 1) * speed),
+                                     len(positions)).astype(int)
+            for frame, step in enumerate(frame_steps):
+                if not running:
+                    break
+                texts = [
+                    f"Best {type_genome} generation n°{metadata['generation']}",
+                    f"Mean fitness : {round(metadata['fitness'], 2)}",
+                    f"Episode {episode} : {fitness_episode} step {step}",
+                ]
+                if type_genome == "monster":
+                    self.draw(screen, texts, opponent_positions[step - 1], positions[step - 1])
+                else:
+                    self.draw(screen, texts, positions[step - 1], opponent_positions[step - 1])
+
+                if frames_dir is not None:
+                    pygame.image.save(screen, os.path.join(frames_dir, f"frame_{episode}_{frame + 1:05d}.png"))
+                if self.screen is None:
+                    continue
+                pygame.display.flip()
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                        running = False
+                if frames_dir is None:
+                    clock.tick(config.REPLAY_FPS)
+        self.restore_caption()
 
-        mean_fitness_text = self.font.render(
-            f"Mean fitness : {round(self.genome_monster.fitness, 2)}", True, (40, 0, 0)
-        )
-        self.screen.blit(mean_fitness_text, (30, 40))
+    def restore_caption(self):
+        if self.backup_caption is not None and pygame.display.get_init():
+            pygame.display.set_caption(self.backup_caption)
 
-        fitness_demo_text = self.font.render(
-            f"Fitness demo : {round(self.fitness_demo, 2)}", True, (50, 0, 0)
-        )
-        self.screen.blit(fitness_demo_text, (30, 70))
+    def draw(self, screen, texts, player_position, monster_position):
+        screen.blit(self.background, (0, 0))
+        for i, text in enumerate(texts):
+            screen.blit(self.font.render(text, True, (30 + 10 * i, 0, 0)), (30, 10 + 30 * i))
 
         # Separation line for the stats
-        pygame.draw.line(self.screen, (50, 0, 0), (0, config.WINDOW_STATS_HEIGHT),
+        pygame.draw.line(screen, (50, 0, 0), (0, config.WINDOW_STATS_HEIGHT),
                          (config.WINDOW_WIDTH, config.WINDOW_STATS_HEIGHT), 4)
 
-        # Draw the players on the screen
-        self.screen.blit(self.player.image, self.player.rect)
-        # Draw the monsters on the screen
-        self.screen.blit(self.monster.image, self.monster.rect)
+        # Draw the player and the monster on the screen
+        screen.blit(get_image(config.IMAGE_PLAYER_PATH, config.IMAGE_SIZE), tuple(int(v) for v in player_position))
+        screen.blit(get_image(config.IMAGE_MONSTER_PATH, config.IMAGE_SIZE), tuple(int(v) for v in monster_position))
 
+    def display_demo(self):
+        self.draw(
+            self.screen,
+            [
+                f"Best monster generation n°{self.generation}",
+                f"Mean fitness : {round(self.genome_monster.fitness, 2)}",
+                f"Fitness demo : {round(self.fitness_demo, 2)}",
+            ],
+            self.player.rect.topleft,
+            self.monster.rect.topleft,
+        )
         pygame.display.flip()
 
     def update_demo(self):
 
-        next_move_monster = self.net_monster.activate(self.monster.get_local_view(self.player, self.empty_grid).flatten())
+        next_move_monster = self.net_monster.activate(
+            self.monster.get_local_view_optimized(self.player, self.empty_grid).flatten()
+        )
         # next_move_monster = self.net_monster.activate(
         #     [
         #         self.player.rect.y / config.WINDOW_HEIGHT,
@@ -119,3 +175,17 @@ class DemoGame:
         )
         self.fitness_demo -= 0.01 if min_dist_wall == 0 else 0
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay of a trajectory file recorded during a training")
+    parser.add_argument("trajectory", help="trajectory file (checkpoint_<monster/player>_trajectories/trajectory-<key>)")
+    parser.add_argument("--speed", type=float, default=config.REPLAY_SPEED,
+                        help="number of recorded steps per frame (less than 1 for a slow motion)")
+    parser.add_argument("--frames", default=None,
+                        help="directory where the frames are saved as images, without window")
+    args = parser.parse_args()
+
+    if args.frames is None:
+        pygame.init()
+        pygame.display.set_mode((config.WINDOW_WIDTH, config.WINDOW_HEIGHT))
+    DemoGame().replay(args.trajectory, args.speed, args.frames)
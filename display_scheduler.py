@@ -0,0 +1,29 @@
+import time
+
+
+class DisplayScheduler:
+    """
+    Chooses how many simulation steps run between two frames (redraw and event polling) of an episode, to display
+    about `fps` frames per second of simulation whatever the speed of the updates.
+
+    The number of steps is adapted after each frame from the mean duration of the steps since the last frame, timed
+    with one perf_counter call per frame : it doesn't depend on the step timer (nor on its sampling or it being off).
+    """
+
+    def __init__(self, fps: float):
+        self.frame_duration = 1 / fps
+        self.steps_between_frames = 1
+        self.next_frame_step = 1
+        self.last_frame_step = 0
+        self.last_frame_time = time.perf_counter()
+
+    def is_frame(self, step: int) -> bool:
+        return step >= self.next_frame_step
+
+    def schedule_next_frame(self, step: int):
+        now = time.perf_counter()
+        if step > self.last_frame_step and now > self.last_frame_time:
+            step_duration = (now - self.last_frame_time) / (step - self.last_frame_step)
+            self.steps_between_frames = max(1, round(self.frame_duration / step_duration))
+        self.last_frame_step, self.last_frame_time = step, now
+        self.next_frame_step = step + self.steps_between_frames
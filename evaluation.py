@@ -0,0 +1,222 @@
+"""
+Creation of the episodes of a training and their evaluation in a pool of worker processes.
+"""
+import hashlib
+import math
+import multiprocessing
+
+import numpy as np
+
+import config
+from game import Game
+from monster import Monster
+from neat_modified.batch_feed_forward import BatchFeedForwardNetwork
+from neat_modified.genome_reporter import GenomeReporter
+from neat_modified.network_cache import net_hash
+from player import Player
+from trajectory import TrajectoryRecorder
+from vectorized_game import VectorizedDuelGame, VectorizedGame
+
+
+def player_start_position():
+    x_player = config.IMAGE_SIZE[0] * 0 #randint(0, config.WINDOW_WIDTH - config.IMAGE_SIZE[0])
+    y_player = config.WINDOW_STATS_HEIGHT + config.IMAGE_SIZE[0] * 0 #randint(config.WINDOW_STATS_HEIGHT, config.WINDOW_HEIGHT - config.IMAGE_SIZE[0])
+    return x_player, y_player
+
+
+# Independent random streams of an episode
+PLAYER_STREAM, MONSTER_STREAM = range(2)
+
+
+def episode_seed(run_seed: int, generation: int, episode: int, stream: int):
+    """
+    Seed (for numpy.random.default_rng) of a random stream of an episode, derived from (run seed, generation, episode)
+    only : every genome of a generation faces the same random player and monsters (common random numbers, the ranking
+    only depends on the genomes), and an episode gives the same results alone, split between workers or restored
+    from a checkpoint. Without RESAMPLE_EPISODES, the episodes of all the generations are the ones of the generation 0.
+    """
+    if not config.RESAMPLE_EPISODES:
+        generation = 0
+    return np.random.SeedSequence(run_seed, spawn_key=(generation, episode, stream))
+
+
+def episode_key(training_number: int, run_seed: int, generation: int, episode: int, training_nets) -> bytes:
+    """
+    Digest of everything defining an episode apart from the simulated genomes (see FitnessCache) : the trained
+    population, the random streams, the opponent net (if any) and the rules of the game.
+    """
+    seed = episode_seed(run_seed, generation, episode, PLAYER_STREAM)
+    rules = (config.MAX_STEP_EPISODE, config.PLAYER_LIFE, config.MONSTER_LIFE, config.SPEED, config.IMAGE_SIZE,
+             config.WINDOW_STATS_HEIGHT, config.WINDOW_WIDTH, config.WINDOW_HEIGHT)
+    opponent = net_hash(training_nets[episode % len(training_nets)]) if training_nets else None
+    description = (training_number % 2, seed.entropy, seed.spawn_key[:2], opponent, rules)
+    return hashlib.blake2b(repr(description).encode(), digest_size=16).digest()
+
+
+def create_player_trajectory(training_number: int, run_seed: int, generation: int, episode: int, training_nets):
+    """
+    Returns the trajectory of the random player of an episode (None when the players are trained or when the monsters
+    face the training nets of the players : the players are controlled by their nets).
+    """
+    if training_number % 2 and not training_nets:
+        rng = np.random.default_rng(episode_seed(run_seed, generation, episode, PLAYER_STREAM))
+        return Player.random_trajectory(*player_start_position(), config.MAX_STEP_EPISODE, rng)
+    return None
+
+
+def create_game(generation: int, training_number: int, episode: int, pop_size: int, training_nets, player_trajectory,
+                run_seed: int, ids=None):
+    """
+    Creates the game of an episode with its player and its monsters : one random player facing all the monsters for
+    the monster trainings without training nets, and one duel (a player and the monster of the same id) per genome for
+    the player trainings and for the monster trainings against the nets of the players.
+    The randomness of the players and monsters comes from the random streams of the episode (see episode_seed), so
+    creating the game doesn't change the global random state (the serial and parallel evaluations give the same
+    results).
+    ids are the indexes (among the pop_size genomes of the episode) of the genomes simulated, all of them if None.
+    """
+    ids = range(pop_size) if ids is None else ids
+    monster_seed = episode_seed(run_seed, generation, episode, MONSTER_STREAM)
+    player_seed = episode_seed(run_seed, generation, episode, PLAYER_STREAM)
+    if not config.VECTORIZED_SIMULATION:
+        game = Game(generation, training_number, episode, len(ids), monster_seed)
+    elif training_number % 2:
+        game = VectorizedGame(generation, training_number, episode, len(ids), monster_seed)
+    else:
+        game = VectorizedDuelGame(generation, training_number, episode, len(ids), monster_seed)
+
+    x_player, y_player = player_start_position()
+    x_monsters = config.IMAGE_SIZE[0] #randint(0, config.WINDOW_WIDTH - config.IMAGE_SIZE[0])
+    y_monsters = config.WINDOW_STATS_HEIGHT + config.IMAGE_SIZE[0] #randint(config.WINDOW_STATS_HEIGHT, config.WINDOW_HEIGHT - config.IMAGE_SIZE[0])
+    if training_number % 2 and not training_nets:
+        # All the monsters chase the same random player
+        player = Player(x_player, y_player, pop_size, np.random.default_rng(player_seed))
+        if player_trajectory is not None:
+            player.set_trajectory(player_trajectory)
+        game.add_player(player)
+
+    for index_entity in ids:
+        # Creating the monsters
+        monster = Monster(x_monsters, y_monsters, index_entity)
+        game.add_monster(monster)
+
+        if training_number % 2 and training_nets:
+            # The player moved by a training net from the last training reacts to the monster, so each monster duels
+            # its own player of the same id (its life is counted in player.life[id], as with the random player)
+            player = Player(x_player, y_player, pop_size, np.random.default_rng(player_seed), index_entity)
+            player.set_net(training_nets[episode % len(training_nets)])
+            game.add_player(player)
+
+        if not training_number % 2:
+            # Each player duels the monster of its id, with the training nets from the last training (if any)
+            game.add_player(Player(x_player, y_player, 1, np.random.default_rng(player_seed), index_entity))
+            if training_nets:
+                monster.set_net(training_nets[episode % len(training_nets)])
+    return game
+
+
+def racing_contenders(fitnesses_episodes, contenders, genome_species, survival_threshold: float, elitism: int,
+                      confidence: float):
+    """
+    Returns the genomes still in the race after an episode, as a boolean mask.
+
+    fitnesses_episodes is the (episodes, genomes) array of the fitness of each genome at each episode, NaN for the
+    episodes where it was not simulated, and genome_species the species of each genome. As DefaultReproduction selects
+    the survivors in each species (the elitism best genomes and the max(2, ceil(survival_threshold * size)) best
+    genomes as parents), the survival cut of a species is the mean fitness of its last survivor, and a species too
+    small to lose a genome has no cut. A contender leaves the race when the upper bound of the confidence interval of
+    its mean fitness (mean + confidence * standard error, RACING_CONFIDENCE) is below the cut of its species : it would
+    most likely not survive anyway, and it is not simulated anymore during the generation (see eval_genomes).
+
+    With only a few episodes the variance of a single genome is meaningless, so the standard errors use the variance
+    of the episodes pooled over all the genomes.
+    """
+    nb_episodes = np.count_nonzero(~np.isnan(fitnesses_episodes), axis=0)
+    if nb_episodes.min() < 2:
+        return contenders
+    mean_fitnesses = np.nanmean(fitnesses_episodes, axis=0)
+    pooled_variance = np.nansum((fitnesses_episodes - mean_fitnesses) ** 2) / np.sum(nb_episodes - 1)
+    standard_errors = np.sqrt(pooled_variance / nb_episodes)
+
+    genome_species = np.asarray(genome_species)
+    survival_cuts = np.full(len(mean_fitnesses), -np.inf)
+    for species in np.unique(genome_species):
+        members = np.flatnonzero(genome_species == species)
+        nb_survivors = max(elitism, 2, math.ceil(survival_threshold * len(members)))
+        if nb_survivors < len(members):
+            survival_cuts[members] = np.sort(mean_fitnesses[members])[-nb_survivors]
+    return contenders & (mean_fitnesses + confidence * standard_errors >= survival_cuts)
+
+
+def init_worker():
+    # The workers never display anything
+    config.HEADLESS = True
+
+
+def run_episode_chunk(genomes, neat_config, generation, training_number, episode, training_nets, player_trajectory,
+                      run_seed):
+    """
+    Runs an episode in a worker for a chunk of the population and returns the fitness earned by each genome and the
+    number of steps of the episode.
+    All the chunks of an episode replay the same trajectory of the random player and use the same random streams.
+    """
+    for genome in genomes:
+        genome.fitness = 0
+    nets = BatchFeedForwardNetwork.create(genomes, neat_config)
+    game = create_game(generation, training_number, episode, len(genomes), training_nets, player_trajectory,
+                       run_seed)
+    game.run_episode(nets, genomes, GenomeReporter(), None)
+    return [genome.fitness for genome in genomes], game.current_step
+
+
+def record_episode(genomes, neat_config, generation, training_number, episode, training_nets, run_seed):
+    """
+    Simulates again an episode of a few genomes with their trajectories recorded and returns the recorder (its columns
+    are the genomes). The episodes are deterministic and the fitness of a genome doesn't depend on the other genomes
+    (see FitnessCache), so the genomes make the same moves as during their evaluation. Their fitness is unchanged.
+    """
+    fitnesses = [genome.fitness for genome in genomes]
+    for genome in genomes:
+        genome.fitness = 0
+    nets = BatchFeedForwardNetwork.create(genomes, neat_config)
+    player_trajectory = create_player_trajectory(training_number, run_seed, generation, episode, training_nets)
+    game = create_game(generation, training_number, episode, len(genomes), training_nets, player_trajectory,
+                       run_seed)
+    game.recorder = TrajectoryRecorder(len(genomes), config.MAX_STEP_EPISODE)
+    game.run_episode(nets, genomes, GenomeReporter(), None)
+    for genome, fitness in zip(genomes, fitnesses):
+        genome.fitness = fitness
+    return game.recorder.trim(game.current_step)
+
+
+class ParallelEvaluator:
+    """
+    Runs the episodes of a generation in a pool of worker processes, each worker simulating a chunk of the genomes.
+    The pool is created once and kept for all the generations (the workers keep their network cache).
+    """
+
+    def __init__(self, number_workers: int):
+        self.number_workers = number_workers
+        self.pool = multiprocessing.Pool(number_workers, initializer=init_worker)
+
+    def run_episode(self, genomes, neat_config, generation, training_number, episode, training_nets,
+                    player_trajectory, run_seed):
+        """
+        Returns the fitness earned during the episode by each genome, in the order of genomes, and the number of steps
+        of the episode (of its longest chunk).
+        """
+        chunks = [chunk.tolist() for chunk in np.array_split(np.arange(len(genomes)), self.number_workers) if len(chunk)]
+        results = self.pool.starmap(
+            run_episode_chunk,
+            [
+                ([genomes[i] for i in chunk], neat_config, generation, training_number, episode, training_nets,
+                 player_trajectory, run_seed)
+                for chunk in chunks
+            ],
+        )
+        fitnesses = [fitness for chunk_fitnesses, _ in results for fitness in chunk_fitnesses]
+        return fitnesses, max(nb_steps for _, nb_steps in results)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
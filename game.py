@@ -1,12 +1,27 @@
 import numpy as np
 import pygame
 import config
-import random
+from assets import get_font, get_image
+from display_scheduler import DisplayScheduler
+from monster import Monster
+from neat_modified.step_timer import UPDATE, ACTIVATION, DISPLAY, EVENTS
+from trajectory import player_actions
 import time
 
 
+def create_grid(n=5):
+    """
+    Grid of the local views of the monsters : a wall border (-1) around the cells of the window, with margins so the
+    view of a monster always fits in the grid (see Monster.get_local_view_optimized).
+    """
+    grid = np.zeros((n + 2 * (n-1), n + 2 * (n-1)), dtype=int)
+    grid[n-2: -n+2, n-2: -n+2] = -1
+    grid[n-1: -n+1, n-1: -n+1] = 0
+    return grid
+
+
 class Game:
-    def __init__(self, generation: int, training_number: int, episode: int, pop_size: int):
+    def __init__(self, generation: int, training_number: int, episode: int, pop_size: int, seed=None):
         self.generation = generation
         self.training_number = training_number
         self.episode = episode
@@ -14,42 +29,60 @@ class Game:
         self.player_killed = 0
         self.monster_removed = 0
 
-        n = 5
-        self.grid = np.zeros((n + 2 * (n-1), n + 2 * (n-1)), dtype=int)
-        self.grid[n-2: -n+2, n-2: -n+2] = -1
-        self.grid[n-1: -n+1, n-1: -n+1] = 0
+        self.grid = create_grid()
 
         self.all_monsters = pygame.sprite.Group()
+        self.monsters_by_id = {}
         self.pop_size = pop_size
         self.player = None
+        self.players_by_id = {}
         self.all_players = pygame.sprite.Group()
         self.all_players_alive = pygame.sprite.Group()
-        self.background = pygame.image.load(config.IMAGE_BACKGROUND_PATH)
-        self.font = pygame.font.Font(pygame.font.get_default_font(), 10)
+        # Random moves of the monsters without net (player trainings), seed : the monster stream of the episode
+        self.rng = np.random.default_rng(seed)
+
+        # Timing of the phases of the current step (if it is sampled by the step timer)
+        self.step_timer = None
+        self.timed_step = False
+        # Recorder of the trajectories of the genomes (see trajectory), None : nothing is recorded
+        self.recorder = None
 
     def add_monster(self, monster):
         self.all_monsters.add(monster)
+        self.monsters_by_id[monster.id] = monster
 
     def add_player(self, player):
         self.player = player
+        self.players_by_id[player.id] = player
         self.all_players.add(player)
         self.all_players_alive.add(player)
 
-    def run_episode(self, nets, ge, population, screen):
+    def run_episode(self, nets, ge, genome_reporter, screen):
         running = True
         paused = False
 
-        max_step = 6000
+        max_step = config.MAX_STEP_EPISODE
         self.current_step = 0
+        step_timer = self.step_timer = genome_reporter.step_timer
+        display_scheduler = DisplayScheduler(config.DISPLAY_FPS)
 
         while running and self.current_step < max_step and self.player_killed + self.monster_removed < self.pop_size:
-            population.genome_reporter.set_start_time_step()
             self.current_step += 1
+            timed_step = self.timed_step = step_timer.is_sampled(self.current_step)
+            if timed_step:
+                start_time = step_timer.now()
             ge, nets = self.update(nets, ge)
-            population.genome_reporter.set_update_time_step()
+            if timed_step:
+                start_time = step_timer.record(UPDATE, start_time)
 
-            if self.current_step % 100 == 0:
-                self.display_game(screen)
+            # Redraw and poll the events only a few times per second (never without a screen : headless, workers,
+            # recorded episodes)
+            if config.HEADLESS or screen is None or not display_scheduler.is_frame(self.current_step):
+                continue
+
+            self.display_game(screen)
+            if timed_step:
+                start_time_events = step_timer.now()
 
             looping = True
             while looping:
@@ -69,8 +102,20 @@ class Game:
                 else:
                     looping = False
 
-            population.genome_reporter.set_display_time_step()
-        return ge, nets, population
+            display_scheduler.schedule_next_frame(self.current_step)
+            if timed_step:
+                step_timer.record(EVENTS, start_time_events)
+                step_timer.record(DISPLAY, start_time)
+        return ge, nets
+
+    def activate_nets(self, nets, inputs, ids):
+        """Activates the nets of the given ids (timed as the net activation phase of the step)."""
+        if not self.timed_step:
+            return nets.activate(inputs, ids)
+        start_time = self.step_timer.now()
+        outputs = nets.activate(inputs, ids)
+        self.step_timer.record(ACTIVATION, start_time)
+        return outputs
 
     def update(self, nets, ge):
         if self.training_number % 2:
@@ -78,13 +123,37 @@ class Game:
 
         return self.update_players(nets, ge)
 
-    def update_monsters(self, nets, ge):
-        self.player.move_random()
-        for monster in self.all_monsters:
-            next_move_monster = nets[monster.id].activate(
-                monster.get_local_view_optimized(self.player, self.grid).flatten()
-            )
+    def move_random_player(self):
+        # The random player replays its precomputed trajectory if it has one
+        if self.player.trajectory is None:
+            self.player.move_random()
+        else:
+            self.player.follow_trajectory(self.current_step)
+
+    def move_net_players(self, monsters):
+        """
+        Moves the players of the duels of the given monsters with their net (the player of the same id as the monster,
+        which sees the monster of its duel) and returns them.
+        """
+        players = [self.players_by_id[monster.id] for monster in monsters]
+        for monster, player in zip(monsters, players):
+            player.move(player.get_next_move(monster.rect.x, monster.rect.y))
+        return players
 
+    def update_monsters(self, nets, ge):
+        monsters = self.all_monsters.sprites()
+        if self.player.net_player is None:
+            self.move_random_player()
+            players = [self.player] * len(monsters)
+        else:
+            players = self.move_net_players(monsters)
+        # The whole population is activated at once
+        next_moves_monsters = self.activate_nets(
+            nets,
+            [monster.get_local_view_optimized(player, self.grid).flatten() for monster, player in zip(monsters, players)],
+            [monster.id for monster in monsters],
+        )
+        for monster, player, next_move_monster in zip(monsters, players, next_moves_monsters):
             # next_move_monster = nets[monster.id].activate(
             #     [player.rect.y / config.WINDOW_HEIGHT,
             #      monster.rect.y / config.WINDOW_HEIGHT,
@@ -94,8 +163,8 @@ class Game:
             monster.move(next_move_monster)
             monster.check_hit_wall()
 
-            if monster.rect.colliderect(self.player.rect):
-                self.player.life[monster.id] -= 1
+            if monster.rect.colliderect(player.rect):
+                player.life[monster.id] -= 1
                 ge[monster.id].fitness += 0.1
 
             min_dist_wall = min(
@@ -110,18 +179,30 @@ class Game:
             if monster.life == 0:
                 self.monster_removed += 1
                 self.all_monsters.remove(monster)
-            if self.player.life[monster.id] == 0:
-                ge[monster.id].fitness += (6000 - self.current_step) / 25  # len(self.all_players) - self.player_killed
+            if player.life[monster.id] == 0:
+                ge[monster.id].fitness += (config.MAX_STEP_EPISODE - self.current_step) / 25  # len(self.all_players) - self.player_killed
                 self.player_killed += 1
                 self.all_monsters.remove(monster)
+            if player.net_player is not None and not self.all_monsters.has(monster):
+                # The player of a duel leaves with its monster
+                self.all_players_alive.remove(player)
 
+        if self.recorder is not None:
+            self.recorder.record(
+                self.current_step, [monster.id for monster in monsters], [monster.rect.x for monster in monsters],
+                [monster.rect.y for monster in monsters], [player.rect.x for player in players],
+                [player.rect.y for player in players], np.argmax(next_moves_monsters, axis=1),
+            )
         return ge, nets
 
 
     def update_players(self, nets, ge):
-        for monster in self.all_monsters:
-            player = self.all_players.sprites()[monster.id]
-            next_move_player = nets[player.id].activate(
+        # Each player duels the monster of the same id
+        players = self.all_players_alive.sprites()
+        monsters = [self.monsters_by_id[player.id] for player in players]
+        next_moves_players = self.activate_nets(
+            nets,
+            [
                 [
                     monster.rect.x - player.rect.x,
                     monster.rect.y - player.rect.y,
@@ -130,41 +211,58 @@ class Game:
                     config.WINDOW_WIDTH - player.rect.x,
                     config.WINDOW_HEIGHT - player.rect.y,
                 ]
-            )
-
+                for monster, player in zip(monsters, players)
+            ],
+            [player.id for player in players],
+        )
+        # The monsters without net (no training nets yet) all make the same random move, drawn once per step so every
+        # duel faces the same random monster whatever the number of duels still running
+        random_move = self.rng.integers(0, 8) if monsters and monsters[0].net_monster is None else None
+        for monster, player, next_move_player in zip(monsters, players, next_moves_players):
             player.move(next_move_player)
 
-            monster.move(monster.get_next_move(player.rect.x, player.rect.y))
+            if random_move is None:
+                monster.move(monster.get_next_move(player, self.grid))
+            else:
+                monster.move(Monster.RANDOM_MOVES[random_move])
 
             if player.rect.colliderect(monster.rect):
-                player.life -= 1
+                player.life[0] -= 1
                 ge[player.id].fitness += 0.1
 
             ge[player.id].fitness += 0.1
 
-            if player.life == 0:
+            if player.life[0] == 0:
+                self.player_killed += 1
                 self.all_monsters.remove(monster)
                 self.all_players_alive.remove(player)
 
+        if self.recorder is not None:
+            self.recorder.record(
+                self.current_step, [player.id for player in players], [player.rect.x for player in players],
+                [player.rect.y for player in players], [monster.rect.x for monster in monsters],
+                [monster.rect.y for monster in monsters], player_actions(next_moves_players),
+            )
         return ge, nets
 
 
     def display_game(self, screen):
-        screen.blit(self.background, (0, 0))
+        font = get_font(10)
+        screen.blit(get_image(config.IMAGE_BACKGROUND_PATH), (0, 0))
         # Printing the generation number and the type of training as well as the training number
         if self.training_number % 2:
             training_name = f"Training Monsters n°{(self.training_number + 1) // 2}"
         else:
             training_name = f"Training Players n°{(self.training_number + 1) // 2}"
-        training_name_text = self.font.render(training_name, True, (30, 0, 0))
+        training_name_text = font.render(training_name, True, (30, 0, 0))
         screen.blit(training_name_text, (30, 10))
 
-        generation_and_episode_text = self.font.render(
+        generation_and_episode_text = font.render(
             f"Generation n°{self.generation} Episode n°{self.episode}", True, (40, 0, 0)
         )
         screen.blit(generation_and_episode_text, (30, 40))
 
-        population_text = self.font.render(
+        population_text = font.render(
             f"Population : {len(self.all_players_alive)} ({self.player_killed} kills {self.monster_removed} suicides)",
             True, (50, 0, 0)
         )
@@ -1,4 +1,7 @@
+import argparse
+import multiprocessing
 import os
+import queue
 import pygame
 import random
 from random import randint
@@ -9,16 +12,21 @@ import neat
 from neat_modified.population import Population
 from neat_modified.checkpoint_reporter import Checkpointer
 from neat_modified.feed_forward import FeedForwardNetwork
+from neat_modified.batch_feed_forward import BatchFeedForwardNetwork
+from neat_modified.fitness_cache import FitnessCache
+from neat_modified.fixed_topology import FixedTopologyReproduction, FixedTopologySpeciesSet, is_fixed_topology
+from neat_modified.network_cache import genome_hash, network_cache
+from neat_modified.species import VectorizedSpeciesSet
 
 
-from game import Game
-from monster import Monster
-from player import Player
+from evaluation import ParallelEvaluator, create_game, create_player_trajectory, episode_key, racing_contenders, \
+    record_episode
 from demo_game import DemoGame
 import config
 
 
-def eval_genomes(population: Population, training_number: int, training_nets: typing.List[FeedForwardNetwork]):
+def eval_genomes(population: Population, training_number: int, training_nets: typing.List[FeedForwardNetwork],
+                 evaluator: typing.Optional[ParallelEvaluator] = None):
     """
     The function runs a simulation with the current population of monsters or players and evaluates their fitness based
     on the number of collisions they have with their opponents.
@@ -33,69 +41,135 @@ def eval_genomes(population: Population, training_number: int, training_nets: ty
 
     The training nets are the best nets of the last training of the opponents, which are used for this training. If the
     list is empty, we use "smart random" agents. (only implemented for the heroes)
+
+    If an evaluator is given, the episodes are simulated in its pool of worker processes.
+
+    The genomes already evaluated in an episode (same phenotype, random streams and opponent, see FitnessCache) are not
+    simulated again, they get the fitness they earned the first time.
     """
 
     # Initialization : training
     genomes, neat_config = list(population.population.items()), population.config
-    nets = []
     ge = []
 
     for genome_id, genome in genomes:
         genome.fitness = 0
-        net = FeedForwardNetwork.create(genome, neat_config)
-        nets.append(net)
         ge.append(genome)
+    # Genomes simulated during the next episode (all of them without racing evaluation), raced within their species
+    contenders = np.ones(len(ge), dtype=bool)
+    genome_species = [population.species.genome_to_species[genome_id] for genome_id, _ in genomes]
+    episode_ge = ge
+    # All the nets of the population are packed together to be activated in one call per step (by the workers if any)
+    nets = BatchFeedForwardNetwork.create(episode_ge, neat_config) if evaluator is None else None
 
     # Initialization : display
     print(f"\nGENERATION {population.generation}\n")
+    # The networks of the fixed-topology engine are built from the arrays of the population, without the cache
+    if network_cache.hits or network_cache.misses:
+        print(network_cache)
+    fitness_cache = population.fitness_cache
+    if fitness_cache is not None:
+        print(fitness_cache)
+        phenotype_hashes = {genome.key: genome_hash(genome) for genome in ge}
 
     # Initialization : stats
-    population.genome_reporter.start_generation()
+    population.genome_reporter.start_generation(len(genomes))
 
     # Running the episodes
 
     for episode in range(1, config.MAX_NUMBER_EPISODE + 1):
+        profiled = population.profiler is not None and \
+            population.profiler.is_episode_profiled(population.generation, episode)
+        if profiled:
+            population.profiler.start()
         population.genome_reporter.start_episode()
-
-        game = Game(population.generation, training_number, episode, len(ge))
-
-        x_player = config.IMAGE_SIZE[0] * 0 #randint(0, config.WINDOW_WIDTH - config.IMAGE_SIZE[0])
-        y_player = config.WINDOW_STATS_HEIGHT + config.IMAGE_SIZE[0] * 0 #randint(config.WINDOW_STATS_HEIGHT, config.WINDOW_HEIGHT - config.IMAGE_SIZE[0])
-        x_monsters = config.IMAGE_SIZE[0] #randint(0, config.WINDOW_WIDTH - config.IMAGE_SIZE[0])
-        y_monsters = config.WINDOW_STATS_HEIGHT + config.IMAGE_SIZE[0] #randint(config.WINDOW_STATS_HEIGHT, config.WINDOW_HEIGHT - config.IMAGE_SIZE[0])
-        player = Player(x_player, y_player, len(ge))
-        game.add_player(player)
-
-        for index_entity in range(len(ge)):
-            # Creating the monsters
-            monster = Monster(x_monsters, y_monsters, index_entity)
-            game.add_monster(monster)
-
-            # Adding the training nets from the last training (if any)
-            if training_nets:
-                if training_number % 2:
-                    player.set_net(training_nets[episode % config.NUMBER_NETS_TRAINING])
-                else:
-                    monster.set_net(
-                        training_nets[episode % config.NUMBER_NETS_TRAINING]
-                    )
-        population.genome_reporter.set_init_time_episode()
-        ge, nets, population = game.run_episode(nets, ge, population, pygame.display.get_surface())
-
-        population.genome_reporter.end_episode(genomes)
-
-        if episode > 1 and population.genome_reporter.compute_evolution_ranking(
-                genomes) < config.THRESHOLD_EVOL_RANKING:
+        # The random player (monster trainings) is simulated once, all the monsters face the same trajectory
+        player_trajectory = create_player_trajectory(training_number, population.run_seed, population.generation,
+                                                     episode, training_nets)
+
+        # Fitness of the episode of each genome taken from the fitness cache (None : the genome is simulated)
+        fitnesses_episode = [None] * len(episode_ge)
+        if fitness_cache is not None:
+            key_episode = episode_key(training_number, population.run_seed, population.generation, episode,
+                                      training_nets)
+            cache_keys = [FitnessCache.key(genome, key_episode, phenotype_hashes[genome.key]) for genome in episode_ge]
+            fitnesses_episode = [fitness_cache.get(key) for key in cache_keys]
+        simulated = [i for i, fitness in enumerate(fitnesses_episode) if fitness is None]
+
+        if not simulated:
+            population.genome_reporter.set_init_time_episode()
+            fitnesses_simulated, nb_steps = [], 0
+        elif evaluator is not None:
+            # The whole episode is simulated by the workers, only its wall time is measured (see end_episode)
+            population.genome_reporter.set_init_time_episode()
+            fitnesses_simulated, nb_steps = evaluator.run_episode(
+                [episode_ge[i] for i in simulated], neat_config, population.generation, training_number, episode,
+                training_nets, player_trajectory, population.run_seed
+            )
+        else:
+            game = create_game(population.generation, training_number, episode, len(episode_ge), training_nets,
+                               player_trajectory, population.run_seed, simulated)
+            population.genome_reporter.set_init_time_episode()
+            screen = None if config.HEADLESS else pygame.display.get_surface()
+            # The fitness of the episode is computed from 0 and added to the totals, as with the workers (same sums)
+            totals = [genome.fitness for genome in episode_ge]
+            for genome in episode_ge:
+                genome.fitness = 0
+            episode_ge, nets = game.run_episode(nets, episode_ge, population.genome_reporter, screen)
+            fitnesses_simulated = [episode_ge[i].fitness for i in simulated]
+            for genome, total in zip(episode_ge, totals):
+                genome.fitness = total
+            nb_steps = game.current_step
+
+        for i, fitness_episode in zip(simulated, fitnesses_simulated):
+            fitnesses_episode[i] = fitness_episode
+            if fitness_cache is not None:
+                fitness_cache.put(cache_keys[i], fitness_episode)
+        for genome, fitness_episode in zip(episode_ge, fitnesses_episode):
+            genome.fitness += fitness_episode
+
+        population.genome_reporter.end_episode(genomes, contenders, nb_steps)
+        if profiled:
+            population.profiler.stop(f"generation-{population.generation}_episode-{episode}")
+
+        rank_changes = population.genome_reporter.compute_evolution_ranking(genomes) if episode > 1 else None
+        population.genome_reporter.write_episode_metrics(rank_changes)
+        if rank_changes is not None and rank_changes < config.THRESHOLD_EVOL_RANKING:
             break
         population.genome_reporter.ranking_id_last_episode = np.array(sorted(genomes, key=lambda g: g[1].fitness,
                                                                              reverse=True)[:20])[:, 0]
 
-    # Taking the mean of the fitnesses
-    for _, genome in genomes:
-        genome.fitness /= population.genome_reporter.current_episode
+        if config.RACING_EVALUATION:
+            contenders = racing_contenders(population.genome_reporter.all_fitnesses.generation(), contenders,
+                                           genome_species, neat_config.reproduction_config.survival_threshold,
+                                           neat_config.reproduction_config.elitism, config.RACING_CONFIDENCE)
+            if np.count_nonzero(contenders) < len(episode_ge):
+                episode_ge = [genome for genome, contender in zip(ge, contenders) if contender]
+                nets = BatchFeedForwardNetwork.create(episode_ge, neat_config) if evaluator is None else None
+                print(f"RACING: {len(episode_ge)} genomes still running")
+
+    # Taking the mean of the fitnesses (over the episodes where each genome was simulated)
+    for (_, genome), nb_episodes in zip(genomes, population.genome_reporter.get_nb_episodes_genomes()):
+        genome.fitness /= int(nb_episodes)
 
     # End of the generation
-    population.genome_reporter.end_generation(population.population.values())
+    population.genome_reporter.end_generation(population.population.values(),
+                                              list(population.species.species.values()))
+    trajectory_store = population.trajectory_store
+    if trajectory_store is not None:
+        # Only the genomes entering the best ones ever are recorded, by simulating again the episodes where they were
+        # simulated (the episode of the row i of the fitnesses is the episode i + 1)
+        best_fitnesses = population.genome_reporter.hall_of_fame.best_fitnesses(trajectory_store.nb_genomes)
+        fitnesses_generation = population.genome_reporter.all_fitnesses.generation()
+        recorded = trajectory_store.genomes_to_record(ge, best_fitnesses)
+        for row, fitnesses_episode in enumerate(fitnesses_generation):
+            indexes = [i for i in recorded if not np.isnan(fitnesses_episode[i])]
+            if indexes:
+                recorder = record_episode([ge[i] for i in indexes], neat_config, population.generation,
+                                          training_number, row + 1, training_nets, population.run_seed)
+                trajectory_store.add_episode(row + 1, indexes, recorder)
+        trajectory_store.end_generation(ge, population.generation, training_number, best_fitnesses,
+                                        fitnesses_generation)
 
     # Display a demo of the best genome of this generation
     # DemoGame(population.genome_reporter.best_genomes(1, False)[0], neat_config, population.generation).show_demo(1)
@@ -107,27 +181,136 @@ def eval_genomes(population: Population, training_number: int, training_nets: ty
     # population.genome_reporter.print_time_stats()
 
 
-def run(_config_player_path: str, _config_monster_path: str):
-    """
-    Run the alternative training considering a config for the players and one for the monsters
-    Note : If there are any checkpoints, the configuration of the checkpoints will be used, so any changes to the config
-    will not have any effect.
-    """
-    # Load configuration
-    neat_config_player = neat.Config(
-        neat.DefaultGenome,
-        neat.DefaultReproduction,
-        neat.DefaultSpeciesSet,
-        neat.DefaultStagnation,
-        _config_player_path,
-    )
-    neat_config_monster = neat.Config(
+def load_population(type_training: str, neat_config) -> Population:
+    """Loads the last checkpoint of the monsters or players population, or creates a new population if there is none."""
+    checkpoint_dir_path = os.path.join(os.getcwd(), f"checkpoint_{type_training}")
+    checkpoint_names = Checkpointer.list_checkpoints(checkpoint_dir_path)
+    if checkpoint_names:
+        # There are maximum 3 checkpoints in the checkpoint directory
+        checkpoint_name = checkpoint_names[-1]
+        checkpoint_path = os.path.join(checkpoint_dir_path, checkpoint_name)
+        return Checkpointer.restore_checkpoint(checkpoint_path, neat_config)
+    print("\n WARNING : CREATING A NEW POPULATION FROM SCRATCH \n")
+    return Population(neat_config, checkpoint_dir_path)
+
+
+def load_neat_config(config_path: str):
+    neat_config = neat.Config(
         neat.DefaultGenome,
         neat.DefaultReproduction,
         neat.DefaultSpeciesSet,
         neat.DefaultStagnation,
-        _config_monster_path,
+        config_path,
     )
+    # Same parameters (section [DefaultSpeciesSet] of the config file) and species as DefaultSpeciesSet
+    if config.VECTORIZED_SPECIATION:
+        neat_config.species_set_type = VectorizedSpeciesSet
+    # Same parameters as DefaultReproduction and DefaultSpeciesSet, for the configs whose genomes can't get hidden nodes
+    if config.FIXED_TOPOLOGY_ENGINE and is_fixed_topology(neat_config.genome_config):
+        neat_config.reproduction_type = FixedTopologyReproduction
+        neat_config.species_set_type = FixedTopologySpeciesSet
+    return neat_config
+
+
+def drain(nets_queue: multiprocessing.Queue):
+    """Empties a queue of nets and returns the last nets it contained (None if it was empty)."""
+    last_nets = None
+    while True:
+        try:
+            last_nets = nets_queue.get_nowait()
+        except queue.Empty:
+            return last_nets
+
+
+def exchange_nets(population: Population, training_nets: typing.List[FeedForwardNetwork],
+                  inbox: multiprocessing.Queue, outbox: multiprocessing.Queue):
+    """
+    Sends the nets of the best genomes of the last generation of the population to the opponent process, and replaces
+    the training nets by the last nets received from it (if any).
+    """
+    best_genomes = population.genome_reporter.best_genomes(config.NUMBER_NETS_TRAINING, False)
+    if best_genomes:
+        outbox.put([network_cache.get(genome, population.config) for genome in best_genomes])
+
+    last_nets = drain(inbox)
+    if last_nets is not None:
+        training_nets[:] = last_nets
+        print(f"\nCO-EVOLUTION : {len(last_nets)} new training nets received\n")
+
+
+def coevolve(type_training: str, config_path: str, inbox: multiprocessing.Queue, outbox: multiprocessing.Queue,
+             number_workers: int):
+    """
+    Trains the monsters or the players population in a co-evolution process, against the last best nets of the
+    opponent population received every COEVOLUTION_EXCHANGE_INTERVAL generations.
+    The command line options are given as arguments : with the spawn start method (Windows), the process imports the
+    config module again and doesn't see the changes made by the parent.
+    """
+    # Only one process could use the window
+    config.HEADLESS = True
+
+    training_number = 1 if type_training == "monster" else 2
+    neat_config = load_neat_config(config_path)
+    evaluator = ParallelEvaluator(number_workers) if number_workers > 1 else None
+    training_nets = []
+    p = load_population(type_training, neat_config)
+    first_generation = p.generation
+
+    def fitness_function(population):
+        if (population.generation - first_generation) % config.COEVOLUTION_EXCHANGE_INTERVAL == 0:
+            exchange_nets(population, training_nets, inbox, outbox)
+        eval_genomes(population, training_number, training_nets, evaluator)
+
+    p.run(fitness_function, config.NUMBER_GEN_PER_TRAINING * config.NUMBER_TRAININGS)
+
+    # Stats
+    p.genome_reporter.print_best_fitnesses(20)
+    for i, genome in enumerate(p.genome_reporter.best_genomes(config.NUMBER_NETS_TRAINING)):
+        p.genome_reporter.draw_net(neat_config, genome, f"network_{type_training}_{i + 1}")
+    p.checkpoint_reporter.wait()
+
+    if evaluator is not None:
+        evaluator.close()
+
+
+def run_coevolution(_config_player_path: str, _config_monster_path: str):
+    """
+    Run the co-evolution : the monsters and the players are trained at the same time in two processes exchanging the
+    nets of their best genomes every COEVOLUTION_EXCHANGE_INTERVAL generations (instead of alternating trainings
+    against frozen opponents).
+    """
+    monster_nets, player_nets = multiprocessing.Queue(), multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=coevolve, args=("monster", _config_monster_path, player_nets, monster_nets,
+                                                       config.NUMBER_WORKERS)),
+        multiprocessing.Process(target=coevolve, args=("player", _config_player_path, monster_nets, player_nets,
+                                                       config.NUMBER_WORKERS)),
+    ]
+    for process in processes:
+        process.start()
+
+    # The nets not read by a process which has ended are drained, so the other process can exit
+    while any(process.is_alive() for process in processes):
+        for process in processes:
+            process.join(timeout=1)
+        if not processes[0].is_alive():
+            drain(player_nets)
+        if not processes[1].is_alive():
+            drain(monster_nets)
+
+
+def run(_config_player_path: str, _config_monster_path: str):
+    """
+    Run the alternative training considering a config for the players and one for the monsters
+    Note : If there are any pickle checkpoints, the configuration of the checkpoints will be used, so any changes to the
+    config will not have any effect (the array checkpoints use the current config).
+    """
+    # Load configuration
+    neat_config_player = load_neat_config(_config_player_path)
+    neat_config_monster = load_neat_config(_config_monster_path)
+
+    # Pool of workers kept for all the trainings
+    evaluator = ParallelEvaluator(config.NUMBER_WORKERS) if config.NUMBER_WORKERS > 1 else None
 
     # Starting alternative training (training the monster on odd training numbers and the players on even)
     for training_number in range(1, 2):  # config.NUMBER_TRAININGS * 2 + 1
@@ -147,22 +330,12 @@ def run(_config_player_path: str, _config_monster_path: str):
 
         # Create the population or load the last checkpoint
         training_nets = []
-        checkpoint_dir_path = os.path.join(os.getcwd(), f"checkpoint_{type_training}")
-        if len(os.listdir(checkpoint_dir_path)):
-            # There are maximum 3 checkpoints in the checkpoint directory
-            checkpoint_name = sorted(
-                os.listdir(checkpoint_dir_path), key=lambda name: int(name[11:])
-            )[-1]
-            checkpoint_path = os.path.join(checkpoint_dir_path, checkpoint_name)
-            p = Checkpointer.restore_checkpoint(checkpoint_path)
-        else:
-            print("\n WARNING : CREATING A NEW POPULATION FROM SCRATCH \n")
-            p = Population(neat_config, checkpoint_dir_path)
+        p = load_population(type_training, neat_config)
 
         # RUN THE TRAINING
         # Use of a lambda function to be able to give additional arguments
         p.run(
-              lambda population: eval_genomes(population, training_number, training_nets),
+              lambda population: eval_genomes(population, training_number, training_nets, evaluator),
               number_generation,
         )
 
@@ -171,33 +344,61 @@ def run(_config_player_path: str, _config_monster_path: str):
         training_genomes = p.genome_reporter.best_genomes(config.NUMBER_NETS_TRAINING)
 
         for i, genome in enumerate(training_genomes):
-            DemoGame(genome, neat_config,
-                     p.generation).show_demo(3)
+            if not config.HEADLESS:
+                # The recorded episodes of the genome are replayed if it has a trajectory file, else simulated
+                demo_game = DemoGame(genome, neat_config, p.generation)
+                if p.trajectory_store is not None and os.path.exists(p.trajectory_store.path(genome.key)):
+                    demo_game.replay(p.trajectory_store.path(genome.key))
+                else:
+                    demo_game.show_demo(3)
             p.genome_reporter.draw_net(neat_config, genome, f"network_genome_{i + 1}")
 
         # Saving the best nets for the alternative training
         training_nets = [
-            FeedForwardNetwork.create(genome, neat_config)
+            network_cache.get(genome, neat_config)
             for genome in training_genomes
         ]
 
+        # The last checkpoint of the training is written in the background during the demos
+        p.checkpoint_reporter.wait()
+
+    if evaluator is not None:
+        evaluator.close()
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI alternative reinforcement training using genetic algorithm")
+    parser.add_argument("--headless", action="store_true",
+                        help="train without window, fonts nor events (same results as with the display)")
+    parser.add_argument("--workers", type=int, default=config.NUMBER_WORKERS,
+                        help="number of worker processes simulating the episodes")
+    parser.add_argument("--coevolution", action="store_true",
+                        help="train the monsters and the players at the same time in two processes (headless)")
+    args = parser.parse_args()
+    config.HEADLESS = config.HEADLESS or args.headless
+    config.COEVOLUTION = config.COEVOLUTION or args.coevolution
+    config.NUMBER_WORKERS = args.workers
+
     # Initialization
     os.makedirs("checkpoint_monster", exist_ok=True)
     os.makedirs("checkpoint_player", exist_ok=True)
-    random.seed(10)
+    random.seed(config.RUN_SEED)
     config_player_path = os.path.join(os.getcwd(), "config_player.txt")
     config_monster_path = os.path.join(os.getcwd(), "config_monster.txt")
 
-    # Pygame
-    pygame.init()
-    pygame.display.set_caption(
-        "AI alternative reinforcement training using genetic algorithm"
-    )
-    pygame.display.set_mode((config.WINDOW_WIDTH, config.WINDOW_HEIGHT))
-    os.environ["SDL_VIDEO_WINDOW_POS"] = "0,0"
-    pygame.mouse.set_visible(False)
-
-    # Running
-    run(config_player_path, config_monster_path)
+    if config.COEVOLUTION:
+        # Running (headless)
+        run_coevolution(config_player_path, config_monster_path)
+    else:
+        # Pygame
+        if not config.HEADLESS:
+            pygame.init()
+            pygame.display.set_caption(
+                "AI alternative reinforcement training using genetic algorithm"
+            )
+            pygame.display.set_mode((config.WINDOW_WIDTH, config.WINDOW_HEIGHT))
+            os.environ["SDL_VIDEO_WINDOW_POS"] = "0,0"
+            pygame.mouse.set_visible(False)
+
+        # Running
+        run(config_player_path, config_monster_path)
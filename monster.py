@@ -2,22 +2,28 @@ import numpy as np
 import pygame
 import typing
 import config
+from assets import get_image
 
 
 class Monster(pygame.sprite.Sprite):
+    # Outputs choosing each of the 8 moves (random moves of the monsters without net)
+    RANDOM_MOVES = np.eye(8)
+
     def __init__(self, x, y, id):
         super().__init__()
         self.id = id
-        self.image = pygame.transform.scale(
-            pygame.image.load(config.IMAGE_MONSTER_PATH), config.IMAGE_SIZE
-        )
         self.pos = pygame.math.Vector2(x, y)
-        self.rect = self.image.get_rect(topleft=self.pos)
+        self.rect = pygame.Rect(self.pos, config.IMAGE_SIZE)
         self.speed = config.SPEED
         self.diagonal_speed = self.speed / 2 ** 0.5
         self.net_monster = None
         self.life = config.MONSTER_LIFE
 
+    @property
+    def image(self):
+        # Loaded on first display only, and shared by all the monsters
+        return get_image(config.IMAGE_MONSTER_PATH, config.IMAGE_SIZE)
+
     def set_net(self, net):
         self.net_monster = net
 
@@ -31,7 +37,7 @@ class Monster(pygame.sprite.Sprite):
             self.life -= 1
 
     def get_next_move(self, player, grid):
-        return self.net_monster.activate(self.get_local_view(player, grid).flatten())
+        return self.net_monster.activate(self.get_local_view_optimized(player, grid).flatten())
 
     def move(self, next_move_monster: typing.List[float]):
         match np.argmax(next_move_monster):
@@ -119,8 +125,9 @@ class Monster(pygame.sprite.Sprite):
         center_x = player.rect.centerx // config.IMAGE_SIZE[0] + size_grid - 1
         grid[center_y, center_x] = 1
 
-        local_view_size = size_grid*2
-        half_local_view = size_grid
+        # The view is centered on the monster and always fits in the grid thanks to its margins :
+        # (2 * (size_grid - 2) + 1)² = 49 cells, the number of inputs of the monster networks
+        half_local_view = size_grid - 2
 
         line_monster = (self.rect.centery - config.WINDOW_STATS_HEIGHT) // config.IMAGE_SIZE[0] + size_grid - 1
         column_monster = self.rect.centerx // config.IMAGE_SIZE[0] + size_grid - 1
@@ -0,0 +1,385 @@
+"""
+Checkpoint format storing the genomes as packed NumPy arrays instead of pickled neat objects.
+
+A checkpoint is a single uncompressed file : a magic string, the length of a JSON header and the header (metadata and
+dtype, shape and offset of each array), followed by the raw arrays. The arrays are memory-mapped when the checkpoint
+is read, so only what is used is loaded from the disk.
+
+The genomes of a group (the population, the hall of fame) are stored as ragged arrays : the node genes of the i-th
+genome are the rows node_offsets[i]:node_offsets[i + 1] of the node arrays, same for the connection genes.
+The ArrayGenomes of the fixed-topology engine are stored as the (genomes, outputs, inputs) arrays of their genes instead,
+with their Topology in the metadata : they are saved and restored without building any neat gene.
+"""
+import functools
+import json
+import random
+import struct
+from itertools import count
+
+import numpy as np
+from neat.species import Species
+
+from .fitness_cache import FitnessCache
+from .fitness_store import FitnessStore
+from .fixed_topology import ArrayGenome, FixedTopologyReproduction, GenomeArrays, Topology
+
+MAGIC = b"GAMEIACK"
+ALIGNMENT = 64
+# Arrays of the genes of the groups of ArrayGenomes (see GenomeArrays)
+GENE_ARRAYS = ("weights", "present", "enabled", "biases", "responses")
+
+
+def is_array_checkpoint(filename):
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_arrays(file, arrays, metadata):
+    """Writes a container of arrays (and JSON metadata) in an open binary file."""
+    header = {"metadata": metadata, "arrays": {}}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": array.shape, "offset": offset}
+        offset += array.nbytes
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    # The arrays start on an aligned offset after the header
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+    header_bytes = header_bytes.ljust(data_start - len(MAGIC) - 8)
+
+    file.write(MAGIC)
+    file.write(struct.pack("<Q", len(header_bytes)))
+    file.write(header_bytes)
+    for name, array in arrays.items():
+        file.write(b"\0" * (data_start + header["arrays"][name]["offset"] - file.tell()))
+        file.write(np.ascontiguousarray(array).tobytes())
+
+
+def read_arrays(filename):
+    """Returns the metadata and the memory-mapped (read only) arrays of a container."""
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not an array checkpoint")
+        header_size, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    data_start = len(MAGIC) + 8 + header_size
+    arrays = {}
+    for name, info in header["arrays"].items():
+        shape = tuple(info["shape"])
+        if np.prod(shape) == 0:
+            arrays[name] = np.empty(shape, dtype=info["dtype"])
+        else:
+            arrays[name] = np.memmap(filename, dtype=info["dtype"], mode="r", offset=data_start + info["offset"],
+                                     shape=shape)
+    return header["metadata"], arrays
+
+
+def count_value(counter):
+    """Next value of an itertools.count, without consuming it."""
+    return int(repr(counter)[len("count("):-1])
+
+
+def pack_keys(genomes, prefix):
+    """Keys and fitnesses (NaN if None) of a group of genomes."""
+    return {
+        f"{prefix}keys": np.array([genome.key for genome in genomes], dtype=np.int64),
+        f"{prefix}fitness": np.array([np.nan if genome.fitness is None else genome.fitness for genome in genomes],
+                                     dtype=np.float64),
+    }
+
+
+def pack_array_genomes(genomes, prefix):
+    """Packs a list of ArrayGenome of the same topology into the arrays of their genes (names starting with prefix)."""
+    genes = GenomeArrays.stack(genomes)
+    arrays = pack_keys(genomes, prefix)
+    arrays.update((f"{prefix}{name}", getattr(genes, name)) for name in GENE_ARRAYS)
+    return arrays
+
+
+def pack_group(genomes, prefix, functions, genome_config):
+    """
+    Packs a group of genomes : as gene arrays if they are all ArrayGenomes, else as neat genomes (the ArrayGenomes
+    mixed with neat genomes, the lazy genomes of the hall of fame restored from a neat group, are converted).
+    """
+    if genomes and all(isinstance(genome, ArrayGenome) for genome in genomes):
+        return pack_array_genomes(genomes, prefix)
+    return pack_genomes([genome.to_genome(genome_config) if isinstance(genome, ArrayGenome) else genome
+                         for genome in genomes], prefix, functions)
+
+
+def uses_array_genomes(neat_config) -> bool:
+    """True if the populations of the config are made of ArrayGenomes (fixed-topology engine)."""
+    return issubclass(neat_config.reproduction_type, FixedTopologyReproduction)
+
+
+def pack_genomes(genomes, prefix, functions):
+    """
+    Packs a list of DefaultGenome into arrays (names starting with prefix). The activation and aggregation functions
+    are stored as indexes in the functions list (completed with the new names).
+    """
+    function_indexes = {name: i for i, name in enumerate(functions)}
+
+    def function_index(name):
+        if name not in function_indexes:
+            function_indexes[name] = len(functions)
+            functions.append(name)
+        return function_indexes[name]
+
+    nodes = [node for genome in genomes for node in genome.nodes.values()]
+    connections = [connection for genome in genomes for connection in genome.connections.values()]
+    return {
+        **pack_keys(genomes, prefix),
+        f"{prefix}node_offsets": np.cumsum([0] + [len(genome.nodes) for genome in genomes], dtype=np.int64),
+        f"{prefix}node_keys": np.array([node.key for node in nodes], dtype=np.int64),
+        f"{prefix}node_bias": np.array([node.bias for node in nodes], dtype=np.float64),
+        f"{prefix}node_response": np.array([node.response for node in nodes], dtype=np.float64),
+        f"{prefix}node_activation": np.array([function_index(node.activation) for node in nodes], dtype=np.int16),
+        f"{prefix}node_aggregation": np.array([function_index(node.aggregation) for node in nodes], dtype=np.int16),
+        f"{prefix}connection_offsets": np.cumsum([0] + [len(genome.connections) for genome in genomes],
+                                                 dtype=np.int64),
+        f"{prefix}connection_keys": np.array([connection.key for connection in connections],
+                                             dtype=np.int64).reshape(-1, 2),
+        f"{prefix}connection_weight": np.array([connection.weight for connection in connections], dtype=np.float64),
+        f"{prefix}connection_enabled": np.array([connection.enabled for connection in connections], dtype=bool),
+    }
+
+
+def pack_population(population):
+    """
+    Returns the arrays and the metadata of a checkpoint of the population : its genomes, its species, the state of the
+    reproduction, the most fit genomes, the fitness summaries, fitness history and timings of the genome reporter, the
+    fitness cache and the random state.
+    """
+    functions = []
+    genomes = list(population.population.values())
+    genome_config = population.config.genome_config
+    arrays = pack_group(genomes, "population_", functions, genome_config)
+    hall_of_fame = population.genome_reporter.hall_of_fame.best_genomes(len(population.genome_reporter.hall_of_fame))
+    arrays.update(pack_group(hall_of_fame, "hall_of_fame_", functions, genome_config))
+    topology = next((genome.topology for genome in genomes + hall_of_fame if isinstance(genome, ArrayGenome)), None)
+
+    species_set = population.species
+    species = list(species_set.species.values())
+    arrays["genome_species"] = np.array([species_set.genome_to_species[genome.key] for genome in genomes],
+                                        dtype=np.int64)
+    arrays["species_keys"] = np.array([s.key for s in species], dtype=np.int64)
+    arrays["species_created"] = np.array([s.created for s in species], dtype=np.int64)
+    arrays["species_last_improved"] = np.array([s.last_improved for s in species], dtype=np.int64)
+    arrays["species_representative"] = np.array([s.representative.key for s in species], dtype=np.int64)
+    arrays["species_fitness"] = np.array([np.nan if s.fitness is None else s.fitness for s in species],
+                                         dtype=np.float64)
+    arrays["species_history_offsets"] = np.cumsum([0] + [len(s.fitness_history) for s in species], dtype=np.int64)
+    arrays["species_history"] = np.array([f for s in species for f in s.fitness_history], dtype=np.float64)
+
+    ancestors = population.reproduction.ancestors
+    arrays["ancestors"] = np.array([ancestors.get(genome.key, (-1, -1)) or (-1, -1) for genome in genomes],
+                                   dtype=np.int64).reshape(-1, 2)
+
+    genome_reporter = population.genome_reporter
+    best_fitnesses = np.full((len(genome_reporter.best_fitnesses_generations), genome_reporter.hall_of_fame.max_size),
+                             np.nan)
+    for generation, fitnesses in enumerate(genome_reporter.best_fitnesses_generations):
+        best_fitnesses[generation, :len(fitnesses)] = fitnesses
+    arrays["best_fitnesses_generations"] = best_fitnesses
+    arrays["fitness_means"] = np.array(genome_reporter.fitness_means, dtype=np.float64)
+    arrays["fitness_stdevs"] = np.array(genome_reporter.fitness_stdevs, dtype=np.float64)
+    fitness_store_arrays, fitness_store = genome_reporter.all_fitnesses.to_arrays()
+    arrays.update(fitness_store_arrays)
+
+    if population.fitness_cache is not None:
+        arrays["fitness_cache_keys"], arrays["fitness_cache_fitnesses"] = population.fitness_cache.to_arrays()
+
+    version, random_state, gauss_next = random.getstate()
+    arrays["random_state"] = np.array(random_state, dtype=np.uint32)
+
+    node_indexer = population.config.genome_config.node_indexer
+    metadata = {
+        "generation": population.generation,
+        "reporter_generation": genome_reporter.current_generation,
+        "functions": functions,
+        "topology": None if topology is None else topology.to_dict(),
+        "genome_indexer": count_value(population.reproduction.genome_indexer),
+        "species_indexer": count_value(species_set.indexer),
+        "node_indexer": None if node_indexer is None else count_value(node_indexer),
+        "random_version": version,
+        "random_gauss_next": gauss_next,
+        "run_seed": population.run_seed,
+        "fitness_store": fitness_store,
+        "time_generations": genome_reporter.time_generations,
+        "steps_generations": genome_reporter.steps_generations,
+        "episode_times_generations": genome_reporter.episode_times_generations,
+    }
+    return arrays, metadata
+
+
+class ArrayCheckpoint:
+    """
+    Read access to an array checkpoint. The genomes are only built when they are asked for : reading the best genomes
+    of a run doesn't build the rest of the population (restore_population builds the whole population).
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.metadata, self.arrays = read_arrays(filename)
+        # Topology shared by the ArrayGenomes of the checkpoint (None if all the groups are neat genomes)
+        topology = self.metadata.get("topology")
+        self.topology = None if topology is None else Topology(**topology)
+
+    def __len__(self):
+        return len(self.arrays["population_keys"])
+
+    def is_array_group(self, prefix):
+        """True if the genomes of a group are stored as gene arrays (ArrayGenomes)."""
+        return f"{prefix}weights" in self.arrays
+
+    def genome(self, index, neat_config, prefix="population_"):
+        """
+        Builds the index-th genome of a group. The genomes of an array group are ArrayGenomes (copies of their rows),
+        converted to neat genomes if the config doesn't use the fixed-topology engine.
+        """
+        arrays, functions = self.arrays, self.metadata["functions"]
+        genome_config = neat_config.genome_config
+        key = int(arrays[f"{prefix}keys"][index])
+        fitness = arrays[f"{prefix}fitness"][index]
+        fitness = None if np.isnan(fitness) else float(fitness)
+        if self.is_array_group(prefix):
+            genome = ArrayGenome(key, self.topology,
+                                 *(np.array(arrays[f"{prefix}{name}"][index]) for name in GENE_ARRAYS))
+            genome.fitness = fitness
+            return genome if uses_array_genomes(neat_config) else genome.to_genome(genome_config)
+
+        genome = neat_config.genome_type(key)
+        genome.fitness = fitness
+
+        # The genes are created without their __init__ (which only sets the key), their attributes are set at once
+        node_type, connection_type = genome_config.node_gene_type, genome_config.connection_gene_type
+        start, end = arrays[f"{prefix}node_offsets"][index:index + 2]
+        for key, bias, response, activation, aggregation in zip(
+                arrays[f"{prefix}node_keys"][start:end].tolist(), arrays[f"{prefix}node_bias"][start:end].tolist(),
+                arrays[f"{prefix}node_response"][start:end].tolist(),
+                arrays[f"{prefix}node_activation"][start:end].tolist(),
+                arrays[f"{prefix}node_aggregation"][start:end].tolist()):
+            node = genome.nodes[key] = node_type.__new__(node_type)
+            node.__dict__ = {"key": key, "bias": bias, "response": response, "activation": functions[activation],
+                             "aggregation": functions[aggregation]}
+
+        start, end = arrays[f"{prefix}connection_offsets"][index:index + 2]
+        for key, weight, enabled in zip(
+                map(tuple, arrays[f"{prefix}connection_keys"][start:end].tolist()),
+                arrays[f"{prefix}connection_weight"][start:end].tolist(),
+                arrays[f"{prefix}connection_enabled"][start:end].tolist()):
+            connection = genome.connections[key] = connection_type.__new__(connection_type)
+            connection.__dict__ = {"key": key, "weight": weight, "enabled": enabled}
+        return genome
+
+    def genomes(self, neat_config, prefix="population_"):
+        """
+        Builds all the genomes of a group, in the type used by the config. The ArrayGenomes of an array group are rows
+        of in-memory copies of its arrays (as the genomes of a generation) : no neat gene is built.
+        """
+        if self.is_array_group(prefix):
+            arrays = self.arrays
+            genes = GenomeArrays(*(np.array(arrays[f"{prefix}{name}"]) for name in GENE_ARRAYS))
+            genomes = genes.genomes(arrays[f"{prefix}keys"].tolist(), self.topology)
+            for genome, fitness in zip(genomes, arrays[f"{prefix}fitness"].tolist()):
+                genome.fitness = None if np.isnan(fitness) else fitness
+            if not uses_array_genomes(neat_config):
+                genomes = [genome.to_genome(neat_config.genome_config) for genome in genomes]
+            return genomes
+
+        genomes = [self.genome(i, neat_config, prefix) for i in range(len(self.arrays[f"{prefix}keys"]))]
+        if uses_array_genomes(neat_config):
+            topology = Topology.from_config(neat_config.genome_config)
+            genomes = [ArrayGenome.from_genome(genome, topology) for genome in genomes]
+        return genomes
+
+    def best_genomes(self, n, neat_config):
+        """Returns the n most fit genomes of the hall of fame, building only them."""
+        fitnesses = self.arrays["hall_of_fame_fitness"]
+        return [self.genome(i, neat_config, "hall_of_fame_") for i in np.argsort(-fitnesses, kind="stable")[:n]]
+
+    def in_memory(self, prefix):
+        """
+        Returns an ArrayCheckpoint of the genomes of a group only, whose arrays are copied in memory : it doesn't keep
+        the file mapped (a mapped file can't be deleted on Windows).
+        """
+        group = ArrayCheckpoint.__new__(ArrayCheckpoint)
+        group.filename, group.metadata, group.topology = self.filename, self.metadata, self.topology
+        group.arrays = {name: np.array(array) for name, array in self.arrays.items() if name.startswith(prefix)}
+        return group
+
+    def restore_population(self, neat_config, checkpoint_dir_path):
+        """
+        Rebuilds the Population (and the random state and seed of the run) saved in the checkpoint.
+        The genomes of the population are all built at once, the next generation evaluates all of them anyway. Only
+        the genomes of the hall of fame are built lazily, from an in-memory copy of their arrays : the restored
+        population doesn't keep the checkpoint file mapped, so the checkpointer can delete it when it gets old.
+        """
+        # Imported here, the population module imports the checkpointer which imports this module
+        from .population import Population
+
+        arrays, metadata = self.arrays, self.metadata
+        genomes = self.genomes(neat_config)
+        population = {genome.key: genome for genome in genomes}
+
+        species_set = neat_config.species_set_type(neat_config.species_set_config, None)
+        species_set.indexer = count(metadata["species_indexer"])
+        history_offsets = arrays["species_history_offsets"].tolist()
+        for i, key in enumerate(arrays["species_keys"].tolist()):
+            species = species_set.species[key] = Species(key, int(arrays["species_created"][i]))
+            species.last_improved = int(arrays["species_last_improved"][i])
+            species.representative = population[int(arrays["species_representative"][i])]
+            fitness = arrays["species_fitness"][i]
+            species.fitness = None if np.isnan(fitness) else float(fitness)
+            species.fitness_history = arrays["species_history"][history_offsets[i]:history_offsets[i + 1]].tolist()
+        for genome, species_key in zip(genomes, arrays["genome_species"].tolist()):
+            species_set.species[species_key].members[genome.key] = genome
+            species_set.genome_to_species[genome.key] = species_key
+
+        if metadata["node_indexer"] is not None:
+            neat_config.genome_config.node_indexer = count(metadata["node_indexer"])
+
+        p = Population(neat_config, checkpoint_dir_path, (population, species_set, metadata["generation"]))
+        species_set.reporters = p.reporters
+        p.reproduction.genome_indexer = count(metadata["genome_indexer"])
+        if uses_array_genomes(neat_config):
+            # The children share the topology of the restored genomes
+            p.reproduction.topology = genomes[0].topology
+        p.reproduction.ancestors = {
+            genome.key: tuple(parents) if parents[0] >= 0 else tuple()
+            for genome, parents in zip(genomes, arrays["ancestors"].tolist())
+        }
+        p.checkpoint_reporter.last_generation_checkpoint = metadata["generation"]
+        p.run_seed = metadata.get("run_seed", p.run_seed)
+        if p.fitness_cache is not None and "fitness_cache_keys" in arrays:
+            p.fitness_cache = FitnessCache.from_arrays(p.fitness_cache.max_size, arrays["fitness_cache_keys"],
+                                                       arrays["fitness_cache_fitnesses"])
+
+        genome_reporter = p.genome_reporter
+        genome_reporter.current_generation = metadata["reporter_generation"]
+        # Added from the least fit so the genomes of equal fitness keep their order, they are built when needed
+        hall_of_fame = self.in_memory("hall_of_fame_")
+        for i in reversed(range(len(arrays["hall_of_fame_keys"]))):
+            genome_reporter.hall_of_fame.add_lazy(int(arrays["hall_of_fame_keys"][i]),
+                                                  float(arrays["hall_of_fame_fitness"][i]),
+                                                  functools.partial(hall_of_fame.genome, i, neat_config,
+                                                                    "hall_of_fame_"))
+        genome_reporter.best_fitnesses_generations = [
+            [fitness for fitness in fitnesses if not np.isnan(fitness)]
+            for fitnesses in arrays["best_fitnesses_generations"].tolist()
+        ]
+        genome_reporter.fitness_means = arrays["fitness_means"].tolist()
+        genome_reporter.fitness_stdevs = arrays["fitness_stdevs"].tolist()
+        # The fitness history is reattached to its block files (if on disk), never recreated over them
+        if "fitness_store" in metadata:
+            all_fitnesses = genome_reporter.all_fitnesses
+            genome_reporter.all_fitnesses = FitnessStore.from_arrays(all_fitnesses.max_episodes,
+                                                                     all_fitnesses.directory,
+                                                                     metadata["fitness_store"], arrays)
+            genome_reporter.time_generations = metadata["time_generations"]
+            genome_reporter.steps_generations = metadata["steps_generations"]
+            genome_reporter.episode_times_generations = metadata["episode_times_generations"]
+
+        random.setstate((metadata["random_version"], tuple(arrays["random_state"].tolist()),
+                         metadata["random_gauss_next"]))
+        return p
@@ -0,0 +1,138 @@
+import numpy as np
+
+from .fixed_topology import ArrayGenome, FixedTopologyNetworks
+from .network_cache import network_cache
+from .vectorized import ACTIVATIONS, is_vectorizable, node_layers
+
+
+class BatchFeedForwardNetwork(object):
+    """
+    Population-level phenotype : all the networks of a population packed into padded NumPy tensors organised by layer,
+    so the whole population is activated with one matrix product per layer.
+
+    Each layer l holds the nodes of depth l of every genome. The values of the nodes are stored in a
+    (N, num_columns) matrix where the first columns are the inputs, followed by the slots of each layer, and a last
+    column always equal to 0 (used for the outputs unreachable from the inputs, like the scalar network does).
+    The weights of the layer l are a (N, nb_slots_l, first_column_l) tensor : a node only reads the columns of the
+    previous layers. Padded slots have null weights so they are never read.
+
+    Genomes using an activation or aggregation function that can't be vectorised are kept as scalar networks.
+    """
+
+    def __init__(self, input_nodes, output_nodes, layers, output_columns, num_columns, fallback_nets):
+        self.input_nodes = input_nodes
+        self.output_nodes = output_nodes
+        self.layers = layers
+        self.output_columns = output_columns
+        self.num_columns = num_columns
+        self.fallback_nets = fallback_nets
+
+    def __len__(self):
+        return len(self.output_columns)
+
+    def activate(self, inputs, ids=None):
+        """
+        Activates the networks of the given ids (all the population if None) with a (len(ids), num_inputs) matrix of
+        inputs, the i-th row being the inputs of the network ids[i]. Returns a (len(ids), num_outputs) matrix.
+        """
+        inputs = np.asarray(inputs, dtype=float)
+        if inputs.size == 0:
+            return np.zeros((0, len(self.output_nodes)))
+        if len(self.input_nodes) != inputs.shape[1]:
+            raise RuntimeError("Expected {0:n} inputs, got {1:n}".format(len(self.input_nodes), inputs.shape[1]))
+        if ids is not None:
+            ids = np.asarray(ids, dtype=int)
+
+        values = np.zeros((inputs.shape[0], self.num_columns))
+        values[:, :inputs.shape[1]] = inputs
+
+        for first_column, weights, biases, responses, activation_groups in self.layers:
+            if ids is not None:
+                weights, biases, responses = weights[ids], biases[ids], responses[ids]
+            s = np.matmul(weights, values[:, :first_column, np.newaxis])[:, :, 0]
+            z = biases + responses * s
+            if len(activation_groups) == 1:
+                output_layer = activation_groups[0][0](z)
+            else:
+                output_layer = np.zeros_like(z)
+                for act_func, mask in activation_groups:
+                    if ids is not None:
+                        mask = mask[ids]
+                    output_layer[mask] = act_func(z[mask])
+            values[:, first_column:first_column + z.shape[1]] = output_layer
+
+        output_columns = self.output_columns if ids is None else self.output_columns[ids]
+        outputs = np.take_along_axis(values, output_columns, axis=1)
+
+        for net_id, net in self.fallback_nets.items():
+            rows = [net_id] if ids is None else np.flatnonzero(ids == net_id)
+            for row in rows:
+                outputs[row] = net.activate(inputs[row])
+
+        return outputs
+
+    @staticmethod
+    def create(genomes, config):
+        """
+        Receives a list of genomes and returns their phenotype (a BatchFeedForwardNetwork, or FixedTopologyNetworks for
+        the genomes of the fixed-topology engine).
+        """
+        if genomes and isinstance(genomes[0], ArrayGenome):
+            return FixedTopologyNetworks.create(genomes, config)
+        return BatchFeedForwardNetwork.from_networks([network_cache.get(genome, config) for genome in genomes])
+
+    @staticmethod
+    def from_networks(nets):
+        """ Packs a list of FeedForwardNetwork (sharing the same inputs and outputs) into a BatchFeedForwardNetwork. """
+        input_nodes, output_nodes = nets[0].input_nodes, nets[0].output_nodes
+        num_nets = len(nets)
+
+        fallback_nets = {}
+        nets_layers = []
+        for net_id, net in enumerate(nets):
+            if is_vectorizable(net.node_evals):
+                nets_layers.append(node_layers(input_nodes, net.node_evals))
+            else:
+                fallback_nets[net_id] = net
+                nets_layers.append([])
+
+        nb_layers = max(len(net_layers) for net_layers in nets_layers)
+        nb_slots = [
+            max(len(net_layers[l]) for net_layers in nets_layers if len(net_layers) > l) for l in range(nb_layers)
+        ]
+        first_columns = list(np.cumsum([len(input_nodes)] + nb_slots))
+        zero_column = first_columns[-1]
+
+        # Column of each node in the values matrix, for each network
+        columns = [dict((key, i) for i, key in enumerate(input_nodes)) for _ in range(num_nets)]
+        layers = []
+        for l in range(nb_layers):
+            first_column = first_columns[l]
+            weights = np.zeros((num_nets, nb_slots[l], first_column))
+            biases = np.zeros((num_nets, nb_slots[l]))
+            responses = np.zeros((num_nets, nb_slots[l]))
+            act_funcs = np.full((num_nets, nb_slots[l]), None, dtype=object)
+            for net_id, net_layers in enumerate(nets_layers):
+                if len(net_layers) <= l:
+                    continue
+                for slot, (node, act_func, agg_func, bias, response, links) in enumerate(net_layers[l]):
+                    columns[net_id][node] = first_column + slot
+                    for i, w in links:
+                        weights[net_id, slot, columns[net_id][i]] = w
+                    biases[net_id, slot] = bias
+                    responses[net_id, slot] = response
+                    act_funcs[net_id, slot] = act_func
+
+            # Padded slots take any activation, their value is never read
+            used_act_funcs = list(dict.fromkeys(f for f in act_funcs.flat if f is not None))
+            act_funcs[np.equal(act_funcs, None)] = used_act_funcs[0]
+            activation_groups = [(ACTIVATIONS[f], act_funcs == f) for f in used_act_funcs]
+            layers.append((first_column, weights, biases, responses, activation_groups))
+
+        output_columns = np.array(
+            [[columns[net_id].get(key, zero_column) for key in output_nodes] for net_id in range(num_nets)],
+            dtype=int,
+        )
+
+        return BatchFeedForwardNetwork(input_nodes, output_nodes, layers, output_columns, zero_column + 1,
+                                       fallback_nets)
@@ -1,9 +1,17 @@
-"""Uses `pickle` to save and restore populations (and other aspects of the simulation state)."""
+"""
+Uses `pickle` (or the array format of array_checkpoint) to save and restore populations (and other aspects of the
+simulation state).
+"""
 
 import os
 import gzip
 import pickle
 import random
+import threading
+import time
+
+import config as training_config
+from .array_checkpoint import ArrayCheckpoint, is_array_checkpoint, pack_population, write_arrays
 
 
 class Checkpointer:
@@ -12,17 +20,28 @@ class Checkpointer:
     to save and restore populations (and other aspects of the simulation state).
     """
 
-    def __init__(self, checkpoint_dir_path):
+    def __init__(self, checkpoint_dir_path, metrics_sink=None):
         """
         Saves the current state (at the end of a generation) every ``generation_interval``
 
         :param generation_interval: If not None, maximum number of generations between save intervals
         :type generation_interval: int or None
         :param str filename_prefix: Prefix for the filename (the end will be the generation number)
+        :param metrics_sink: If not None, MetricsSink receiving a record per checkpoint saved
         """
         self.generation_interval = 5
         self.last_generation_checkpoint = 0
         self.checkpoint_dir_path = checkpoint_dir_path
+        self.metrics_sink = metrics_sink
+        # Background writing of the last checkpoint
+        self.writer = None
+        self.writer_result = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["writer"] = None
+        state["writer_result"] = None
+        return state
 
     def end_generation(self, population):
         if (
@@ -32,25 +51,101 @@ class Checkpointer:
             self.last_generation_checkpoint = population.generation
 
     def save_checkpoint(self, population):
-        """Save the current simulation state."""
-        if len(os.listdir(self.checkpoint_dir_path)) > 2:
-            removed_checkpoint_name = sorted(
-                os.listdir(self.checkpoint_dir_path), key=lambda name: int(name[11:])
-            )[0]
-            os.remove(os.path.join(self.checkpoint_dir_path, removed_checkpoint_name))
+        """
+        Save the current simulation state.
+
+        The population is pickled on the training thread (a consistent snapshot of the end of the generation), then it
+        is compressed and written by a background thread while the next generation runs. The file is written under a
+        temporary name and renamed once complete, so a crash never leaves a truncated checkpoint-<generation> file.
+        """
+        # Only one checkpoint is written at a time
+        self.wait()
+
+        checkpoint_names = self.list_checkpoints(self.checkpoint_dir_path)
+        if len(checkpoint_names) > 2:
+            os.remove(os.path.join(self.checkpoint_dir_path, checkpoint_names[0]))
+        # Temporary files left by an interrupted training
+        for name in os.listdir(self.checkpoint_dir_path):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(self.checkpoint_dir_path, name))
 
         output_file_name = f"checkpoint-{population.generation}"
         output_file_path = os.path.join(self.checkpoint_dir_path, output_file_name)
         print(f"Saving checkpoint to {output_file_path}")
 
-        with gzip.open(output_file_path, "w", compresslevel=5) as f:
-            data = (population, random.getstate())
-            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        start_time = time.perf_counter()
+        if training_config.CHECKPOINT_FORMAT == "array":
+            arrays, metadata = pack_population(population)
+            write_data = lambda raw_file: write_arrays(raw_file, arrays, metadata)
+        else:
+            data = pickle.dumps((population, random.getstate()), protocol=pickle.HIGHEST_PROTOCOL)
+            write_data = lambda raw_file: self.write_compressed(raw_file, data)
+        snapshot_time = time.perf_counter() - start_time
+
+        self.writer = threading.Thread(
+            target=self.write_checkpoint, args=(write_data, output_file_path, population.generation, snapshot_time)
+        )
+        self.writer.start()
 
     @staticmethod
-    def restore_checkpoint(filename):
-        """Resumes the simulation from a previous saved point."""
+    def write_compressed(raw_file, data):
+        with gzip.GzipFile(fileobj=raw_file, mode="wb", compresslevel=5) as f:
+            f.write(data)
+
+    def write_checkpoint(self, write_data, output_file_path, generation, snapshot_time):
+        """Writes a checkpoint snapshot with write_data(file) (run by the writer thread)."""
+        try:
+            start_time = time.perf_counter()
+            temp_file_path = f"{output_file_path}.tmp"
+            with open(temp_file_path, "wb") as raw_file:
+                write_data(raw_file)
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+            os.replace(temp_file_path, output_file_path)
+            self.writer_result = (generation, snapshot_time, time.perf_counter() - start_time,
+                                  os.path.getsize(output_file_path))
+        except Exception as exception:
+            self.writer_result = exception
+
+    def wait(self):
+        """Waits for the checkpoint being written (if any) and raises the error of its writer if it failed."""
+        if self.writer is None:
+            return
+        self.writer.join()
+        self.writer = None
+        result, self.writer_result = self.writer_result, None
+        if isinstance(result, Exception):
+            raise result
+
+        if self.metrics_sink is not None:
+            generation, snapshot_time, write_time, size = result
+            self.metrics_sink.write("checkpoint", generation=generation, snapshot_time=round(snapshot_time, 4),
+                                    write_time=round(write_time, 4), size=size)
+            self.metrics_sink.flush()
+
+    @staticmethod
+    def list_checkpoints(checkpoint_dir_path):
+        """Returns the names of the complete checkpoints of a directory, from the oldest to the most recent."""
+        return sorted(
+            (name for name in os.listdir(checkpoint_dir_path)
+             if name.startswith("checkpoint-") and name[11:].isdigit()),
+            key=lambda name: int(name[11:])
+        )
+
+    @staticmethod
+    def restore_checkpoint(filename, neat_config=None):
+        """
+        Resumes the simulation from a previous saved point.
+        The array checkpoints don't store the neat configuration, it must be given to restore them. The components set
+        by the training config (profiler, exports, trajectories...) are rebuilt from the current config.
+        """
+        if is_array_checkpoint(filename):
+            if neat_config is None:
+                raise ValueError("The neat configuration is needed to restore an array checkpoint")
+            return ArrayCheckpoint(filename).restore_population(neat_config, os.path.dirname(filename))
+
         with gzip.open(filename) as f:
             population, rndstate = pickle.load(f)
-            random.setstate(rndstate)
-            return population
+        random.setstate(rndstate)
+        population.configure(os.path.dirname(filename))
+        return population
@@ -1,5 +1,12 @@
+import numpy as np
 from neat.graphs import feed_forward_layers
 
+from .vectorized import ACTIVATIONS, is_vectorizable, node_layers
+
+# Below this mean number of links per layer, the fixed cost of the NumPy calls of a compiled layer is higher than the
+# Python loop over the links (e.g. the small player networks)
+MIN_LINKS_PER_LAYER_COMPILED = 20
+
 
 class FeedForwardNetwork(object):
     def __init__(self, inputs, outputs, node_evals):
@@ -26,26 +33,88 @@ class FeedForwardNetwork(object):
         return [self.values[i] for i in self.output_nodes]
 
     @staticmethod
-    def create(genome, config):
-        """ Receives a genome and returns its phenotype (a FeedForwardNetwork). """
+    def create(genome, config, compiled=False):
+        """
+        Receives a genome and returns its phenotype (a FeedForwardNetwork).
+        If compiled, returns a CompiledFeedForwardNetwork when all its functions can be vectorised and its layers are
+        large enough to benefit from it.
+        """
 
-        # Gather expressed connections.
+        # Gather expressed connections, indexed by output node.
         connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+        links_by_node = {}
+        for cg in genome.connections.values():
+            if cg.enabled:
+                inode, onode = cg.key
+                links_by_node.setdefault(onode, []).append((inode, cg.weight))
 
         layers = feed_forward_layers(config.genome_config.input_keys, config.genome_config.output_keys, connections)
         node_evals = []
         for layer in layers:
             for node in layer:
-                inputs = []
-                for conn_key in connections:
-                    inode, onode = conn_key
-                    if onode == node:
-                        cg = genome.connections[conn_key]
-                        inputs.append((inode, cg.weight))
+                inputs = links_by_node.get(node, [])
 
                 ng = genome.nodes[node]
                 aggregation_function = config.genome_config.aggregation_function_defs.get(ng.aggregation)
                 activation_function = config.genome_config.activation_defs.get(ng.activation)
                 node_evals.append((node, activation_function, aggregation_function, ng.bias, ng.response, inputs))
 
-        return FeedForwardNetwork(config.genome_config.input_keys, config.genome_config.output_keys, node_evals)
\ No newline at end of file
+        nb_links = sum(len(links) for *_, links in node_evals)
+        if compiled and nb_links >= MIN_LINKS_PER_LAYER_COMPILED * len(layers) and is_vectorizable(node_evals):
+            return CompiledFeedForwardNetwork(config.genome_config.input_keys, config.genome_config.output_keys,
+                                              node_evals)
+        return FeedForwardNetwork(config.genome_config.input_keys, config.genome_config.output_keys, node_evals)
+
+
+class CompiledFeedForwardNetwork(FeedForwardNetwork):
+    """
+    FeedForwardNetwork compiled into one dense weight matrix per layer of feed_forward_layers, so an activation is
+    one matrix product and one vectorised activation per layer instead of a Python loop over the nodes and links.
+
+    The values of the nodes are stored in a vector : the inputs, then the nodes layer by layer, and a last value always
+    equal to 0 for the outputs unreachable from the inputs. The weights of a layer only cover the values before it and
+    are already multiplied by the response of their node.
+    """
+
+    def __init__(self, inputs, outputs, node_evals):
+        super().__init__(inputs, outputs, node_evals)
+        columns = dict((key, i) for i, key in enumerate(inputs))
+        self.layers = []
+        first_column = len(inputs)
+        for layer in node_layers(inputs, node_evals):
+            weights = np.zeros((len(layer), first_column))
+            biases = np.zeros(len(layer))
+            act_funcs = []
+            for slot, (node, act_func, agg_func, bias, response, links) in enumerate(layer):
+                columns[node] = first_column + slot
+                for i, w in links:
+                    weights[slot, columns[i]] = response * w
+                biases[slot] = bias
+                act_funcs.append(act_func)
+
+            activation_groups = [
+                (ACTIVATIONS[f], np.array([act_func == f for act_func in act_funcs]))
+                for f in dict.fromkeys(act_funcs)
+            ]
+            self.layers.append((first_column, weights, biases, activation_groups))
+            first_column += len(layer)
+
+        self.output_columns = np.array([columns.get(key, first_column) for key in outputs], dtype=int)
+        self.values_vector = np.zeros(first_column + 1)
+
+    def activate(self, inputs):
+        if len(self.input_nodes) != len(inputs):
+            raise RuntimeError("Expected {0:n} inputs, got {1:n}".format(len(self.input_nodes), len(inputs)))
+
+        values = self.values_vector
+        values[:len(inputs)] = inputs
+
+        for first_column, weights, biases, activation_groups in self.layers:
+            z = weights @ values[:first_column] + biases
+            if len(activation_groups) == 1:
+                values[first_column:first_column + len(z)] = activation_groups[0][0](z)
+            else:
+                for act_func, mask in activation_groups:
+                    values[first_column:first_column + len(z)][mask] = act_func(z[mask])
+
+        return values[self.output_columns].tolist()
@@ -0,0 +1,74 @@
+"""
+Cache of the fitness earned by the genomes in the episodes, saved with the checkpoints.
+
+It is disabled by default when RESAMPLE_EPISODES is set (FITNESS_CACHE_SIZE = 0) : the episodes of a generation are
+never played again, the cache would only hash the genomes. Without RESAMPLE_EPISODES the same episodes are played at
+every generation, and the genomes unchanged since the last generation (elites) are not simulated again against the same
+opponents.
+"""
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from .network_cache import genome_hash
+
+KEY_SIZE = 16
+
+
+class FitnessCache:
+    """
+    LRU cache of the fitness earned by a genome during an episode, keyed by the phenotype of the genome (genome_hash)
+    and a digest of the episode (see evaluation.episode_key : its random streams, the opponent net and the rules).
+
+    The episodes are deterministic and the fitness of a genome in an episode doesn't depend on the other genomes (they
+    all face their own copy of the opponent), so a genome already evaluated in the same episode isn't simulated again :
+    the elites kept unchanged by the reproduction when the episodes are not resampled (RESAMPLE_EPISODES), the
+    duplicated genomes, or a generation evaluated again after restoring a checkpoint.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.fitnesses = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(genome, episode_key: bytes, phenotype_hash=None) -> bytes:
+        """Key of a genome in an episode, phenotype_hash is its genome_hash if already computed."""
+        phenotype_hash = phenotype_hash or genome_hash(genome)
+        return hashlib.blake2b(phenotype_hash.encode() + episode_key, digest_size=KEY_SIZE).digest()
+
+    def get(self, key: bytes):
+        """Fitness of the key, None if it isn't in the cache."""
+        fitness = self.fitnesses.get(key)
+        if fitness is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.fitnesses.move_to_end(key)
+        return fitness
+
+    def put(self, key: bytes, fitness: float):
+        self.fitnesses[key] = fitness
+        self.fitnesses.move_to_end(key)
+        if len(self.fitnesses) > self.max_size:
+            self.fitnesses.popitem(last=False)
+
+    def __len__(self):
+        return len(self.fitnesses)
+
+    def to_arrays(self):
+        """Keys (uint8 rows) and fitnesses of the cache, from the least recently used, for the array checkpoints."""
+        keys = np.frombuffer(b"".join(self.fitnesses), dtype=np.uint8).reshape(-1, KEY_SIZE)
+        return keys, np.array(list(self.fitnesses.values()), dtype=np.float64)
+
+    @staticmethod
+    def from_arrays(max_size, keys, fitnesses):
+        cache = FitnessCache(max_size)
+        for key, fitness in zip(keys, fitnesses.tolist()):
+            cache.put(key.tobytes(), fitness)
+        return cache
+
+    def __str__(self):
+        return f"Fitness cache : {len(self.fitnesses)} episodes, {self.hits} hits, {self.misses} misses"
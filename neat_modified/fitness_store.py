@@ -0,0 +1,128 @@
+"""Storage of the fitness of every genome at every episode of every generation."""
+import os
+
+import numpy as np
+
+
+class FitnessStore:
+    """
+    Fitnesses of the genomes stored in preallocated float32 (generation x episode x genome) blocks.
+
+    Appending an episode writes one row of the current block, and the running sum of the fitnesses of the current
+    generation is kept to get the fitness of an episode from the total fitness of the genomes. The stats read views of
+    the blocks (generation(), running_sums) instead of rebuilding arrays.
+
+    If a directory is given, the blocks are memory-mapped .npy files so long trainings don't keep the whole history in
+    memory (and the history is not pickled with the checkpoints, only the paths of the files).
+    The episodes where a genome was not simulated are NaN.
+    """
+
+    def __init__(self, max_episodes: int, directory=None, generations_per_block: int = 32):
+        self.max_episodes = max_episodes
+        self.directory = directory
+        self.generations_per_block = generations_per_block
+        self.blocks = []
+        # (block index, index in the block), number of episodes and number of genomes of each generation
+        self.locations = []
+        self.nb_episodes = []
+        self.nb_genomes = []
+        self.running_sums = None
+
+    def __len__(self):
+        return len(self.locations)
+
+    def new_block(self, nb_genomes: int):
+        shape = (self.generations_per_block, self.max_episodes, nb_genomes)
+        if self.directory is None:
+            block = np.empty(shape, dtype=np.float32)
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.block_path(len(self.blocks))
+            # A block file left past the restored history (a run continued from an older checkpoint) is reused
+            # instead of being truncated
+            block = np.load(path, mmap_mode="r+") if os.path.exists(path) else None
+            if block is None or block.shape != shape or block.dtype != np.float32:
+                block = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+        block[:] = np.nan
+        self.blocks.append(block)
+
+    def block_path(self, block_index: int):
+        return os.path.join(self.directory, f"fitnesses-{block_index}.npy")
+
+    def start_generation(self, nb_genomes: int):
+        if self.blocks:
+            block_index, index = self.locations[-1]
+            block = self.blocks[block_index]
+            index += 1
+        if not self.blocks or index == self.generations_per_block or nb_genomes > block.shape[2]:
+            self.new_block(nb_genomes)
+            block_index, index = len(self.blocks) - 1, 0
+
+        self.locations.append((block_index, index))
+        self.nb_episodes.append(0)
+        self.nb_genomes.append(nb_genomes)
+        self.running_sums = np.zeros(nb_genomes)
+
+    def add_episode(self, fitnesses):
+        """Appends the fitness of each genome during the last episode of the current generation."""
+        nb_episodes = self.nb_episodes[-1]
+        if nb_episodes == self.max_episodes:
+            raise IndexError(f"The fitness store is limited to {self.max_episodes} episodes per generation")
+        block_index, index = self.locations[-1]
+        self.blocks[block_index][index, nb_episodes, :self.nb_genomes[-1]] = fitnesses
+        self.running_sums += np.nan_to_num(fitnesses)
+        self.nb_episodes[-1] += 1
+
+    def generation(self, generation: int = -1):
+        """View of the (episode x genome) fitnesses of a generation."""
+        block_index, index = self.locations[generation]
+        return self.blocks[block_index][index, :self.nb_episodes[generation], :self.nb_genomes[generation]]
+
+    def to_arrays(self):
+        """
+        Arrays and metadata of the store for the array checkpoints : the indexes of the generations, and the blocks
+        themselves only if they are in memory (the memory-mapped blocks are flushed and stay in their files).
+        """
+        metadata = {
+            "locations": self.locations,
+            "nb_episodes": self.nb_episodes,
+            "nb_genomes": self.nb_genomes,
+            "nb_blocks": len(self.blocks),
+            "generations_per_block": self.generations_per_block,
+        }
+        if self.directory is not None:
+            for block in self.blocks:
+                block.flush()
+            return {}, metadata
+        return {f"fitness_block_{block_index}": block for block_index, block in enumerate(self.blocks)}, metadata
+
+    @staticmethod
+    def from_arrays(max_episodes, directory, metadata, arrays):
+        """Rebuilds a store saved by to_arrays, the memory-mapped blocks are reattached to their files."""
+        store = FitnessStore(max_episodes, directory, metadata["generations_per_block"])
+        store.locations = [tuple(location) for location in metadata["locations"]]
+        store.nb_episodes = list(metadata["nb_episodes"])
+        store.nb_genomes = list(metadata["nb_genomes"])
+        if directory is not None:
+            store.blocks = [
+                np.load(store.block_path(block_index), mmap_mode="r+") for block_index in range(metadata["nb_blocks"])
+            ]
+        else:
+            store.blocks = [np.array(arrays[f"fitness_block_{block_index}"])
+                            for block_index in range(metadata["nb_blocks"])]
+        return store
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.directory is not None:
+            for block in self.blocks:
+                block.flush()
+            state["blocks"] = len(self.blocks)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.directory is not None:
+            self.blocks = [
+                np.load(self.block_path(block_index), mmap_mode="r+") for block_index in range(state["blocks"])
+            ]
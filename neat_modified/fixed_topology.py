@@ -0,0 +1,453 @@
+"""
+Fixed-topology engine : when the genomes can't get hidden nodes (num_hidden = 0, no node mutation) every genome is a
+subset of the same input -> output connections (neat never connects two output nodes), so a population is a set of
+(outputs, inputs) arrays : the weights, the connections present in the genome and their enabled flags, plus the bias
+and response of each output node.
+
+The reproduction (crossover and mutation of all the children at once), the speciation distances and the activation of
+the population work on these arrays. The neat genomes are only built for draw_net and the networks built one by one
+(demos, training nets), the array checkpoints store the arrays of the population.
+"""
+import math
+import random
+
+import numpy as np
+from neat import DefaultGenome
+from neat.math_util import mean
+from neat.reproduction import DefaultReproduction
+
+from .species import VectorizedSpeciesSet
+from .vectorized import ACTIVATIONS
+
+FULL_CONNECTIONS = ("full", "full_direct", "full_nodirect")
+
+
+def is_fixed_topology(genome_config) -> bool:
+    """True if the genomes of the config keep the same nodes (the outputs) with vectorisable functions."""
+    activation = genome_config.activation_defs.get(genome_config.activation_options[0])
+    return (
+        genome_config.num_hidden == 0 and genome_config.node_add_prob == 0 and genome_config.node_delete_prob == 0
+        and genome_config.feed_forward and genome_config.initial_connection in FULL_CONNECTIONS + ("unconnected",)
+        and len(genome_config.activation_options) == 1 and len(genome_config.aggregation_options) == 1
+        and genome_config.aggregation_options[0] == "sum" and activation in ACTIVATIONS
+    )
+
+
+class Topology:
+    """Nodes shared by all the genomes : the input and output keys and the functions of the output nodes."""
+
+    def __init__(self, input_keys, output_keys, activation, aggregation):
+        self.input_keys = list(input_keys)
+        self.output_keys = list(output_keys)
+        self.activation = activation
+        self.aggregation = aggregation
+        self.input_index = dict((key, i) for i, key in enumerate(self.input_keys))
+        self.output_index = dict((key, i) for i, key in enumerate(self.output_keys))
+
+    @staticmethod
+    def from_config(genome_config):
+        return Topology(genome_config.input_keys, genome_config.output_keys, genome_config.activation_options[0],
+                        genome_config.aggregation_options[0])
+
+    def to_dict(self):
+        """Keys and functions of the nodes (JSON metadata of the array checkpoints), see Topology(**values)."""
+        return {"input_keys": self.input_keys, "output_keys": self.output_keys, "activation": self.activation,
+                "aggregation": self.aggregation}
+
+    @property
+    def shape(self):
+        return len(self.output_keys), len(self.input_keys)
+
+
+class ArrayGenome:
+    """
+    Genome of the fixed-topology engine : (outputs, inputs) arrays of the weights, of the connections present and of
+    their enabled flags (absent connections have a null weight and are disabled), and the bias and response of the
+    output nodes. The arrays are usually rows of the arrays of a whole generation and are never modified.
+    """
+
+    def __init__(self, key, topology, weights, present, enabled, biases, responses):
+        self.key = key
+        self.topology = topology
+        self.weights = weights
+        self.present = present
+        self.enabled = enabled
+        self.biases = biases
+        self.responses = responses
+        self.fitness = None
+
+    def node_genes(self):
+        """(key, bias, response, activation, aggregation) of the nodes, in the order of a neat genome."""
+        topology = self.topology
+        return [
+            (key, bias, response, topology.activation, topology.aggregation)
+            for key, bias, response in zip(topology.output_keys, self.biases.tolist(), self.responses.tolist())
+        ]
+
+    def connection_genes(self):
+        """(key, weight, enabled) of the connections, by input then output (order of the full connections)."""
+        topology = self.topology
+        inputs, outputs = np.nonzero(self.present.T)
+        return [
+            ((topology.input_keys[i], topology.output_keys[o]), weight, enabled)
+            for i, o, weight, enabled in zip(inputs.tolist(), outputs.tolist(), self.weights[outputs, inputs].tolist(),
+                                             self.enabled[outputs, inputs].tolist())
+        ]
+
+    def to_genome(self, genome_config):
+        """Returns the DefaultGenome of the same genes."""
+        genome = DefaultGenome(self.key)
+        for key, bias, response, activation, aggregation in self.node_genes():
+            node = genome.nodes[key] = genome_config.node_gene_type(key)
+            node.bias, node.response, node.activation, node.aggregation = bias, response, activation, aggregation
+        for key, weight, enabled in self.connection_genes():
+            connection = genome.connections[key] = genome_config.connection_gene_type(key)
+            connection.weight, connection.enabled = weight, enabled
+        genome.fitness = self.fitness
+        return genome
+
+    @staticmethod
+    def from_genome(genome, topology):
+        """ArrayGenome of a neat genome of the same topology (only output nodes, input -> output connections)."""
+        if set(genome.nodes) != set(topology.output_keys):
+            raise ValueError(f"Genome {genome.key} has hidden nodes, it can't be used by the fixed-topology engine")
+        weights = np.zeros(topology.shape)
+        present = np.zeros(topology.shape, dtype=bool)
+        enabled = np.zeros(topology.shape, dtype=bool)
+        for (input_key, output_key), cg in genome.connections.items():
+            o, i = topology.output_index[output_key], topology.input_index[input_key]
+            weights[o, i], present[o, i], enabled[o, i] = cg.weight, True, cg.enabled
+        biases = np.array([genome.nodes[key].bias for key in topology.output_keys])
+        responses = np.array([genome.nodes[key].response for key in topology.output_keys])
+        array_genome = ArrayGenome(genome.key, topology, weights, present, enabled, biases, responses)
+        array_genome.fitness = genome.fitness
+        return array_genome
+
+    def copy(self):
+        genome = ArrayGenome(self.key, self.topology, self.weights.copy(), self.present.copy(), self.enabled.copy(),
+                             self.biases.copy(), self.responses.copy())
+        genome.fitness = self.fitness
+        return genome
+
+    def size(self):
+        """(number of nodes, number of enabled connections), as DefaultGenome.size."""
+        return len(self.biases), int(np.count_nonzero(self.enabled))
+
+    def __str__(self):
+        return f"Key: {self.key}\nFitness: {self.fitness}\nSize: {self.size()}"
+
+
+class GenomeArrays:
+    """Arrays of the genes of a group of genomes (weights, present and enabled are (genomes, outputs, inputs))."""
+
+    def __init__(self, weights, present, enabled, biases, responses):
+        self.weights = weights
+        self.present = present
+        self.enabled = enabled
+        self.biases = biases
+        self.responses = responses
+
+    @staticmethod
+    def stack(genomes):
+        return GenomeArrays(*(np.stack([getattr(genome, name) for genome in genomes]) for name in
+                              ("weights", "present", "enabled", "biases", "responses")))
+
+    def genomes(self, keys, topology):
+        """ArrayGenomes of the given keys whose arrays are the rows of these arrays."""
+        return [
+            ArrayGenome(key, topology, self.weights[i], self.present[i], self.enabled[i], self.biases[i],
+                        self.responses[i])
+            for i, key in enumerate(keys)
+        ]
+
+
+def init_values(rng, genome_config, name: str, shape):
+    """New values of a float attribute (FloatAttribute.init_value for a whole array)."""
+    init_mean, init_stdev = getattr(genome_config, f"{name}_init_mean"), getattr(genome_config, f"{name}_init_stdev")
+    min_value, max_value = getattr(genome_config, f"{name}_min_value"), getattr(genome_config, f"{name}_max_value")
+    init_type = getattr(genome_config, f"{name}_init_type").lower()
+    if "gauss" in init_type or "normal" in init_type:
+        return np.clip(rng.normal(init_mean, init_stdev, shape), min_value, max_value)
+    if "uniform" in init_type:
+        return rng.uniform(max(min_value, init_mean - 2 * init_stdev), min(max_value, init_mean + 2 * init_stdev),
+                           shape)
+    raise RuntimeError(f"Unknown init_type {init_type!r} for {name}_init_type")
+
+
+def mutate_values(rng, genome_config, name: str, values):
+    """Mutated values of a float attribute (FloatAttribute.mutate_value for a whole array)."""
+    mutate_rate, replace_rate = getattr(genome_config, f"{name}_mutate_rate"), \
+        getattr(genome_config, f"{name}_replace_rate")
+    min_value, max_value = getattr(genome_config, f"{name}_min_value"), getattr(genome_config, f"{name}_max_value")
+    r = rng.random(values.shape)
+    mutated = np.clip(values + rng.normal(0.0, getattr(genome_config, f"{name}_mutate_power"), values.shape),
+                      min_value, max_value)
+    return np.where(r < mutate_rate, mutated,
+                    np.where(r < replace_rate + mutate_rate, init_values(rng, genome_config, name, values.shape),
+                             values))
+
+
+def init_enabled(rng, genome_config, shape):
+    """New enabled flags (BoolAttribute.init_value for a whole array)."""
+    default = str(genome_config.enabled_default).lower()
+    if default in ("1", "on", "yes", "true"):
+        return np.ones(shape, dtype=bool)
+    if default in ("0", "off", "no", "false"):
+        return np.zeros(shape, dtype=bool)
+    if default in ("random", "none"):
+        return rng.random(shape) < 0.5
+    raise RuntimeError(f"Unknown default value {default!r} for enabled")
+
+
+def mutate_enabled(rng, genome_config, enabled):
+    """Mutated enabled flags (BoolAttribute.mutate_value for a whole array)."""
+    mutate_rate = genome_config.enabled_mutate_rate + np.where(enabled, genome_config.enabled_rate_to_false_add,
+                                                               genome_config.enabled_rate_to_true_add)
+    return np.where(rng.random(enabled.shape) < mutate_rate, rng.random(enabled.shape) < 0.5, enabled)
+
+
+def new_arrays(rng, genome_config, topology, nb_genomes: int) -> GenomeArrays:
+    """Genes of new genomes (DefaultGenome.configure_new)."""
+    shape = (nb_genomes,) + topology.shape
+    present = np.full(shape, genome_config.initial_connection in FULL_CONNECTIONS)
+    enabled = init_enabled(rng, genome_config, shape) & present
+    weights = np.where(present, init_values(rng, genome_config, "weight", shape), 0.0)
+    biases = init_values(rng, genome_config, "bias", shape[:2])
+    responses = init_values(rng, genome_config, "response", shape[:2])
+    return GenomeArrays(weights, present, enabled, biases, responses)
+
+
+def crossover(rng, parents1: GenomeArrays, parents2: GenomeArrays) -> GenomeArrays:
+    """
+    Genes of the children of parents1 (the fittest) and parents2 (DefaultGenome.configure_crossover) : the connections
+    of the fittest parent, each attribute of a homologous gene coming from one of the parents at random.
+    """
+    homologous = parents1.present & parents2.present
+    weights = np.where(homologous & (rng.random(homologous.shape) <= 0.5), parents2.weights, parents1.weights)
+    enabled = np.where(homologous & (rng.random(homologous.shape) <= 0.5), parents2.enabled, parents1.enabled)
+    biases = np.where(rng.random(parents1.biases.shape) <= 0.5, parents2.biases, parents1.biases)
+    responses = np.where(rng.random(parents1.responses.shape) <= 0.5, parents2.responses, parents1.responses)
+    return GenomeArrays(weights, parents1.present.copy(), enabled, biases, responses)
+
+
+def mutate(rng, genome_config, genes: GenomeArrays):
+    """Mutates the genes of genomes in place (DefaultGenome.mutate)."""
+    nb_genomes, nb_outputs, nb_inputs = genes.present.shape
+    add_prob, delete_prob = genome_config.conn_add_prob, genome_config.conn_delete_prob
+    if genome_config.single_structural_mutation:
+        r = rng.random(nb_genomes) * max(1, add_prob + delete_prob)
+        add, delete = r < add_prob, (r >= add_prob) & (r < add_prob + delete_prob)
+    else:
+        add, delete = rng.random(nb_genomes) < add_prob, rng.random(nb_genomes) < delete_prob
+
+    # Add connection : a random output node and a random node among the outputs and the inputs, nothing happens for
+    # two outputs or an existing connection (re-enabled if structural_mutation_surer)
+    outputs = rng.integers(0, nb_outputs, nb_genomes)
+    inputs = rng.integers(0, nb_outputs + nb_inputs, nb_genomes) - nb_outputs
+    new_weights = init_values(rng, genome_config, "weight", nb_genomes)
+    new_enabled = init_enabled(rng, genome_config, nb_genomes)
+    add &= inputs >= 0
+    children = np.flatnonzero(add)
+    outputs, inputs = outputs[children], inputs[children]
+    existing = genes.present[children, outputs, inputs]
+    if genome_config.check_structural_mutation_surer():
+        genes.enabled[children[existing], outputs[existing], inputs[existing]] = True
+    created = children[~existing], outputs[~existing], inputs[~existing]
+    genes.present[created] = True
+    genes.weights[created] = new_weights[created[0]]
+    genes.enabled[created] = new_enabled[created[0]]
+
+    # Delete connection : a random connection of the genome
+    present = genes.present.reshape(nb_genomes, -1)
+    nb_connections = np.count_nonzero(present, axis=1)
+    children = np.flatnonzero(delete & (nb_connections > 0))
+    ranks = (rng.random(len(children)) * nb_connections[children]).astype(np.int64)
+    columns = np.argmax(np.cumsum(present[children], axis=1) > ranks[:, np.newaxis], axis=1)
+    present[children, columns] = False
+
+    # Attributes of the connections and of the nodes
+    genes.weights[...] = np.where(genes.present, mutate_values(rng, genome_config, "weight", genes.weights), 0.0)
+    genes.enabled[...] = mutate_enabled(rng, genome_config, genes.enabled) & genes.present
+    genes.biases[...] = mutate_values(rng, genome_config, "bias", genes.biases)
+    genes.responses[...] = mutate_values(rng, genome_config, "response", genes.responses)
+
+
+class FixedTopologyReproduction(DefaultReproduction):
+    """
+    DefaultReproduction of ArrayGenomes : the species, elites and parents are chosen as in DefaultReproduction, then
+    all the children of the generation are created with a few array operations (crossover and mutate). The genes are
+    drawn from a NumPy generator seeded from the random module, so the runs stay reproducible from the run seed.
+    """
+
+    def __init__(self, config, reporters, stagnation):
+        super().__init__(config, reporters, stagnation)
+        self.topology = None
+
+    def create_new(self, genome_type, genome_config, num_genomes):
+        self.topology = Topology.from_config(genome_config)
+        keys = [next(self.genome_indexer) for _ in range(num_genomes)]
+        rng = np.random.default_rng(random.getrandbits(64))
+        genomes = new_arrays(rng, genome_config, self.topology, num_genomes).genomes(keys, self.topology)
+        for key in keys:
+            self.ancestors[key] = tuple()
+        return dict((genome.key, genome) for genome in genomes)
+
+    def reproduce(self, config, species, pop_size, generation):
+        if self.topology is None:
+            self.topology = Topology.from_config(config.genome_config)
+
+        # Same choice of the species, elites and parents as DefaultReproduction.reproduce
+        all_fitnesses = []
+        remaining_species = []
+        for stag_sid, stag_s, stagnant in self.stagnation.update(species, generation):
+            if stagnant:
+                self.reporters.species_stagnant(stag_sid, stag_s)
+            else:
+                all_fitnesses.extend(m.fitness for m in stag_s.members.values())
+                remaining_species.append(stag_s)
+
+        if not remaining_species:
+            species.species = {}
+            return {}
+
+        min_fitness = min(all_fitnesses)
+        max_fitness = max(all_fitnesses)
+        fitness_range = max(1.0, max_fitness - min_fitness)
+        for afs in remaining_species:
+            msf = mean([m.fitness for m in afs.members.values()])
+            afs.adjusted_fitness = (msf - min_fitness) / fitness_range
+
+        adjusted_fitnesses = [s.adjusted_fitness for s in remaining_species]
+        avg_adjusted_fitness = mean(adjusted_fitnesses)
+        self.reporters.info("Average adjusted fitness: {:.3f}".format(avg_adjusted_fitness))
+
+        previous_sizes = [len(s.members) for s in remaining_species]
+        min_species_size = max(self.reproduction_config.min_species_size, self.reproduction_config.elitism)
+        spawn_amounts = self.compute_spawn(adjusted_fitnesses, previous_sizes, pop_size, min_species_size)
+
+        # The children are placeholders (None) in new_population until they are bred all together
+        new_population = {}
+        children, parents1, parents2 = [], [], []
+        species.species = {}
+        for spawn, s in zip(spawn_amounts, remaining_species):
+            spawn = max(spawn, self.reproduction_config.elitism)
+            assert spawn > 0
+
+            old_members = list(s.members.items())
+            s.members = {}
+            species.species[s.key] = s
+            old_members.sort(reverse=True, key=lambda x: x[1].fitness)
+
+            if self.reproduction_config.elitism > 0:
+                for i, m in old_members[:self.reproduction_config.elitism]:
+                    new_population[i] = m
+                    spawn -= 1
+
+            if spawn <= 0:
+                continue
+
+            repro_cutoff = int(math.ceil(self.reproduction_config.survival_threshold * len(old_members)))
+            repro_cutoff = max(repro_cutoff, 2)
+            old_members = old_members[:repro_cutoff]
+
+            while spawn > 0:
+                spawn -= 1
+                parent1_id, parent1 = random.choice(old_members)
+                parent2_id, parent2 = random.choice(old_members)
+                gid = next(self.genome_indexer)
+                new_population[gid] = None
+                self.ancestors[gid] = (parent1_id, parent2_id)
+                # The first parent of the crossover is the fittest one (the second one if they are equal)
+                if parent1.fitness > parent2.fitness:
+                    parents1.append(parent1)
+                    parents2.append(parent2)
+                else:
+                    parents1.append(parent2)
+                    parents2.append(parent1)
+                children.append(gid)
+
+        if children:
+            rng = np.random.default_rng(random.getrandbits(64))
+            genes = crossover(rng, GenomeArrays.stack(parents1), GenomeArrays.stack(parents2))
+            mutate(rng, config.genome_config, genes)
+            for child in genes.genomes(children, self.topology):
+                new_population[child.key] = child
+        return new_population
+
+
+class WeightMatrix:
+    """Arrays of the genes of a population of ArrayGenomes and the distances of a genome to all of them."""
+
+    def __init__(self, genomes):
+        self.genes = GenomeArrays.stack(genomes)
+        self.nb_connections = np.count_nonzero(self.genes.present, axis=(1, 2))
+
+    def distances(self, genome, genome_config):
+        """Distances of an ArrayGenome to all the genomes of the population (DefaultGenome.distance)."""
+        genes = self.genes
+        weight_coefficient = genome_config.compatibility_weight_coefficient
+        disjoint_coefficient = genome_config.compatibility_disjoint_coefficient
+
+        # Same nodes and functions in all the genomes : no disjoint node
+        node_terms = (np.abs(genes.biases - genome.biases) + np.abs(genes.responses - genome.responses)) * \
+            weight_coefficient
+        node_distances = node_terms.sum(axis=1) / len(genome.biases)
+
+        homologous = genes.present & genome.present
+        terms = (np.abs(genes.weights - genome.weights) + (genes.enabled != genome.enabled)) * weight_coefficient
+        total = np.where(homologous, terms, 0.0).sum(axis=(1, 2))
+        disjoint = np.count_nonzero(genes.present != genome.present, axis=(1, 2))
+        max_connections = np.maximum(self.nb_connections, np.count_nonzero(genome.present))
+        connection_distances = np.divide(total + disjoint_coefficient * disjoint, max_connections,
+                                         out=np.zeros(len(total)), where=max_connections > 0)
+        return node_distances + connection_distances
+
+
+class FixedTopologySpeciesSet(VectorizedSpeciesSet):
+    """VectorizedSpeciesSet of ArrayGenomes, the distances are computed from their arrays (see WeightMatrix)."""
+
+    def gene_matrix(self, population):
+        return WeightMatrix(list(population.values()))
+
+
+class FixedTopologyNetworks:
+    """
+    Phenotype of a population of ArrayGenomes, with the interface of BatchFeedForwardNetwork : the whole population
+    is activated with one matrix product. As with the neat networks, an output without enabled connection is 0.
+    """
+
+    def __init__(self, input_nodes, output_nodes, weights, biases, responses, connected, activation):
+        self.input_nodes = input_nodes
+        self.output_nodes = output_nodes
+        self.weights = weights
+        self.biases = biases
+        self.responses = responses
+        self.connected = connected
+        self.activation = activation
+
+    def __len__(self):
+        return len(self.weights)
+
+    def activate(self, inputs, ids=None):
+        """Same as BatchFeedForwardNetwork.activate."""
+        inputs = np.asarray(inputs, dtype=float)
+        if inputs.size == 0:
+            return np.zeros((0, len(self.output_nodes)))
+        if len(self.input_nodes) != inputs.shape[1]:
+            raise RuntimeError("Expected {0:n} inputs, got {1:n}".format(len(self.input_nodes), inputs.shape[1]))
+        weights, biases, responses, connected = self.weights, self.biases, self.responses, self.connected
+        if ids is not None:
+            ids = np.asarray(ids, dtype=int)
+            weights, biases, responses, connected = weights[ids], biases[ids], responses[ids], connected[ids]
+        s = np.matmul(weights, inputs[:, :, np.newaxis])[:, :, 0]
+        return np.where(connected, self.activation(biases + responses * s), 0.0)
+
+    @staticmethod
+    def create(genomes, neat_config):
+        genes = GenomeArrays.stack(genomes)
+        genome_config, topology = neat_config.genome_config, genomes[0].topology
+        return FixedTopologyNetworks(
+            topology.input_keys, topology.output_keys, np.where(genes.enabled, genes.weights, 0.0), genes.biases,
+            genes.responses, genes.enabled.any(axis=2),
+            ACTIVATIONS[genome_config.activation_defs.get(topology.activation)],
+        )
@@ -1,26 +1,27 @@
 """
 Better Reporter ever created
 """
-import time
 import graphviz
 from tabulate import tabulate
-from dataclasses import dataclass, field
 from neat.math_util import mean, stdev
 import numpy as np
-from typing import List
 import matplotlib.pyplot as plt
 
 import config
+from .fitness_store import FitnessStore
+from .fixed_topology import ArrayGenome
+from .hall_of_fame import HallOfFame
+from .metrics_sink import fitness_quantiles
+from .step_timer import StepTimer, INIT, UPDATE, DISPLAY
 
 
-@dataclass
-class StatsTimeEpisode:
-    start_time_episode: float = 0
-    end_time_init: float = 0
-    start_time_step: float = 0
-    update_time_steps: List[float] = field(default_factory=lambda: [])
-    display_time_steps: List[float] = field(default_factory=lambda: [])
-    nb_steps_episode: int = 0
+def steps_per_sec(nb_steps, time_update, time_episode):
+    """
+    Simulation speed of the metrics, from the update time of the steps, or from the wall time of the episodes if the
+    steps weren't timed (simulated by the workers, step timing disabled). None if nothing was simulated.
+    """
+    time = time_update or time_episode
+    return round(nb_steps / time, 1) if nb_steps and time else None
 
 
 class GenomeReporter:
@@ -31,62 +32,115 @@ class GenomeReporter:
     - Draw the net of a given genome
     """
 
-    def __init__(self):
-        self.genomes = []
-        self.all_fitnesses = []
+    def __init__(self, fitness_store_dir=None, metrics_sink=None):
+        # Most fit genomes ever seen, the last generation sorted by fitness and summaries of the past generations
+        self.hall_of_fame = HallOfFame(config.HALL_OF_FAME_SIZE)
+        self.last_genomes = []
+        self.best_fitnesses_generations = []
+        self.fitness_means = []
+        self.fitness_stdevs = []
+        # Fitness of every genome at every episode of every generation (memory-mapped in fitness_store_dir if any)
+        self.all_fitnesses = FitnessStore(config.MAX_NUMBER_EPISODE, fitness_store_dir)
         self.time_generations = []
-        self.stats_time_episode = StatsTimeEpisode()
+        self.step_timer = StepTimer(config.STEP_TIMING, config.STEP_TIMING_SAMPLING_PERIOD)
+        self.start_time_episode = 0
+        self.steps_generations = []
+        # Wall time (s) of each episode, measured around the whole episode (simulated here or by the workers)
+        self.episode_times_generations = []
+        # Export of the episode, generation and checkpoint records (None : no export)
+        self.metrics_sink = metrics_sink
         self.current_generation = 0
         self.current_episode = 0
 
         # Parameters to know when to end a generation
         self.ranking_id_last_episode = None
 
-    def start_generation(self):
+    def start_generation(self, nb_genomes):
         self.current_generation += 1
-        self.all_fitnesses.append([])
+        self.all_fitnesses.start_generation(nb_genomes)
         self.time_generations.append([[], [], []])
+        self.steps_generations.append([])
+        self.episode_times_generations.append([])
 
-    def end_generation(self, genomes_generation):
+    def end_generation(self, genomes_generation, species_values=None):
         sorted_genomes = sorted(
             genomes_generation, key=lambda genome: genome.fitness, reverse=True
         )
-        self.genomes.append(sorted_genomes)
+        self.last_genomes = sorted_genomes
+        for genome in sorted_genomes[:config.HALL_OF_FAME_SIZE]:
+            self.hall_of_fame.add(genome)
+        fitnesses = [genome.fitness for genome in sorted_genomes]
+        self.best_fitnesses_generations.append(fitnesses[:config.HALL_OF_FAME_SIZE])
+        self.fitness_means.append(mean(fitnesses))
+        self.fitness_stdevs.append(stdev(fitnesses))
+
+        if self.metrics_sink is not None:
+            time_generation = sum(self.episode_times_generations[-1])
+            time_update = sum(self.time_generations[-1][1])
+            nb_steps = sum(self.steps_generations[-1])
+            self.metrics_sink.write(
+                "generation",
+                generation=self.current_generation,
+                episodes=self.current_episode,
+                fitness=fitness_quantiles(fitnesses),
+                species={str(species.key): len(species.members) for species in species_values or []},
+                time=round(time_generation, 4),
+                steps=nb_steps,
+                steps_per_sec=steps_per_sec(nb_steps, time_update, time_generation),
+            )
+            self.metrics_sink.flush()
 
         self.current_episode = 0
 
     def start_episode(self):
         self.current_episode += 1
         # Time stats
-        self.stats_time_episode.start_time_episode = time.time()
-
-    def end_episode(self, genomes):
+        self.step_timer.start_episode()
+        self.start_time_episode = self.step_timer.now()
+
+    def end_episode(self, genomes, simulated=None, nb_steps=0):
+        """
+        Stores the fitness of each genome during the episode. The genomes not simulated during the episode (simulated
+        is a mask of the genomes, all are simulated if None) get a NaN fitness.
+        """
+        self.steps_generations[-1].append(nb_steps)
+        self.episode_times_generations[-1].append((self.step_timer.now() - self.start_time_episode) / 1e9)
         # Time stats
-        self.time_generations[-1][0].append(self.stats_time_episode.end_time_init)
-        self.time_generations[-1][1].append(sum(self.stats_time_episode.update_time_steps))
-        self.time_generations[-1][2].append(sum(self.stats_time_episode.display_time_steps))
-        self.stats_time_episode = StatsTimeEpisode()
-        # Fitness stats
-        sum_fitness_episode = np.sum(self.all_fitnesses[-1], axis=0)
-        self.all_fitnesses[-1].append([])
-        for i, (genome_id, genome) in enumerate(genomes):
-            if self.current_episode > 1:
-                self.all_fitnesses[-1][-1].append(genome.fitness - sum_fitness_episode[i])
-            else:
-                self.all_fitnesses[-1][-1].append(genome.fitness)
-
-    def set_init_time_episode(self):
-        self.stats_time_episode.end_time_init = time.time() - self.stats_time_episode.start_time_episode
-
-    def set_start_time_step(self):
-        self.stats_time_episode.start_time_step = time.time()
+        for i, phase in enumerate((INIT, UPDATE, DISPLAY)):
+            self.time_generations[-1][i].append(self.step_timer.get_episode_time(phase))
+        # Fitness stats : the fitness of the genomes is their total over the episodes
+        fitnesses_episode = np.array([genome.fitness for genome_id, genome in genomes]) - self.all_fitnesses.running_sums
+        if simulated is not None:
+            fitnesses_episode[~simulated] = np.nan
+        self.all_fitnesses.add_episode(fitnesses_episode)
+
+    def write_episode_metrics(self, rank_changes=None):
+        """Exports the record of the last episode (fitnesses, rank changes of the 20 best genomes and timings)."""
+        if self.metrics_sink is None:
+            return
+        time_init, time_update, time_display = (times[-1] for times in self.time_generations[-1])
+        nb_steps = self.steps_generations[-1][-1]
+        time_episode = self.episode_times_generations[-1][-1]
+        self.metrics_sink.write(
+            "episode",
+            generation=self.current_generation,
+            episode=self.current_episode,
+            fitness=fitness_quantiles(self.all_fitnesses.generation()[-1]),
+            rank_changes=rank_changes,
+            time_init=round(time_init, 4),
+            time_update=round(time_update, 4),
+            time_display=round(time_display, 4),
+            episode_time=round(time_episode, 4),
+            steps=nb_steps,
+            steps_per_sec=steps_per_sec(nb_steps, time_update, time_episode),
+        )
 
-    def set_update_time_step(self):
-        self.stats_time_episode.update_time_steps.append(time.time() - self.stats_time_episode.start_time_step)
+    def get_nb_episodes_genomes(self):
+        """Number of episodes where each genome was simulated during the current generation."""
+        return np.count_nonzero(~np.isnan(self.all_fitnesses.generation()), axis=0)
 
-    def set_display_time_step(self):
-        self.stats_time_episode.display_time_steps.append((time.time() - self.stats_time_episode.start_time_step) -
-                                                          self.stats_time_episode.update_time_steps[-1])
+    def set_init_time_episode(self):
+        self.step_timer.record(INIT, self.start_time_episode, sampled=False)
 
     def print_time_stats(self):
         np_time_generations_per_episode = np.sum(np.transpose(np.array(self.time_generations), (0, 2, 1)), axis=2)
@@ -106,14 +160,13 @@ class GenomeReporter:
         print(
             f"Mean time display during episodes : {np.round(mean_time_display_per_generation, 2)} "
             f"{(100 * mean_time_display_per_generation / mean_time_episode_per_generation).astype(int)}%")
+        print(f"\n{self.step_timer}")
         print("\n")
 
     def print_best_fitnesses(self, nb_genomes):
         table = [["GEN", "MEAN"] + [f"Genome_{i + 1}" for i in range(nb_genomes)]]
-        for generation, genomes_generation in enumerate(self.genomes):
-            fitness_genomes = [
-                                  round(genome.fitness, 2) for genome in genomes_generation
-                              ][:nb_genomes]
+        for generation, best_fitnesses in enumerate(self.best_fitnesses_generations):
+            fitness_genomes = [round(fitness, 2) for fitness in best_fitnesses[:nb_genomes]]
             mean_fitness_genomes = round(mean(fitness_genomes), 2)
             table.append(
                 [str(generation + 1), str(mean_fitness_genomes)]
@@ -146,7 +199,7 @@ class GenomeReporter:
         return total_rank_changes
 
     def print_species_stats(self, species_values):
-        all_fitness = np.mean(self.all_fitnesses[-1], axis=0)
+        all_fitness = np.nanmean(self.all_fitnesses.generation(), axis=0)
         fitness_range = max(1.0, max(all_fitness) - min(all_fitness))
 
         for species in species_values:
@@ -160,27 +213,28 @@ class GenomeReporter:
             print("\n")
 
     def plot_fitness_repartition(self):
-        nb_plots = self.current_generation + 1
+        fitnesses_generation = self.all_fitnesses.generation()
 
         fig, ax = plt.subplots(figsize=(12, 8))
 
         colors = ['b', 'g', 'c', 'm', 'y', 'orange', 'purple', 'brown', 'pink', 'olive']
 
-        for i in range(nb_plots - 1):
-            ax.hist(self.all_fitnesses[-1][i], bins=30, color=colors[i], alpha=0.5, label=f"Episode {i + 1}")
+        for i, fitnesses_episode in enumerate(fitnesses_generation):
+            ax.hist(fitnesses_episode[~np.isnan(fitnesses_episode)], bins=30, color=colors[i % len(colors)],
+                    alpha=0.5, label=f"Episode {i + 1}")
 
-        ax.hist(np.mean(self.all_fitnesses[-1], axis=0), bins=30, color='red', alpha=0.7, label='MEAN')
+        ax.hist(np.nanmean(fitnesses_generation, axis=0), bins=30, color='red', alpha=0.7, label='MEAN')
 
         ax.set_xlabel('Fitness')
         ax.set_ylabel('Frequency')
-        ax.set_title(f'Fitness Repartition Generation {len(self.genomes)}')
+        ax.set_title(f'Fitness Repartition Generation {self.current_generation}')
         ax.legend()
 
         plt.show()
 
     def get_generation_stats(self):
 
-        best_mean_fitness = sorted(np.mean(self.all_fitnesses[-1], axis=0), reverse=True)[:10]
+        best_mean_fitness = sorted(np.nanmean(self.all_fitnesses.generation(), axis=0), reverse=True)[:10]
         mean_fitness = round(mean(best_mean_fitness), 2)
         absolute_deviation = [abs(mean_fitness_genome - mean_fitness) for mean_fitness_genome in best_mean_fitness]
         mean_absolute_deviation = round(mean(absolute_deviation), 2)
@@ -191,33 +245,19 @@ class GenomeReporter:
         print(f"Mean 10 best fitnesses = {mean_fitness}")
         print(f"Mean abs dev = {mean_absolute_deviation} | Mean std dev = {mean_standard_deviation}")
 
-    def get_fitness_stat(self, f, generation):
-        if generation is not None:
-            return f([genome.fitness for genome in self.genomes[generation]])
-        return [
-            f([genome.fitness for genome in genomes_generation])
-            for genomes_generation in self.genomes
-        ]
-
     def get_fitness_mean(self, generation=None):
         """Get the per-generation mean fitness."""
-        return self.get_fitness_stat(mean, generation)
+        return self.fitness_means if generation is None else self.fitness_means[generation]
 
     def get_fitness_stdev(self, generation=None):
         """Get the per-generation standard deviation of the fitness."""
-        return self.get_fitness_stat(stdev, generation)
+        return self.fitness_stdevs if generation is None else self.fitness_stdevs[generation]
 
     def best_genomes(self, n, all_generations=True):
-        """Returns the n most fit genomes ever seen."""
+        """Returns the n most fit genomes ever seen (at most HALL_OF_FAME_SIZE) or of the last generation."""
         if all_generations:
-            all_genomes = []
-            for genomes_generation in self.genomes:
-                all_genomes.extend(genomes_generation)
-            best_n_genomes = sorted(
-                all_genomes, key=lambda genome: genome.fitness, reverse=True
-            )[:n]
-            return best_n_genomes
-        return self.genomes[-1][:n]
+            return self.hall_of_fame.best_genomes(n)
+        return self.last_genomes[:n]
 
     @staticmethod
     def draw_net(
@@ -231,6 +271,8 @@ class GenomeReporter:
             fmt="png",
     ):
         """Receives a genome and draws a neural network with arbitrary topology."""
+        if isinstance(genome, ArrayGenome):
+            genome = genome.to_genome(config.genome_config)
 
         if node_names is None:
             # node_names = {-1: "delta_y", -2: "delta_x", 0: "up_down",
@@ -0,0 +1,89 @@
+"""Bounded collection of the most fit genomes ever seen."""
+import heapq
+import itertools
+
+from .fixed_topology import ArrayGenome
+
+
+class HallOfFame:
+    """
+    Keeps the max_size most fit genomes ever seen in a min-heap keyed by fitness, so adding a genome is O(log k) and
+    the least fit genome of the hall is the one replaced.
+
+    A genome is stored once per key (elites are evaluated again at each generation) : a copy of the genome is kept with
+    its best fitness. Replaced entries are only marked as removed and the heap is rebuilt when they take too much room.
+    The genomes restored from a checkpoint are only built when they are asked for (see add_lazy).
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # Entries [fitness, counter, key, genome], key is None for the removed entries and genome is a function building
+        # the genome for the lazy entries
+        self.heap = []
+        self.entries = {}
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, genome):
+        if self.is_admitted(genome.key, genome.fitness):
+            self.push(genome.key, genome.fitness, self.copy(genome))
+
+    def add_lazy(self, key, fitness, build_genome):
+        """Adds a genome which is built by build_genome() the first time it is returned by best_genomes."""
+        if self.is_admitted(key, fitness):
+            self.push(key, fitness, build_genome)
+
+    def is_admitted(self, key, fitness):
+        """Returns True if a genome enters the hall, making room for it (removing its previous entry or the least fit)."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            if fitness <= entry[0]:
+                return False
+            self.remove(key)
+        elif len(self.entries) >= self.max_size:
+            self.pop_removed()
+            if fitness <= self.heap[0][0]:
+                return False
+            self.remove(self.heap[0][2])
+        return True
+
+    def push(self, key, fitness, genome):
+        entry = [fitness, next(self.counter), key, genome]
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+        if len(self.heap) > 2 * self.max_size:
+            self.heap = [entry for entry in self.heap if entry[2] is not None]
+            heapq.heapify(self.heap)
+
+    @staticmethod
+    def copy(genome):
+        """Copy of a genome (its genes are copied, much faster than a deepcopy)."""
+        if isinstance(genome, ArrayGenome):
+            return genome.copy()
+        genome_copy = type(genome)(genome.key)
+        genome_copy.nodes = {key: node.copy() for key, node in genome.nodes.items()}
+        genome_copy.connections = {key: connection.copy() for key, connection in genome.connections.items()}
+        genome_copy.fitness = genome.fitness
+        return genome_copy
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        entry[2] = entry[3] = None
+
+    def pop_removed(self):
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+
+    def best_genomes(self, n: int):
+        """Returns the n most fit genomes of the hall (with the fitness of their best evaluation)."""
+        best_entries = heapq.nlargest(n, self.entries.values())
+        for entry in best_entries:
+            if callable(entry[3]):
+                entry[3] = entry[3]()
+        return [genome for _, _, _, genome in best_entries]
+
+    def best_fitnesses(self, n: int):
+        """Returns the keys of the n most fit genomes of the hall and their best fitness (without building them)."""
+        return {key: fitness for fitness, _, key, _ in heapq.nlargest(n, self.entries.values())}
@@ -0,0 +1,48 @@
+"""Streaming export of the training metrics as JSON Lines."""
+import json
+
+import numpy as np
+
+
+def fitness_quantiles(fitnesses):
+    """Min, quartiles, max and mean of the fitnesses (NaN ignored), rounded for compact records."""
+    fitnesses = np.asarray(fitnesses, dtype=float)
+    fitnesses = fitnesses[~np.isnan(fitnesses)]
+    if not fitnesses.size:
+        return {}
+    q = np.quantile(fitnesses, [0, 0.25, 0.5, 0.75, 1])
+    return {
+        "min": round(float(q[0]), 4), "q1": round(float(q[1]), 4), "median": round(float(q[2]), 4),
+        "q3": round(float(q[3]), 4), "max": round(float(q[4]), 4), "mean": round(float(fitnesses.mean()), 4),
+    }
+
+
+class MetricsSink:
+    """
+    Appends one compact JSON record per line to a file (the record type is in the "event" field), so a run can be
+    followed with `tail -f` and analysed afterwards without parsing the standard output.
+
+    The records are buffered and appended to the file every buffer_size records (and by flush(), the buffer is also
+    flushed when the sink is pickled with a checkpoint). Nothing is kept in memory once written.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 64):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = []
+
+    def write(self, event: str, **fields):
+        self.buffer.append(json.dumps({"event": event, **fields}, separators=(",", ":")))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        with open(self.path, "a") as f:
+            f.write("\n".join(self.buffer) + "\n")
+        self.buffer = []
+
+    def __getstate__(self):
+        self.flush()
+        return self.__dict__.copy()
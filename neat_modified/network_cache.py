@@ -0,0 +1,73 @@
+"""Cache of the phenotypes of the genomes, shared by the trainings, the demos and the training nets."""
+import hashlib
+from collections import OrderedDict
+
+import config
+from .feed_forward import FeedForwardNetwork
+from .fixed_topology import ArrayGenome
+
+
+def genome_hash(genome):
+    """
+    Returns a hash of everything that defines the phenotype of a genome : its nodes and its expressed connections with
+    their weights. Two genomes with the same hash have the same network, whatever their key.
+    The hash is stable between processes and runs.
+    """
+    if isinstance(genome, ArrayGenome):
+        nodes = sorted(genome.node_genes())
+        connections = sorted((key, weight) for key, weight, enabled in genome.connection_genes() if enabled)
+    else:
+        nodes = sorted(
+            (key, ng.bias, ng.response, ng.activation, ng.aggregation) for key, ng in genome.nodes.items()
+        )
+        connections = sorted((cg.key, cg.weight) for cg in genome.connections.values() if cg.enabled)
+    return hashlib.blake2b(repr((nodes, connections)).encode(), digest_size=16).hexdigest()
+
+
+def net_hash(net):
+    """Hash of the phenotype of a network without its genome (the training nets), stable between processes and runs."""
+    node_evals = [
+        (node, act_func.__name__, agg_func.__name__, bias, response, links)
+        for node, act_func, agg_func, bias, response, links in net.node_evals
+    ]
+    return hashlib.blake2b(repr((net.input_nodes, net.output_nodes, node_evals)).encode(), digest_size=16).hexdigest()
+
+
+class NetworkCache:
+    """
+    LRU cache of the networks created by FeedForwardNetwork.create, keyed by genome_hash.
+    Genomes kept unchanged by the reproduction (elites) or used again (demo, training nets) are only built once.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.networks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, genome, neat_config, compiled=True):
+        key = (genome_hash(genome), compiled)
+        net = self.networks.get(key)
+        if net is None:
+            self.misses += 1
+            if isinstance(genome, ArrayGenome):
+                genome = genome.to_genome(neat_config.genome_config)
+            net = FeedForwardNetwork.create(genome, neat_config, compiled)
+            self.networks[key] = net
+            if len(self.networks) > self.max_size:
+                self.networks.popitem(last=False)
+        else:
+            self.hits += 1
+            self.networks.move_to_end(key)
+        return net
+
+    def clear(self):
+        self.networks.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return f"Network cache : {len(self.networks)} networks, {self.hits} hits, {self.misses} misses"
+
+
+network_cache = NetworkCache(config.NETWORK_CACHE_SIZE)
@@ -1,9 +1,15 @@
 """Implements the core evolution algorithm."""
 
 from neat.math_util import mean
+import config as training_config
 from .checkpoint_reporter import Checkpointer
+from .fitness_cache import FitnessCache
 from .genome_reporter import GenomeReporter
+from .metrics_sink import MetricsSink
+from .profiler import Profiler
 from .reporting import ReporterSet
+from .step_timer import StepTimer
+from .trajectory_store import TrajectoryStore
 import random
 
 
@@ -21,12 +27,16 @@ class Population(object):
         5. Go to 1.
     """
 
-    def __init__(self, config, checkpoint_dir_path):
+    def __init__(self, config, checkpoint_dir_path, initial_state=None):
         self.reporters = (
             ReporterSet()
         )  # Unnecessary but to avoid modifying every neat file
         self.checkpoint_reporter = Checkpointer(checkpoint_dir_path)
-        self.genome_reporter = GenomeReporter()
+        self.genome_reporter = GenomeReporter(
+            f"{checkpoint_dir_path}_fitnesses" if training_config.FITNESS_STORE_ON_DISK else None
+        )
+        self.fitness_cache = None
+        self.configure(checkpoint_dir_path)
         self.config = config
         stagnation = config.stagnation_type(config.stagnation_config, self.reporters)
         self.reproduction = config.reproduction_type(
@@ -43,16 +53,48 @@ class Population(object):
                 "Unexpected fitness_criterion: {0!r}".format(config.fitness_criterion)
             )
 
-        # Create a population from scratch, then partition into species.
-        self.population = self.reproduction.create_new(
-            config.genome_type, config.genome_config, config.pop_size
-        )
-        self.species = config.species_set_type(
-            config.species_set_config, self.reporters
-        )
-        self.generation = 1
-        self.species.speciate(config, self.population, self.generation)
-        random.seed(10)
+        if initial_state is None:
+            # Create a population from scratch, then partition into species.
+            self.population = self.reproduction.create_new(
+                config.genome_type, config.genome_config, config.pop_size
+            )
+            self.species = config.species_set_type(
+                config.species_set_config, self.reporters
+            )
+            self.generation = 1
+            self.species.speciate(config, self.population, self.generation)
+            random.seed(training_config.RUN_SEED)
+        else:
+            # Restored population (see array_checkpoint)
+            self.population, self.species, self.generation = initial_state
+        # The random streams of the episodes are derived from the seed of the run (see evaluation.episode_seed)
+        self.run_seed = training_config.RUN_SEED
+
+    def configure(self, checkpoint_dir_path):
+        """
+        Builds the components set by the training config. Also called after a pickle restore (see
+        Checkpointer.restore_checkpoint), so a restored run follows the current config instead of the pickled one :
+        only the fitnesses of the fitness cache are kept.
+        """
+        metrics_sink = MetricsSink(f"{checkpoint_dir_path}_metrics.jsonl") if training_config.METRICS_EXPORT else None
+        self.checkpoint_reporter.metrics_sink = metrics_sink
+        self.genome_reporter.metrics_sink = metrics_sink
+        self.genome_reporter.step_timer = StepTimer(training_config.STEP_TIMING,
+                                                    training_config.STEP_TIMING_SAMPLING_PERIOD)
+        # Trajectory files of the most fit genomes (None : the trajectories are not recorded)
+        self.trajectory_store = TrajectoryStore(
+            f"{checkpoint_dir_path}_trajectories", training_config.NUMBER_NETS_TRAINING
+        ) if training_config.TRAJECTORY_RECORDING else None
+        # Fitnesses of the genomes already evaluated in the episodes, saved with the checkpoints (None : no cache)
+        if not training_config.FITNESS_CACHE_SIZE:
+            self.fitness_cache = None
+        elif self.fitness_cache is None:
+            self.fitness_cache = FitnessCache(training_config.FITNESS_CACHE_SIZE)
+        elif self.fitness_cache.max_size != training_config.FITNESS_CACHE_SIZE:
+            self.fitness_cache = FitnessCache.from_arrays(training_config.FITNESS_CACHE_SIZE,
+                                                          *self.fitness_cache.to_arrays())
+        # Profiler of the selected generations and episodes (None : nothing is profiled)
+        self.profiler = Profiler.from_config(f"{checkpoint_dir_path}_profiles")
 
     def run(self, fitness_function, number_generation):
         """
@@ -75,6 +117,11 @@ class Population(object):
 
         current_generation = 1
         while current_generation < number_generation + 1:
+            generation = self.generation
+            profiled = self.profiler is not None and self.profiler.is_generation_profiled(generation)
+            if profiled:
+                self.profiler.start()
+
             # Evaluate all genomes using the user-provided function.
             fitness_function(self)
 
@@ -104,4 +151,7 @@ class Population(object):
             else:
                 self.checkpoint_reporter.end_generation(self)
 
+            if profiled:
+                self.profiler.stop(f"generation-{generation}")
+
 
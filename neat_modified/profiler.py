@@ -0,0 +1,231 @@
+"""
+On-demand CPU profiling of selected generations or episodes.
+
+The generations and episodes are selected by PROFILE_GENERATIONS and PROFILE_EPISODES, which can also be set without
+editing the config with the GAME_IA_PROFILE_GENERATIONS, GAME_IA_PROFILE_EPISODES and GAME_IA_PROFILE_MODE environment
+variables. The profiles are written in <checkpoint directory>_profiles.
+"""
+import collections
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+
+from tabulate import tabulate
+
+import config
+
+
+def parse_selection(spec: str):
+    """
+    Parses a selection of generations or episodes like "3,10-12" : returns the set of the selected numbers, None if
+    everything is selected ("*") and an empty set if nothing is.
+    """
+    spec = spec.strip()
+    if spec == "*":
+        return None
+    selection = set()
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        first, _, last = part.partition("-")
+        selection.update(range(int(first), int(last or first) + 1))
+    return selection
+
+
+def frame_label(filename: str, line: int, name: str) -> str:
+    """Name of a function in the collapsed stacks (without the ";" separating the frames)."""
+    if filename == "~":
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+class StackSampler:
+    """
+    Samples the stack of the thread starting it every interval seconds, counting the samples of each collapsed stack.
+
+    In the main thread of a Unix process, the samples are taken by a SIGPROF handler every interval seconds of CPU
+    time, the time spent in a C call (NumPy...) is counted in the Python function calling it. Elsewhere, a background
+    thread samples the stack, which is biased towards the calls releasing the GIL.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.thread_id = threading.get_ident()
+        self.use_signal = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+        self.previous_handler = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def add_sample(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(frame_label(code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if stack:
+            self.samples[";".join(reversed(stack))] += 1
+
+    def sample_thread(self):
+        while not self.stopped.wait(self.interval):
+            self.add_sample(sys._current_frames().get(self.thread_id))
+
+    def start(self):
+        if self.use_signal:
+            self.previous_handler = signal.signal(signal.SIGPROF, lambda signum, frame: self.add_sample(frame))
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.thread = threading.Thread(target=self.sample_thread, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.use_signal:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self.previous_handler)
+        else:
+            self.stopped.set()
+            self.thread.join()
+
+
+class Profiler:
+    """
+    Profiles the selected generations (the whole generation : episodes, reproduction, speciation and checkpoint, see
+    Population.run) or only the selected episodes of these generations (see eval_genomes), and writes in output_dir :
+    - <name>.collapsed : the collapsed stacks ("frame;frame;frame value" lines) for flame graph tools (flamegraph.pl,
+      speedscope...), the values are microseconds (deterministic) or numbers of samples (sampling)
+    - <name>.txt : the top functions by self time and by total time
+    - <name>.prof : the cProfile statistics, for the deterministic mode only (pstats, snakeviz...)
+
+    The deterministic mode uses cProfile (every call is timed, the collapsed stacks are rebuilt from the call graph by
+    splitting the time of each function between its callers), the sampling mode samples the stack of the training
+    thread (low overhead, exact stacks, see StackSampler). Only the main process is profiled, not the worker processes.
+
+    Nothing is profiled outside the selected generations and episodes, and no profiler exists at all when nothing is
+    selected (see from_config).
+    """
+
+    def __init__(self, output_dir: str, generations, episodes, mode: str = "deterministic", top: int = 30,
+                 sampling_interval: float = 0.001):
+        if mode not in ("deterministic", "sampling"):
+            raise ValueError(f"Unknown profiling mode {mode!r} (deterministic or sampling)")
+        self.output_dir = output_dir
+        self.generations = generations
+        self.episodes = episodes
+        self.mode = mode
+        self.top = top
+        self.sampling_interval = sampling_interval
+        self.profile = None
+        self.sampler = None
+
+    @staticmethod
+    def from_config(output_dir: str):
+        """Profiler of the generations and episodes selected in the config, None if no generation is selected."""
+        generations = parse_selection(config.PROFILE_GENERATIONS)
+        if generations == set():
+            return None
+        return Profiler(output_dir, generations, parse_selection(config.PROFILE_EPISODES), config.PROFILE_MODE,
+                        config.PROFILE_TOP)
+
+    def __getstate__(self):
+        # A running profile is not saved with the checkpoints
+        state = self.__dict__.copy()
+        state["profile"] = state["sampler"] = None
+        return state
+
+    def is_generation_profiled(self, generation: int) -> bool:
+        """True if the whole generation is profiled (it is selected and no episode is selected)."""
+        return self.episodes == set() and (self.generations is None or generation in self.generations)
+
+    def is_episode_profiled(self, generation: int, episode: int) -> bool:
+        return self.episodes != set() and (self.generations is None or generation in self.generations) \
+            and (self.episodes is None or episode in self.episodes)
+
+    def start(self):
+        if self.mode == "deterministic":
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            self.sampler = StackSampler(self.sampling_interval)
+            self.sampler.start()
+
+    def stop(self, name: str):
+        """Stops the profile and writes its files (named name)."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, name)
+        if self.mode == "deterministic":
+            self.profile.disable()
+            stats = pstats.Stats(self.profile)
+            stats.dump_stats(f"{path}.prof")
+            stacks = self.collapse_stats(stats)
+            summary = self.stats_summary(stats)
+            self.profile = None
+        else:
+            self.sampler.stop()
+            stacks = self.sampler.samples
+            summary = self.samples_summary(stacks)
+            self.sampler = None
+
+        with open(f"{path}.collapsed", "w") as f:
+            f.writelines(f"{stack} {value}\n" for stack, value in stacks.items() if value > 0)
+        with open(f"{path}.txt", "w") as f:
+            f.write(summary)
+        print(f"Profile written to {path}.collapsed and {path}.txt")
+
+    def stats_summary(self, stats):
+        summary = io.StringIO()
+        stats.stream = summary
+        for sort_key in ("tottime", "cumulative"):
+            stats.sort_stats(sort_key).print_stats(self.top)
+        return summary.getvalue()
+
+    def samples_summary(self, samples):
+        """Top functions by self and total number of samples (the total counts a function once per stack)."""
+        self_samples, total_samples = collections.Counter(), collections.Counter()
+        for stack, count in samples.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                total_samples[frame] += count
+        nb_samples = max(1, sum(samples.values()))
+        tables = []
+        for title, counter in (("self", self_samples), ("total", total_samples)):
+            rows = [[frame, count, f"{100 * count / nb_samples:.1f}%"] for frame, count in counter.most_common(self.top)]
+            tables.append(tabulate(rows, headers=[f"function ({title})", "samples", "%"]))
+        clock = "CPU time" if self.sampler.use_signal else "wall time"
+        return f"{nb_samples} samples every {1e3 * self.sampling_interval:g} ms of {clock}\n\n" + \
+            "\n\n".join(tables) + "\n"
+
+    @staticmethod
+    def collapse_stats(stats, max_depth: int = 64, min_fraction: float = 1e-4):
+        """
+        Collapsed stacks (values in microseconds) rebuilt from the call graph of cProfile statistics : the total time
+        of a function is split between its call paths in proportion of the time of each caller edge. Recursive calls
+        and the paths below min_fraction of the total time are cut.
+        """
+        callees = collections.defaultdict(list)
+        for function, (_, _, _, _, callers) in stats.stats.items():
+            for caller, edge in callers.items():
+                if caller in stats.stats:
+                    callees[caller].append((function, edge[3]))
+        roots = [function for function, (_, _, _, _, callers) in stats.stats.items()
+                 if not any(caller in stats.stats for caller in callers)]
+        min_time = min_fraction * max(stats.total_tt, 1e-9)
+        stacks = collections.Counter()
+
+        def expand(function, path, labels, time_path):
+            _, _, self_time, total_time, _ = stats.stats[function]
+            fraction = time_path / total_time if total_time > 0 else 0
+            labels = labels + [frame_label(*function)]
+            stack = ";".join(labels)
+            stacks[stack] += round(1e6 * self_time * fraction)
+            if len(labels) >= max_depth:
+                return
+            for callee, edge_time in callees[function]:
+                if callee not in path and edge_time * fraction >= min_time:
+                    expand(callee, path | {callee}, labels, edge_time * fraction)
+
+        for root in roots:
+            expand(root, {root}, [], stats.stats[root][3])
+        return stacks
@@ -0,0 +1,268 @@
+"""
+Speciation computing the genomic distances with NumPy : the genes of the genomes are packed in arrays and the distances
+between a representative and the whole population are computed at once.
+"""
+from itertools import chain
+
+import numpy as np
+from neat.species import DefaultSpeciesSet, Species
+
+
+class GeneIndex:
+    """
+    Array-backed index of the genes of the genomes : every node key and connection key (innovation) gets a column, and
+    each genome is packed once into the columns of its genes (in the order of its dicts) and their attributes.
+
+    The genomes are packed by key : the genomes are never modified once speciated (the reproduction creates new keys),
+    so the packed representatives of the species are reused from the previous generation.
+    """
+
+    def __init__(self):
+        self.node_columns = {}
+        self.connection_columns = {}
+        self.functions = {}
+        self.packed = {}
+
+    def pack(self, genome):
+        """
+        Returns the packed genes of a genome (lists, converted to arrays for a whole population at once) : the
+        columns, (bias, response) and (activation, aggregation) codes of its nodes, and the columns, weights and
+        enabled flags of its connections.
+        """
+        packed = self.packed.get(genome.key)
+        if packed is None:
+            nodes, connections = genome.nodes.values(), genome.connections.values()
+            node_columns, connection_columns, functions = self.node_columns, self.connection_columns, self.functions
+            packed = self.packed[genome.key] = (
+                [node_columns.setdefault(key, len(node_columns)) for key in genome.nodes],
+                [(ng.bias, ng.response) for ng in nodes],
+                [(functions.setdefault(ng.activation, len(functions)), functions.setdefault(ng.aggregation,
+                                                                                           len(functions)))
+                 for ng in nodes],
+                [connection_columns.setdefault(key, len(connection_columns)) for key in genome.connections],
+                [cg.weight for cg in connections],
+                [cg.enabled for cg in connections],
+            )
+        return packed
+
+    @staticmethod
+    def arrays(packed):
+        """Packed genes of a genome as arrays."""
+        node_columns, node_values, node_functions, connection_columns, weights, enabled = packed
+        return (
+            np.array(node_columns, dtype=np.int64), np.array(node_values, dtype=np.float64).reshape(-1, 2),
+            np.array(node_functions, dtype=np.int64).reshape(-1, 2), np.array(connection_columns, dtype=np.int64),
+            np.array(weights, dtype=np.float64), np.array(enabled, dtype=bool),
+        )
+
+    def keep(self, keys):
+        """Forgets the packed genomes except the given ones."""
+        self.packed = {key: self.packed[key] for key in keys if key in self.packed}
+
+
+class GeneMatrix:
+    """
+    Dense (genomes, genes) arrays of the genes of a population, over the columns of the genes present in it, and the
+    distances of any packed genome to all the genomes of the population (same values as DefaultGenome.distance).
+    """
+
+    def __init__(self, gene_index: GeneIndex, genomes):
+        self.gene_index = gene_index
+        packed = [gene_index.pack(genome) for genome in genomes]
+        nb_genomes = len(genomes)
+        self.node_remap, self.node_present, (self.node_values, self.node_functions) = self.dense(
+            len(gene_index.node_columns), nb_genomes, [p[0] for p in packed],
+            [([p[1] for p in packed], np.float64, (2,)), ([p[2] for p in packed], np.int64, (2,))]
+        )
+        self.connection_remap, self.connection_present, (self.weights, self.enabled) = self.dense(
+            len(gene_index.connection_columns), nb_genomes, [p[3] for p in packed],
+            [([p[4] for p in packed], np.float64, ()), ([p[5] for p in packed], bool, ())]
+        )
+        self.nb_nodes = np.array([len(p[0]) for p in packed], dtype=np.int64)
+        self.nb_connections = np.array([len(p[3]) for p in packed], dtype=np.int64)
+
+    @staticmethod
+    def dense(nb_columns, nb_genomes, columns, attributes):
+        """
+        Returns the mapping from the columns of the index to the dense columns (-1 : gene absent from the population),
+        the (genomes, genes) mask of the genes of each genome, and the dense arrays of their attributes (attributes :
+        the lists of values of each genome, their dtype and the shape of a value).
+        """
+        lengths = [len(c) for c in columns]
+        columns = np.fromiter(chain.from_iterable(columns), dtype=np.int64, count=sum(lengths))
+        used = np.unique(columns)
+        remap = np.full(nb_columns, -1, dtype=np.int64)
+        remap[used] = np.arange(len(used))
+        rows, dense_columns = np.repeat(np.arange(nb_genomes), lengths), remap[columns]
+        # At least one column, never present, so the absent genes can always be gathered
+        present = np.zeros((nb_genomes, max(len(used), 1)), dtype=bool)
+        present[rows, dense_columns] = True
+        arrays = []
+        for values, dtype, shape in attributes:
+            values = np.array(list(chain.from_iterable(values)), dtype=dtype).reshape((len(columns),) + shape)
+            array = np.zeros(present.shape + shape, dtype=dtype)
+            array[rows, dense_columns] = values
+            arrays.append(array)
+        return remap, present, arrays
+
+    @staticmethod
+    def gene_distance(terms, present, nb_genes, nb_genes_population, disjoint_coefficient):
+        """
+        Node or connection part of the distances : the terms of the homologous genes are summed in the order of the
+        genes of the packed genome (sequential sum, same floats as the loop of DefaultGenome.distance).
+        """
+        terms = np.where(present, terms, 0.0)
+        total = np.cumsum(terms, axis=1)[:, -1] if nb_genes else np.zeros(len(terms))
+        common = np.count_nonzero(present, axis=1)
+        disjoint = (nb_genes_population - common) + (nb_genes - common)
+        max_genes = np.maximum(nb_genes, nb_genes_population)
+        distances = np.zeros(len(terms))
+        has_genes = max_genes > 0
+        distances[has_genes] = (total[has_genes] + disjoint_coefficient * disjoint[has_genes]) / max_genes[has_genes]
+        return distances
+
+    def distances(self, genome, genome_config):
+        """
+        Distances of a genome to all the genomes of the population (genome.distance(other)), its genes must be in the
+        index when the matrix is built.
+        """
+        node_columns, node_values, node_functions, connection_columns, weights, enabled = \
+            GeneIndex.arrays(self.gene_index.pack(genome))
+        weight_coefficient = genome_config.compatibility_weight_coefficient
+        disjoint_coefficient = genome_config.compatibility_disjoint_coefficient
+
+        columns = self.node_remap[node_columns]
+        present = self.node_present[:, np.maximum(columns, 0)] & (columns >= 0)
+        dense_values, dense_functions = self.node_values[:, np.maximum(columns, 0)], \
+            self.node_functions[:, np.maximum(columns, 0)]
+        terms = np.abs(dense_values[..., 0] - node_values[:, 0]) + np.abs(dense_values[..., 1] - node_values[:, 1])
+        terms = (terms + (dense_functions[..., 0] != node_functions[:, 0])) + \
+            (dense_functions[..., 1] != node_functions[:, 1])
+        node_distances = self.gene_distance(terms * weight_coefficient, present, len(node_columns), self.nb_nodes,
+                                            disjoint_coefficient)
+
+        columns = self.connection_remap[connection_columns]
+        present = self.connection_present[:, np.maximum(columns, 0)] & (columns >= 0)
+        terms = np.abs(self.weights[:, np.maximum(columns, 0)] - weights) + \
+            (self.enabled[:, np.maximum(columns, 0)] != enabled)
+        connection_distances = self.gene_distance(terms * weight_coefficient, present, len(connection_columns),
+                                                  self.nb_connections, disjoint_coefficient)
+        return node_distances + connection_distances
+
+
+class VectorizedSpeciesSet(DefaultSpeciesSet):
+    """
+    DefaultSpeciesSet computing the distances between the representatives and the population with NumPy (see
+    GeneMatrix) instead of genome by genome over the gene dicts.
+
+    The species assignment is the same as DefaultSpeciesSet : the genomes are taken in the same order (same set
+    operations), the distances have the same values and a pair of genomes keeps the distance computed in its first
+    order, as with GenomeDistanceCache.
+    """
+
+    def __init__(self, config, reporters):
+        super().__init__(config, reporters)
+        self.gene_index = GeneIndex()
+
+    def gene_matrix(self, population):
+        """Genes of the population, giving the distances of the representatives and of its genomes to all of them."""
+        for s in self.species.values():
+            self.gene_index.pack(s.representative)
+        return GeneMatrix(self.gene_index, list(population.values()))
+
+    def speciate(self, config, population, generation):
+        assert isinstance(population, dict)
+
+        compatibility_threshold = self.species_set_config.compatibility_threshold
+        genome_config = config.genome_config
+        index = dict((gid, i) for i, gid in enumerate(population))
+        genes = self.gene_matrix(population)
+        rows = {}
+
+        def distances(genome):
+            row = rows.get(genome.key)
+            if row is None:
+                row = rows[genome.key] = genes.distances(genome, genome_config)
+            return row
+
+        # Old representatives still in the population (elites) whose distances to the population were computed first
+        requested = {}
+        computed = []
+
+        # Find the best representatives for each existing species.
+        unspeciated = set(population)
+        new_representatives = {}
+        new_members = {}
+        for sid, s in self.species.items():
+            candidates = list(unspeciated)
+            columns = np.array([index[gid] for gid in candidates], dtype=np.int64)
+            candidate_distances = distances(s.representative)[columns]
+            first_order = np.ones(len(candidates), dtype=bool)
+            representative_index = index.get(s.representative.key)
+            if representative_index is not None:
+                for position, gid in enumerate(candidates):
+                    if gid in requested and requested[gid][representative_index]:
+                        candidate_distances[position] = rows[gid][representative_index]
+                        first_order[position] = False
+                requested[s.representative.key] = np.zeros(len(population), dtype=bool)
+                requested[s.representative.key][columns[first_order]] = True
+            computed.append(candidate_distances)
+
+            # The new representative is the genome closest to the current representative.
+            new_rid = candidates[int(np.argmin(candidate_distances))]
+            new_representatives[sid] = new_rid
+            new_members[sid] = [new_rid]
+            unspeciated.remove(new_rid)
+
+        # Partition population into species based on genetic similarity : the distances of the representatives to
+        # the population are the rows of representative_distances (in the order of new_representatives).
+        representative_distances = np.zeros((len(new_representatives) + len(unspeciated), len(population)))
+        representative_sids = list(new_representatives)
+        representative_indexes = [index[rid] for rid in new_representatives.values()]
+        for row, rid in enumerate(new_representatives.values()):
+            representative_distances[row] = distances(population[rid])
+        nb_representatives = len(new_representatives)
+        while unspeciated:
+            gid = unspeciated.pop()
+            candidate_distances = representative_distances[:nb_representatives, index[gid]].copy()
+            if gid in requested:
+                reversed_pairs = requested[gid][representative_indexes]
+                candidate_distances[reversed_pairs] = rows[gid][representative_indexes][reversed_pairs]
+            computed.append(candidate_distances)
+
+            # Find the species with the most similar representative.
+            similar = candidate_distances < compatibility_threshold
+            if similar.any():
+                sid = representative_sids[int(np.argmin(np.where(similar, candidate_distances, np.inf)))]
+                new_members[sid].append(gid)
+            else:
+                # No species is similar enough, create a new species, using this genome as its representative.
+                sid = next(self.indexer)
+                new_representatives[sid] = gid
+                new_members[sid] = [gid]
+                representative_distances[nb_representatives] = distances(population[gid])
+                representative_sids.append(sid)
+                representative_indexes.append(index[gid])
+                nb_representatives += 1
+
+        # Update species collection based on new speciation.
+        self.genome_to_species = {}
+        for sid, rid in new_representatives.items():
+            s = self.species.get(sid)
+            if s is None:
+                s = Species(sid, generation)
+                self.species[sid] = s
+
+            members = new_members[sid]
+            for gid in members:
+                self.genome_to_species[gid] = sid
+
+            member_dict = dict((gid, population[gid]) for gid in members)
+            s.update(population[rid], member_dict)
+
+        # The representatives of the next generation are members of this one
+        self.gene_index.keep(population)
+
+        computed = np.concatenate(computed) if computed else np.zeros(1)
+        self.reporters.info(
+            'Mean genetic distance {0:.3f}, standard deviation {1:.3f}'.format(np.mean(computed), np.std(computed)))
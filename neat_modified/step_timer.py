@@ -0,0 +1,87 @@
+"""
+Low overhead timing of the phases of the episodes.
+"""
+from time import perf_counter_ns
+
+# Phases of an episode (the net activation is a part of the update, the event pump a part of the display)
+INIT, UPDATE, ACTIVATION, DISPLAY, EVENTS = range(5)
+PHASE_NAMES = ("init", "update", "net activation", "display", "event pump")
+# The bucket b of the histograms counts the durations in [2 ** (b - 1), 2 ** b[ ns, the last one everything above
+NB_BUCKETS = 40
+
+
+class StepTimer:
+    """
+    Aggregated counters (number of measures, total duration) and fixed-bucket latency histograms of each phase, from
+    perf_counter_ns. Recording a measure is a few integer operations, nothing grows with the number of steps.
+
+    Only 1 step out of sampling_period is timed (the totals of the steps are estimated from the sampled ones) and a
+    disabled timer times nothing : the loops only test a boolean per step.
+    The measures not taken on the sampled steps (the init phase, once per episode) are recorded with sampled=False and
+    are not scaled.
+    """
+
+    now = staticmethod(perf_counter_ns)
+
+    def __init__(self, enabled: bool = True, sampling_period: int = 1):
+        self.enabled = enabled
+        self.sampling_period = max(1, sampling_period)
+        self.counts = [0] * len(PHASE_NAMES)
+        self.totals = [0] * len(PHASE_NAMES)
+        self.histograms = [[0] * NB_BUCKETS for _ in PHASE_NAMES]
+        self.episode_totals = [0] * len(PHASE_NAMES)
+        self.episode_unsampled_totals = [0] * len(PHASE_NAMES)
+
+    def is_sampled(self, step: int) -> bool:
+        return self.enabled and step % self.sampling_period == 0
+
+    def start_episode(self):
+        self.episode_totals = [0] * len(PHASE_NAMES)
+        self.episode_unsampled_totals = [0] * len(PHASE_NAMES)
+
+    def record(self, phase: int, start: int, sampled: bool = True) -> int:
+        """
+        Records the duration of a phase started at start (from now()) and returns the end time. sampled is False for
+        the measures taken whatever the step (they are not scaled by the sampling period).
+        """
+        end = perf_counter_ns()
+        duration = end - start
+        self.counts[phase] += 1
+        self.totals[phase] += duration
+        if sampled:
+            self.episode_totals[phase] += duration
+        else:
+            self.episode_unsampled_totals[phase] += duration
+        self.histograms[phase][min(duration.bit_length(), NB_BUCKETS - 1)] += 1
+        return end
+
+    def get_episode_time(self, phase: int) -> float:
+        """Estimated time (s) spent in a phase during the current episode."""
+        return (self.episode_totals[phase] * self.sampling_period + self.episode_unsampled_totals[phase]) / 1e9
+
+    def get_mean_time(self, phase: int) -> float:
+        """Mean duration (s) of a phase over all the measures, 0 if it was never timed."""
+        if not self.counts[phase]:
+            return 0
+        return self.totals[phase] / self.counts[phase] / 1e9
+
+    def get_quantile(self, phase: int, q: float) -> float:
+        """Upper bound (s) of the bucket of the histogram containing the quantile q of the durations of a phase."""
+        rank = q * self.counts[phase]
+        nb_measures = 0
+        for bucket, count in enumerate(self.histograms[phase]):
+            nb_measures += count
+            if count and nb_measures >= rank:
+                return 2 ** bucket / 1e9
+        return 0
+
+    def __str__(self):
+        lines = []
+        for phase, name in enumerate(PHASE_NAMES):
+            if self.counts[phase]:
+                lines.append(
+                    f"{name} : {self.counts[phase]} measures, mean {1e3 * self.get_mean_time(phase):.3f} ms, "
+                    f"p50 < {1e3 * self.get_quantile(phase, 0.5):.3f} ms, "
+                    f"p99 < {1e3 * self.get_quantile(phase, 0.99):.3f} ms"
+                )
+        return "\n".join(lines)
@@ -0,0 +1,112 @@
+"""
+Trajectory files of the most fit genomes, replayed by DemoGame.
+
+With TRAJECTORY_RECORDING, the trajectory file (positions and actions at each step of its episodes) of each of the
+NUMBER_NETS_TRAINING most fit genomes ever seen is kept in <checkpoint directory>_trajectories.
+"""
+import os
+
+import numpy as np
+
+from .array_checkpoint import read_arrays, write_arrays
+
+
+class TrajectoryStore:
+    """
+    Keeps one trajectory file (trajectory-<key>) per genome among the nb_genomes most fit genomes ever seen, with the
+    trajectories of all the episodes of the generation where the genome got its best fitness.
+
+    The episodes are not recorded during the evaluation : at the end of a generation, only the genomes entering the
+    best ones ever (see genomes_to_record) are simulated again with their trajectories recorded (see
+    evaluation.record_episode and add_episode), their trajectories are written and the files of the genomes which left
+    the best ones are removed. A genome among the nb_genomes best ever is among the nb_genomes best of the generation
+    of its best fitness, so all of them have a trajectory file.
+
+    The files use the container of the array checkpoints : for each episode e, the arrays episode_<e>_positions,
+    episode_<e>_opponent_positions (int16, (steps, 2) rect.topleft) and episode_<e>_actions (uint8, (steps,)).
+    """
+
+    def __init__(self, directory: str, nb_genomes: int):
+        self.directory = directory
+        self.nb_genomes = nb_genomes
+        # (episode, index in the generation of the genome of each recorded column, recorder) of the current generation
+        self.episodes = []
+
+    def path(self, key: int) -> str:
+        return os.path.join(self.directory, f"trajectory-{key}")
+
+    def add_episode(self, episode: int, genome_indexes, recorder):
+        self.episodes.append((episode, np.asarray(genome_indexes), recorder))
+
+    @staticmethod
+    def genomes_to_record(genomes, best_fitnesses):
+        """
+        Indexes of the genomes of the generation which got their best fitness in it among the best ones ever
+        (best_fitnesses : key -> best fitness).
+        """
+        return [
+            index for index, genome in enumerate(genomes)
+            if best_fitnesses.get(genome.key) is not None and genome.fitness >= best_fitnesses[genome.key]
+        ]
+
+    def end_generation(self, genomes, generation: int, training_number: int, best_fitnesses,
+                       fitnesses_episodes=None):
+        """
+        Writes the trajectory files of the genomes of the generation (in the order of the recorded indexes) which got
+        their best fitness in it among the best ones ever (best_fitnesses : key -> best fitness), and removes the
+        files of the genomes not in best_fitnesses anymore. fitnesses_episodes is the (episodes, genomes) array of the
+        fitnesses of the generation, to store the fitness of each recorded episode.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for index in self.genomes_to_record(genomes, best_fitnesses):
+            genome = genomes[index]
+            arrays, episodes, fitnesses = {}, [], []
+            for row, (episode, genome_indexes, recorder) in enumerate(self.episodes):
+                column = np.flatnonzero(genome_indexes == index)
+                # Not simulated in this episode (racing evaluation, fitness cache)
+                if not len(column) or not recorder.lengths[column[0]]:
+                    continue
+                positions, opponent_positions, actions = recorder.genome_trajectory(column[0])
+                arrays[f"episode_{episode}_positions"] = positions
+                arrays[f"episode_{episode}_opponent_positions"] = opponent_positions
+                arrays[f"episode_{episode}_actions"] = actions
+                episodes.append(episode)
+                if fitnesses_episodes is not None:
+                    fitnesses.append(round(float(fitnesses_episodes[row, index]), 4))
+            if not episodes:
+                continue
+            metadata = {
+                "key": genome.key, "generation": generation, "training_number": training_number,
+                "fitness": genome.fitness, "episodes": episodes, "fitnesses": fitnesses,
+            }
+            path = self.path(genome.key)
+            with open(f"{path}.tmp", "wb") as f:
+                write_arrays(f, arrays, metadata)
+            os.replace(f"{path}.tmp", path)
+        self.episodes = []
+
+        for filename in os.listdir(self.directory):
+            if filename.startswith("trajectory-") and int(filename[len("trajectory-"):].split(".")[0]) \
+                    not in best_fitnesses:
+                os.remove(os.path.join(self.directory, filename))
+
+    def __getstate__(self):
+        # The recorders of an unfinished generation are not saved with the checkpoints
+        state = self.__dict__.copy()
+        state["episodes"] = []
+        return state
+
+    @staticmethod
+    def read(filename):
+        """
+        Returns the metadata and the trajectories of a trajectory file : a list of (episode, fitness, positions,
+        opponent positions, actions), the arrays being memory-mapped.
+        """
+        metadata, arrays = read_arrays(filename)
+        fitnesses = metadata["fitnesses"] or [None] * len(metadata["episodes"])
+        trajectories = [
+            (episode, fitness, arrays[f"episode_{episode}_positions"], arrays[f"episode_{episode}_opponent_positions"],
+             arrays[f"episode_{episode}_actions"])
+            for episode, fitness in zip(metadata["episodes"], fitnesses)
+        ]
+        return metadata, trajectories
@@ -0,0 +1,122 @@
+"""
+NumPy counterparts of the neat activation and aggregation functions, used by the vectorised networks.
+"""
+import numpy as np
+from neat import activations, aggregations
+
+
+def sigmoid_activation(z):
+    z = np.minimum(np.maximum(5.0 * z, -60.0), 60.0)
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def tanh_activation(z):
+    z = np.minimum(np.maximum(2.5 * z, -60.0), 60.0)
+    return np.tanh(z)
+
+
+def sin_activation(z):
+    z = np.minimum(np.maximum(5.0 * z, -60.0), 60.0)
+    return np.sin(z)
+
+
+def gauss_activation(z):
+    z = np.minimum(np.maximum(z, -3.4), 3.4)
+    return np.exp(-5.0 * z ** 2)
+
+
+def relu_activation(z):
+    return np.where(z > 0.0, z, 0.0)
+
+
+def softplus_activation(z):
+    z = np.minimum(np.maximum(5.0 * z, -60.0), 60.0)
+    return 0.2 * np.log(1 + np.exp(z))
+
+
+def identity_activation(z):
+    return z
+
+
+def clamped_activation(z):
+    return np.minimum(np.maximum(z, -1.0), 1.0)
+
+
+def inv_activation(z):
+    # 1 / 0 gives 0 like the scalar version which catches the ArithmeticError
+    return np.divide(1.0, z, out=np.zeros_like(z), where=z != 0)
+
+
+def log_activation(z):
+    return np.log(np.maximum(1e-7, z))
+
+
+def exp_activation(z):
+    return np.exp(np.minimum(np.maximum(z, -60.0), 60.0))
+
+
+def abs_activation(z):
+    return np.abs(z)
+
+
+def hat_activation(z):
+    return np.maximum(0.0, 1 - np.abs(z))
+
+
+def square_activation(z):
+    return z ** 2
+
+
+def cube_activation(z):
+    return z ** 3
+
+
+# Scalar neat function -> vectorised function. Functions missing from this table (user-defined ones) cannot be
+# vectorised and the networks using them are evaluated with the scalar FeedForwardNetwork instead.
+ACTIVATIONS = {
+    activations.sigmoid_activation: sigmoid_activation,
+    activations.tanh_activation: tanh_activation,
+    activations.sin_activation: sin_activation,
+    activations.gauss_activation: gauss_activation,
+    activations.relu_activation: relu_activation,
+    activations.softplus_activation: softplus_activation,
+    activations.identity_activation: identity_activation,
+    activations.clamped_activation: clamped_activation,
+    activations.inv_activation: inv_activation,
+    activations.log_activation: log_activation,
+    activations.exp_activation: exp_activation,
+    activations.abs_activation: abs_activation,
+    activations.hat_activation: hat_activation,
+    activations.square_activation: square_activation,
+    activations.cube_activation: cube_activation,
+}
+
+# Only the sum can be computed with a matrix product (the other aggregations depend on the set of inputs)
+AGGREGATIONS = {aggregations.sum_aggregation}
+
+
+def is_vectorizable(node_evals):
+    """Returns True if every node of the network uses a vectorisable activation and aggregation function."""
+    return all(
+        act_func in ACTIVATIONS and agg_func in AGGREGATIONS
+        for _, act_func, agg_func, _, _, _ in node_evals
+    )
+
+
+def node_layers(input_nodes, node_evals):
+    """
+    Splits the node_evals of a FeedForwardNetwork into the layers given by neat.graphs.feed_forward_layers.
+
+    A node belongs to the layer following the deepest of its inputs, which is exactly the first iteration at which
+    feed_forward_layers finds all its inputs evaluated.
+    """
+    depths = dict((key, 0) for key in input_nodes)
+    layers = []
+    for node_eval in node_evals:
+        node, links = node_eval[0], node_eval[5]
+        depth = 1 + max((depths[i] for i, w in links), default=0)
+        depths[node] = depth
+        if depth > len(layers):
+            layers.append([])
+        layers[depth - 1].append(node_eval)
+    return layers
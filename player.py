@@ -1,36 +1,40 @@
 import pygame
-import random
 import typing
 import config
+from assets import get_image
 import numpy as np
 
 
 class Player(pygame.sprite.Sprite):
-    def __init__(self, x, y, nb_monsters):
+    def __init__(self, x, y, nb_monsters, rng=None, id=0):
         super().__init__()
-        self.image = pygame.transform.scale(
-            pygame.image.load(config.IMAGE_PLAYER_PATH), config.IMAGE_SIZE
-        )
+        self.id = id
+        # numpy random Generator of the random moves (the stream of the episode during the trainings)
+        self.rng = np.random.default_rng() if rng is None else rng
         self.pos = pygame.math.Vector2(x, y)
-        self.rect = self.image.get_rect(topleft=self.pos)
+        self.rect = pygame.Rect(self.pos, config.IMAGE_SIZE)
         self.speed = config.SPEED
         self.diagonal_speed = self.speed / 2**0.5
         self.net_player = None
         self.life = [config.PLAYER_LIFE] * nb_monsters
 
-        self.vx = random.uniform(-1, 1)
-        self.vy = random.uniform(-1, 1)
+        self.vx, self.vy = self.rng.uniform(-1, 1, 2).tolist()
         norm = (self.vx**2 + self.vy**2) ** 0.5
         self.vx *= self.speed / norm
         self.vy *= self.speed / norm
         self.current_speed = self.speed
+        self.trajectory = None
+
+    @property
+    def image(self):
+        # Loaded on first display only, and shared by all the players
+        return get_image(config.IMAGE_PLAYER_PATH, config.IMAGE_SIZE)
 
     def move_random(self):
         self.current_speed = min(self.speed, self.current_speed+self.speed/500)
         self.pos.y += self.vy
         self.pos.x += self.vx
-        vx_var = random.uniform(-0.05 * self.current_speed, 0.05 * self.current_speed)
-        vy_var = random.uniform(-0.05 * self.current_speed, 0.05 * self.current_speed)
+        vx_var, vy_var = self.rng.uniform(-0.05 * self.current_speed, 0.05 * self.current_speed, 2).tolist()
 
         self.vx += vx_var
         self.vy += vy_var
@@ -59,6 +63,30 @@ class Player(pygame.sprite.Sprite):
 
         self.rect.topleft = round(self.pos.x), round(self.pos.y)
 
+    @staticmethod
+    def random_trajectory(x, y, nb_steps, rng):
+        """
+        Returns the positions (rect.topleft) of a random player starting in (x, y) after each of its nb_steps
+        move_random (drawn from the random Generator rng), as a (nb_steps, 2) array. The random moves don't depend on
+        the monsters, so the trajectory can be computed once per episode and shared by all the monsters (and workers)
+        of the episode.
+        """
+        player = Player(x, y, 0, rng)
+        trajectory = np.empty((nb_steps, 2), dtype=np.int16)
+        for step in range(nb_steps):
+            player.move_random()
+            trajectory[step] = player.rect.topleft
+        return trajectory
+
+    def set_trajectory(self, trajectory):
+        self.trajectory = trajectory
+
+    def follow_trajectory(self, step):
+        """Moves the player to its position after the given step (starting at 1) of its trajectory."""
+        x, y = self.trajectory[step - 1]
+        self.pos.update(x, y)
+        self.rect.topleft = int(x), int(y)
+
     def set_net(self, net):
         self.net_player = net
 
@@ -74,9 +102,9 @@ class Player(pygame.sprite.Sprite):
                     config.WINDOW_HEIGHT - self.rect.y,
                 ]
             )
-        return random.choice(
+        return self.rng.choice(
             [[1, 0.5], [0, 0.5], [0.5, 0], [0.5, 1], [1, 0], [1, 1], [0, 0], [0, 1]]
-        )
+        ).tolist()
 
     def move(self, next_move_player: typing.List[float]):
         up = next_move_player[0] >= 6 / 10
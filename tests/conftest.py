@@ -0,0 +1,29 @@
+"""
+Setup shared by the tests : the modules are imported from the root of the repository (where the config expects the
+assets and the neat configs to be), and the games run headless.
+"""
+import os
+import sys
+
+import neat
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import config  # noqa: E402
+
+config.HEADLESS = True
+
+
+def default_neat_config(filename):
+    """Neat config of the file with the default neat classes."""
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                       os.path.join(ROOT, filename))
+
+
+@pytest.fixture(params=["config_monster.txt", "config_player.txt"])
+def neat_config(request):
+    return default_neat_config(request.param)
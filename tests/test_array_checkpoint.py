@@ -0,0 +1,123 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+import config
+import main
+from conftest import default_neat_config
+from neat_modified.array_checkpoint import ArrayCheckpoint
+from neat_modified.checkpoint_reporter import Checkpointer
+from neat_modified.fixed_topology import ArrayGenome
+from neat_modified.population import Population
+
+
+@pytest.fixture(autouse=True)
+def short_episodes(monkeypatch):
+    monkeypatch.setattr(config, "MAX_NUMBER_EPISODE", 2)
+    monkeypatch.setattr(config, "MAX_STEP_EPISODE", 100)
+    monkeypatch.setattr(config, "METRICS_EXPORT", False)
+    monkeypatch.setattr(config, "TRAJECTORY_RECORDING", False)
+    monkeypatch.setattr(config, "CHECKPOINT_FORMAT", "array")
+
+
+def evaluate(population):
+    main.eval_genomes(population, 1, [])
+
+
+def trained_population(neat_config, tmp_path, nb_generations=2):
+    """Population trained a few generations, with its last checkpoint written in tmp_path."""
+    checkpoint_dir = tmp_path / "checkpoint_monster"
+    checkpoint_dir.mkdir()
+    random.seed(config.RUN_SEED)
+    population = Population(neat_config, str(checkpoint_dir))
+    population.run(evaluate, nb_generations)
+    population.checkpoint_reporter.wait()
+    checkpoint_names = Checkpointer.list_checkpoints(checkpoint_dir)
+    return population, os.path.join(checkpoint_dir, checkpoint_names[-1])
+
+
+def genes(genome):
+    """Comparable genes of a neat genome or of an ArrayGenome."""
+    if isinstance(genome, ArrayGenome):
+        return [getattr(genome, name).tolist() for name in ("weights", "present", "enabled", "biases", "responses")]
+    return (sorted((key, node.bias, node.response, node.activation, node.aggregation)
+                   for key, node in genome.nodes.items()),
+            sorted((key, connection.weight, connection.enabled) for key, connection in genome.connections.items()))
+
+
+def assert_same_population(restored, population):
+    assert restored.generation == population.generation
+    assert sorted(restored.population) == sorted(population.population)
+    for key, genome in population.population.items():
+        assert type(restored.population[key]) is type(genome)
+        assert genes(restored.population[key]) == genes(genome)
+    assert {sid: sorted(s.members) for sid, s in restored.species.species.items()} == \
+        {sid: sorted(s.members) for sid, s in population.species.species.items()}
+
+    reporter, restored_reporter = population.genome_reporter, restored.genome_reporter
+    best, restored_best = reporter.best_genomes(5), restored_reporter.best_genomes(5)
+    assert [(genome.key, genome.fitness) for genome in restored_best] == \
+        [(genome.key, genome.fitness) for genome in best]
+    assert [genes(genome) for genome in restored_best] == [genes(genome) for genome in best]
+    assert restored_reporter.fitness_means == reporter.fitness_means
+    assert len(restored_reporter.all_fitnesses) == len(reporter.all_fitnesses)
+    for generation in range(len(reporter.all_fitnesses)):
+        np.testing.assert_array_equal(restored_reporter.all_fitnesses.generation(generation),
+                                      reporter.all_fitnesses.generation(generation))
+
+
+@pytest.mark.parametrize("fixed_topology", [False, True])
+def test_round_trip(tmp_path, monkeypatch, fixed_topology):
+    monkeypatch.setattr(config, "FIXED_TOPOLOGY_ENGINE", fixed_topology)
+    neat_config = main.load_neat_config("config_monster.txt")
+    population, checkpoint = trained_population(neat_config, tmp_path)
+    # The ArrayGenomes are stored as gene arrays, not as neat genes
+    assert ArrayCheckpoint(checkpoint).is_array_group("population_") == fixed_topology
+
+    restored = Checkpointer.restore_checkpoint(checkpoint, neat_config)
+    assert_same_population(restored, population)
+
+    # Both continue with the same genomes
+    random_state = random.getstate()
+    restored.run(evaluate, 1)
+    random.setstate(random_state)
+    population.run(evaluate, 1)
+    assert {key: genome.fitness for key, genome in restored.population.items()} == \
+        {key: genome.fitness for key, genome in population.population.items()}
+
+
+def test_fitness_history_on_disk_survives_restore(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "FITNESS_STORE_ON_DISK", True)
+    neat_config = main.load_neat_config("config_monster.txt")
+    population, checkpoint = trained_population(neat_config, tmp_path)
+    history = [np.array(population.genome_reporter.all_fitnesses.generation(generation))
+               for generation in range(len(population.genome_reporter.all_fitnesses))]
+
+    restored = Checkpointer.restore_checkpoint(checkpoint, neat_config)
+    restored.run(evaluate, 1)
+    all_fitnesses = restored.genome_reporter.all_fitnesses
+    assert len(all_fitnesses) == len(history) + 1
+    for generation, fitnesses in enumerate(history):
+        np.testing.assert_array_equal(all_fitnesses.generation(generation), fitnesses)
+
+
+def test_neat_checkpoint_restored_as_array_genomes(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "FIXED_TOPOLOGY_ENGINE", False)
+    population, checkpoint = trained_population(main.load_neat_config("config_monster.txt"), tmp_path)
+
+    monkeypatch.setattr(config, "FIXED_TOPOLOGY_ENGINE", True)
+    neat_config = main.load_neat_config("config_monster.txt")
+    restored = Checkpointer.restore_checkpoint(checkpoint, neat_config)
+    for key, genome in population.population.items():
+        assert isinstance(restored.population[key], ArrayGenome)
+        assert genes(restored.population[key].to_genome(neat_config.genome_config)) == genes(genome)
+
+
+def test_array_checkpoint_restored_as_neat_genomes(tmp_path):
+    population, checkpoint = trained_population(main.load_neat_config("config_monster.txt"), tmp_path)
+    neat_config = default_neat_config("config_monster.txt")
+    restored = Checkpointer.restore_checkpoint(checkpoint, neat_config)
+    for key, genome in population.population.items():
+        assert genes(restored.population[key]) == genes(genome.to_genome(neat_config.genome_config))
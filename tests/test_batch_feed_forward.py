@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+
+from neat_modified.batch_feed_forward import BatchFeedForwardNetwork
+from neat_modified.feed_forward import FeedForwardNetwork
+
+
+def mutated_genomes(neat_config, nb_genomes, seed=1):
+    """Genomes of various topologies (hidden nodes, disabled connections, several activation functions)."""
+    genome_config = neat_config.genome_config
+    genome_config.activation_options = ["sigmoid", "tanh", "relu", "gauss"]
+    genome_config.activation_mutate_rate = 0.3
+    random.seed(seed)
+    genomes = []
+    for key in range(nb_genomes):
+        genome = neat_config.genome_type(key)
+        genome.configure_new(genome_config)
+        for _ in range(random.randint(0, 30)):
+            genome.mutate(genome_config)
+        genomes.append(genome)
+    return genomes
+
+
+def random_inputs(neat_config, nb_genomes):
+    return np.random.default_rng(0).uniform(-50, 50, (nb_genomes, neat_config.genome_config.num_inputs))
+
+
+def test_batch_activate_matches_networks(neat_config):
+    genomes = mutated_genomes(neat_config, 40)
+    # A genome whose aggregation isn't vectorised is activated by its own network
+    genomes[3].nodes[0].aggregation = "product"
+    inputs = random_inputs(neat_config, len(genomes))
+    expected = [FeedForwardNetwork.create(genome, neat_config).activate(list(x)) for genome, x in zip(genomes, inputs)]
+
+    batch = BatchFeedForwardNetwork.create(genomes, neat_config)
+    np.testing.assert_allclose(batch.activate(inputs), expected, rtol=1e-12, atol=1e-12)
+
+
+def test_batch_activate_subset(neat_config):
+    genomes = mutated_genomes(neat_config, 20)
+    inputs = random_inputs(neat_config, len(genomes))
+    batch = BatchFeedForwardNetwork.create(genomes, neat_config)
+    ids = np.array([5, 3, 17, 2])
+    np.testing.assert_allclose(batch.activate(inputs[ids], ids), batch.activate(inputs)[ids], rtol=1e-12, atol=1e-12)
+    assert batch.activate(inputs[:0], ids[:0]).shape == (0, len(neat_config.genome_config.output_keys))
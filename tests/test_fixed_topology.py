@@ -0,0 +1,50 @@
+import random
+
+import numpy as np
+from neat.reporting import ReporterSet
+from neat.species import DefaultSpeciesSet
+
+import config
+import main
+from neat_modified.batch_feed_forward import BatchFeedForwardNetwork
+from neat_modified.fixed_topology import FixedTopologyNetworks, FixedTopologySpeciesSet, is_fixed_topology
+from neat_modified.population import Population
+
+
+def evolved_population(tmp_path, nb_generations=3):
+    """ArrayGenomes of a monster population (fixed topology) evolved a few generations with random fitnesses."""
+    random.seed(config.RUN_SEED)
+    neat_config = main.load_neat_config("config_monster.txt")
+    assert is_fixed_topology(neat_config.genome_config)
+    population = Population(neat_config, str(tmp_path / "checkpoint_monster"))
+    for generation in range(nb_generations):
+        for genome in population.population.values():
+            genome.fitness = random.random()
+        population.population = population.reproduction.reproduce(neat_config, population.species,
+                                                                  neat_config.pop_size, generation)
+        population.species.speciate(neat_config, population.population, generation)
+    return list(population.population.values()), neat_config
+
+
+def test_fixed_topology_networks_match_neat_networks(tmp_path):
+    genomes, neat_config = evolved_population(tmp_path)
+    nets = BatchFeedForwardNetwork.create(genomes, neat_config)
+    assert isinstance(nets, FixedTopologyNetworks)
+    neat_nets = BatchFeedForwardNetwork.create([genome.to_genome(neat_config.genome_config) for genome in genomes],
+                                               neat_config)
+    inputs = np.random.default_rng(0).uniform(-50, 50, (len(genomes), len(nets.input_nodes)))
+    np.testing.assert_allclose(nets.activate(inputs), neat_nets.activate(inputs), rtol=1e-12, atol=1e-12)
+
+
+def test_fixed_topology_species_match_neat(tmp_path):
+    genomes, neat_config = evolved_population(tmp_path)
+    neat_config.species_set_config.compatibility_threshold = 0.2
+    population = {genome.key: genome for genome in genomes}
+    neat_population = {genome.key: genome.to_genome(neat_config.genome_config) for genome in genomes}
+    species_sets = [FixedTopologySpeciesSet(neat_config.species_set_config, ReporterSet()),
+                    DefaultSpeciesSet(neat_config.species_set_config, ReporterSet())]
+    species_sets[0].speciate(neat_config, population, 1)
+    species_sets[1].speciate(neat_config, neat_population, 1)
+    members = [{sid: sorted(s.members) for sid, s in species_set.species.items()} for species_set in species_sets]
+    assert len(members[1]) > 1
+    assert members[0] == members[1]
@@ -0,0 +1,40 @@
+import random
+
+import neat
+from neat.reporting import ReporterSet
+from neat.species import DefaultSpeciesSet
+
+from conftest import default_neat_config
+from neat_modified.species import VectorizedSpeciesSet
+
+
+def species_history(neat_config, species_set_type, nb_generations, seed=1):
+    """Members of each species at each generation of a run with random fitnesses and the given species set."""
+    random.seed(seed)
+    reporters = ReporterSet()
+    stagnation = neat_config.stagnation_type(neat_config.stagnation_config, reporters)
+    reproduction = neat.DefaultReproduction(neat_config.reproduction_config, reporters, stagnation)
+    species_set = species_set_type(neat_config.species_set_config, reporters)
+    population = reproduction.create_new(neat_config.genome_type, neat_config.genome_config, neat_config.pop_size)
+    history = []
+    for generation in range(nb_generations):
+        species_set.speciate(neat_config, population, generation)
+        history.append({sid: sorted(s.members) for sid, s in species_set.species.items()})
+        for genome in population.values():
+            genome.fitness = random.random()
+        population = reproduction.reproduce(neat_config, species_set, neat_config.pop_size, generation)
+        if not population:
+            break
+    return history
+
+
+def test_vectorized_species_match_neat(neat_config):
+    assert species_history(neat_config, VectorizedSpeciesSet, 8) == species_history(neat_config, DefaultSpeciesSet, 8)
+
+
+def test_vectorized_species_match_neat_with_many_species():
+    neat_config = default_neat_config("config_player.txt")
+    neat_config.species_set_config.compatibility_threshold = 1.0
+    expected = species_history(neat_config, DefaultSpeciesSet, 8)
+    assert max(len(species) for species in expected) > 1
+    assert species_history(neat_config, VectorizedSpeciesSet, 8) == expected
@@ -0,0 +1,54 @@
+import random
+
+import numpy as np
+import pytest
+
+import config
+import main
+from evaluation import create_game, create_player_trajectory
+from neat_modified.batch_feed_forward import BatchFeedForwardNetwork
+from neat_modified.genome_reporter import GenomeReporter
+from neat_modified.network_cache import network_cache
+from neat_modified.population import Population
+from vectorized_game import VectorizedDuelGame, VectorizedGame
+
+
+def new_genomes(config_file, tmp_path, nb_genomes):
+    """The first genomes of a new population of the training config (ArrayGenomes for the fixed-topology monsters)."""
+    random.seed(config.RUN_SEED)
+    neat_config = main.load_neat_config(config_file)
+    population = Population(neat_config, str(tmp_path / config_file))
+    return sorted(population.population.values(), key=lambda genome: genome.key)[:nb_genomes], neat_config
+
+
+def episode_fitnesses(vectorized, training_number, genomes, neat_config, training_nets, monkeypatch):
+    """Fitness of the genomes and number of steps of the first episode, simulated by Game or VectorizedGame."""
+    monkeypatch.setattr(config, "VECTORIZED_SIMULATION", vectorized)
+    for genome in genomes:
+        genome.fitness = 0
+    player_trajectory = create_player_trajectory(training_number, config.RUN_SEED, 1, 1, training_nets)
+    game = create_game(1, training_number, 1, len(genomes), training_nets, player_trajectory, config.RUN_SEED)
+    assert isinstance(game, (VectorizedGame, VectorizedDuelGame)) == vectorized
+    game.run_episode(BatchFeedForwardNetwork.create(genomes, neat_config), genomes, GenomeReporter(), None)
+    return [genome.fitness for genome in genomes], game.current_step
+
+
+@pytest.mark.parametrize("training_number, training_nets", [(1, False), (1, True), (2, True)],
+                         ids=["monsters-random-player", "monsters-player-nets", "players-monster-nets"])
+def test_vectorized_game_matches_game(tmp_path, monkeypatch, training_number, training_nets):
+    monkeypatch.setattr(config, "MAX_STEP_EPISODE", 500)
+    trained, opponent = "config_monster.txt", "config_player.txt"
+    if training_number % 2 == 0:
+        trained, opponent = opponent, trained
+    genomes, neat_config = new_genomes(trained, tmp_path, 30)
+    nets = []
+    if training_nets:
+        opponent_genomes, opponent_config = new_genomes(opponent, tmp_path, 3)
+        nets = [network_cache.get(genome, opponent_config) for genome in opponent_genomes]
+
+    fitnesses, nb_steps = episode_fitnesses(False, training_number, genomes, neat_config, nets, monkeypatch)
+    vectorized_fitnesses, vectorized_nb_steps = episode_fitnesses(True, training_number, genomes, neat_config, nets,
+                                                                  monkeypatch)
+    assert np.count_nonzero(fitnesses)
+    assert vectorized_nb_steps == nb_steps
+    assert vectorized_fitnesses == fitnesses
@@ -0,0 +1,55 @@
+"""
+Compact recording of the trajectories of the genomes during the episodes : the position of the entity of each genome
+and of its opponent, and the action of the genome, at each step. The trajectories of the most fit genomes are kept in
+trajectory files (see neat_modified.trajectory_store) and replayed by DemoGame without any simulation.
+"""
+import numpy as np
+
+# Action (index of the move, in the order of Monster.move) of a move (y, x) in {-1, 0, 1}², 8 is no move
+ACTION_OF_MOVE = np.array([[4, 0, 5], [2, 8, 3], [6, 1, 7]], dtype=np.uint8)
+
+
+def player_actions(outputs):
+    """Actions of the players from the outputs of their nets, as a (N, 2) array (same thresholds as Player.move)."""
+    outputs = np.asarray(outputs, dtype=float).reshape(-1, 2)
+    moves_y = (outputs[:, 0] <= 4 / 10).astype(int) - (outputs[:, 0] >= 6 / 10)
+    moves_x = (outputs[:, 1] >= 6 / 10).astype(int) - (outputs[:, 1] <= 4 / 10)
+    return ACTION_OF_MOVE[moves_y + 1, moves_x + 1]
+
+
+class TrajectoryRecorder:
+    """
+    Trajectories of all the genomes of an episode, in preallocated (step, genome) arrays : the positions (rect.topleft)
+    are int16 and the actions uint8, so a step of a genome takes 9 bytes. The row i is the state after the step i + 1.
+
+    A genome is recorded until its entity is removed from the episode, lengths is its number of recorded steps.
+    """
+
+    def __init__(self, nb_genomes: int, max_steps: int):
+        self.positions = np.zeros((max_steps, nb_genomes, 2), dtype=np.int16)
+        self.opponent_positions = np.zeros((max_steps, nb_genomes, 2), dtype=np.int16)
+        self.actions = np.zeros((max_steps, nb_genomes), dtype=np.uint8)
+        self.lengths = np.zeros(nb_genomes, dtype=np.int64)
+
+    def record(self, step: int, ids, x, y, opponent_x, opponent_y, actions):
+        """Records a step (starting at 1) of the genomes of the given ids (index of the genomes in the episode)."""
+        self.positions[step - 1, ids, 0] = x
+        self.positions[step - 1, ids, 1] = y
+        self.opponent_positions[step - 1, ids, 0] = opponent_x
+        self.opponent_positions[step - 1, ids, 1] = opponent_y
+        self.actions[step - 1, ids] = actions
+        self.lengths[ids] = step
+
+    def trim(self, nb_steps: int):
+        """Drops the steps after the end of the episode (nb_steps steps) and returns the recorder."""
+        self.positions = self.positions[:nb_steps].copy()
+        self.opponent_positions = self.opponent_positions[:nb_steps].copy()
+        self.actions = self.actions[:nb_steps].copy()
+        return self
+
+    def genome_trajectory(self, index: int):
+        """Positions, opponent positions and actions of the genome of the given index during the episode."""
+        length = self.lengths[index]
+        return (
+            self.positions[:length, index], self.opponent_positions[:length, index], self.actions[:length, index]
+        )
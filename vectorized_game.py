@@ -0,0 +1,352 @@
+import numpy as np
+
+import config
+from game import Game
+from neat_modified.batch_feed_forward import BatchFeedForwardNetwork
+from trajectory import player_actions
+
+
+def local_view_windows(grid):
+    """
+    Local view (without the player) of a monster centered on each cell of the grid, see
+    Monster.get_local_view_optimized. Returns a (lines, columns, view_size²) view of the grid.
+    """
+    size_grid = (grid.shape[0] + 2) // 3
+    view_size = 2 * (size_grid - 2) + 1
+    windows = np.lib.stride_tricks.sliding_window_view(grid, (view_size, view_size))
+    return windows.reshape(windows.shape[0], windows.shape[1], view_size * view_size)
+
+
+def get_local_views(windows, grid, rect_x, rect_y, player_rect_x, player_rect_y):
+    """
+    Returns the flattened local views of the monsters of rects (rect_x, rect_y) looking at the players of rects
+    (player_rect_x, player_rect_y) : the same player for all the monsters or one player per monster (same as
+    Monster.get_local_view_optimized).
+    """
+    size_grid = (grid.shape[0] + 2) // 3
+    half_view = size_grid - 2
+    view_size = 2 * half_view + 1
+
+    line_player = (player_rect_y + config.IMAGE_SIZE[1] // 2 - config.WINDOW_STATS_HEIGHT) // config.IMAGE_SIZE[0] \
+        + size_grid - 1
+    column_player = (player_rect_x + config.IMAGE_SIZE[0] // 2) // config.IMAGE_SIZE[0] + size_grid - 1
+    lines = (rect_y + config.IMAGE_SIZE[1] // 2 - config.WINDOW_STATS_HEIGHT) // config.IMAGE_SIZE[0] + size_grid - 1
+    columns = (rect_x + config.IMAGE_SIZE[0] // 2) // config.IMAGE_SIZE[0] + size_grid - 1
+
+    local_views = windows[lines - half_view, columns - half_view]
+    # Position of the player in each local view
+    line_in_view = line_player - lines + half_view
+    column_in_view = column_player - columns + half_view
+    visible = (line_in_view >= 0) & (line_in_view < view_size) & (column_in_view >= 0) & (column_in_view < view_size)
+    local_views[np.flatnonzero(visible), (line_in_view * view_size + column_in_view)[visible]] = 1
+    return local_views
+
+
+def move_monsters(pos_x, pos_y, rect_x, rect_y, next_moves):
+    """
+    Moves the monsters of the given positions and rects (updated in place) by their next moves (index of the move, in
+    the order of Monster.move). A direction is blocked when the monster touches the corresponding border, a diagonal
+    move falls back on its free direction (see Monster.move_up_left...).
+    """
+    moves_y, moves_x = VectorizedGame.MOVES_Y[next_moves], VectorizedGame.MOVES_X[next_moves]
+    can_move_y = ((moves_y < 0) & (rect_y > config.WINDOW_STATS_HEIGHT)) | \
+                 ((moves_y > 0) & (rect_y + config.IMAGE_SIZE[1] < config.WINDOW_HEIGHT))
+    can_move_x = ((moves_x < 0) & (rect_x > 0)) | \
+                 ((moves_x > 0) & (rect_x + config.IMAGE_SIZE[0] < config.WINDOW_WIDTH))
+    speed = np.where(can_move_y & can_move_x, config.SPEED / 2 ** 0.5, config.SPEED)
+    pos_y += np.where(can_move_y, moves_y * speed, 0)
+    pos_x += np.where(can_move_x, moves_x * speed, 0)
+    rect_x[:] = np.rint(pos_x)
+    rect_y[:] = np.rint(pos_y)
+
+
+def move_players(pos_x, pos_y, rect_x, rect_y, outputs):
+    """
+    Moves the players of the given positions and rects (updated in place) by the outputs of their nets (see
+    Player.move) : a straight move needs its direction free, a diagonal move both.
+    """
+    moves_y = (outputs[:, 0] <= 4 / 10).astype(int) - (outputs[:, 0] >= 6 / 10)
+    moves_x = (outputs[:, 1] >= 6 / 10).astype(int) - (outputs[:, 1] <= 4 / 10)
+    can_move_y = ((moves_y < 0) & (rect_y > config.WINDOW_STATS_HEIGHT)) | \
+                 ((moves_y > 0) & (rect_y + config.IMAGE_SIZE[1] < config.WINDOW_HEIGHT))
+    can_move_x = ((moves_x < 0) & (rect_x > 0)) | \
+                 ((moves_x > 0) & (rect_x + config.IMAGE_SIZE[0] < config.WINDOW_WIDTH))
+    diagonal = (moves_y != 0) & (moves_x != 0)
+    move = np.where(diagonal, can_move_y & can_move_x, can_move_y | can_move_x)
+    speed = np.where(diagonal, config.SPEED / 2 ** 0.5, config.SPEED)
+    pos_y += np.where(move, moves_y * speed, 0)
+    pos_x += np.where(move, moves_x * speed, 0)
+    rect_x[:] = np.rint(pos_x)
+    rect_y[:] = np.rint(pos_y)
+
+
+def player_inputs(rect_x, rect_y, player_x, player_y):
+    """Inputs of the nets of the players of rects (player_x, player_y) facing the monsters of rects (rect_x, rect_y)."""
+    return np.stack([rect_x - player_x, rect_y - player_y, player_x, player_y,
+                     config.WINDOW_WIDTH - player_x, config.WINDOW_HEIGHT - player_y], axis=1)
+
+
+class VectorizedGame(Game):
+    """
+    Game whose monsters are simulated as a struct of arrays : the positions, lives and fitnesses of all the monsters
+    are NumPy arrays and each step (local views, network activation, moves, wall damage, collisions and removals) is a
+    few array operations instead of a Python loop over the Monster sprites.
+
+    It is a drop-in for Game.run_episode (same rules as Monster.move, Monster.check_hit_wall and
+    Game.update_monsters, same fitnesses) and needs a batched network (BatchFeedForwardNetwork). Against the training
+    nets of the players, the positions of the player of each duel are arrays too and all the players are activated at
+    once.
+    The sprites are only used to initialise the arrays and are synchronised back for the display.
+    """
+
+    # Direction (y, x) of each output of the monster networks, in the order of Monster.move
+    MOVES_Y = np.array([-1, 1, 0, 0, -1, -1, 1, 1])
+    MOVES_X = np.array([0, 0, -1, 1, -1, 1, -1, 1])
+
+    def __init__(self, generation: int, training_number: int, episode: int, pop_size: int, seed=None):
+        super().__init__(generation, training_number, episode, pop_size, seed)
+        self.monsters = []
+        self.ids = None
+        self.pos_x = None
+        self.pos_y = None
+        self.rect_x = None
+        self.rect_y = None
+        self.life = None
+        self.fitness = None
+        self.alive = None
+        self.player_life = None
+        self.local_views = None
+        # Players of the duels (in the order of the monsters) and their shared training net, None for the random player
+        self.players = None
+        self.player_nets = None
+        self.player_pos_x = None
+        self.player_pos_y = None
+        self.player_rect_x = None
+        self.player_rect_y = None
+
+    def init_arrays(self, ge):
+        self.monsters = self.all_monsters.sprites()
+        self.ids = np.array([monster.id for monster in self.monsters], dtype=int)
+        self.pos_x = np.array([monster.pos.x for monster in self.monsters])
+        self.pos_y = np.array([monster.pos.y for monster in self.monsters])
+        self.rect_x = np.array([monster.rect.x for monster in self.monsters])
+        self.rect_y = np.array([monster.rect.y for monster in self.monsters])
+        self.life = np.array([monster.life for monster in self.monsters])
+        self.fitness = np.array([ge[monster_id].fitness for monster_id in self.ids], dtype=float)
+        self.alive = np.ones(len(self.monsters), dtype=bool)
+        # Life of the player of each monster (by id), the lives of the players of the duels start the same
+        self.player_life = np.array(self.player.life)
+        if self.player.net_player is not None:
+            self.players = [self.players_by_id[monster.id] for monster in self.monsters]
+            self.player_nets = BatchFeedForwardNetwork.from_networks([self.player.net_player])
+            self.player_pos_x = np.array([player.pos.x for player in self.players])
+            self.player_pos_y = np.array([player.pos.y for player in self.players])
+            self.player_rect_x = np.array([player.rect.x for player in self.players])
+            self.player_rect_y = np.array([player.rect.y for player in self.players])
+
+        self.local_views = local_view_windows(self.grid)
+
+    def run_episode(self, nets, ge, genome_reporter, screen):
+        self.init_arrays(ge)
+        ge, nets = super().run_episode(nets, ge, genome_reporter, screen)
+        for monster_id, fitness in zip(self.ids, self.fitness):
+            ge[monster_id].fitness = float(fitness)
+        self.sync_sprites()
+        return ge, nets
+
+    def move_net_players(self, indexes):
+        """
+        Moves the players of the duels of the given monsters with the player net, each player seeing the monster of
+        its duel (see Game.move_net_players), and returns their rects.
+        """
+        player_x, player_y = self.player_rect_x[indexes], self.player_rect_y[indexes]
+        outputs = self.player_nets.activate(player_inputs(self.rect_x[indexes], self.rect_y[indexes], player_x,
+                                                          player_y), np.zeros(len(indexes), dtype=int))
+        player_pos_x, player_pos_y = self.player_pos_x[indexes], self.player_pos_y[indexes]
+        move_players(player_pos_x, player_pos_y, player_x, player_y, outputs)
+        self.player_pos_x[indexes], self.player_pos_y[indexes] = player_pos_x, player_pos_y
+        self.player_rect_x[indexes], self.player_rect_y[indexes] = player_x, player_y
+        return player_x, player_y
+
+    def update_monsters(self, nets, ge):
+        indexes = np.flatnonzero(self.alive)
+        if self.player_nets is None:
+            self.move_random_player()
+            player_x, player_y = self.player.rect.x, self.player.rect.y
+        else:
+            player_x, player_y = self.move_net_players(indexes)
+        local_views = get_local_views(self.local_views, self.grid, self.rect_x[indexes], self.rect_y[indexes],
+                                      player_x, player_y)
+        next_moves = np.argmax(self.activate_nets(nets, local_views, self.ids[indexes]), axis=1)
+
+        pos_x, pos_y = self.pos_x[indexes], self.pos_y[indexes]
+        rect_x, rect_y = self.rect_x[indexes], self.rect_y[indexes]
+        move_monsters(pos_x, pos_y, rect_x, rect_y, next_moves)
+        self.pos_x[indexes], self.pos_y[indexes] = pos_x, pos_y
+        self.rect_x[indexes], self.rect_y[indexes] = rect_x, rect_y
+        rect_right, rect_bottom = rect_x + config.IMAGE_SIZE[0], rect_y + config.IMAGE_SIZE[1]
+
+        # Damages of the walls
+        hit_wall = (rect_y <= config.WINDOW_STATS_HEIGHT) | (rect_bottom >= config.WINDOW_HEIGHT) | \
+                   (rect_x <= 0) | (rect_right >= config.WINDOW_WIDTH)
+        self.life[indexes] -= hit_wall
+
+        # Collisions with the player
+        collide = (rect_x < player_x + config.IMAGE_SIZE[0]) & (player_x < rect_right) & \
+                  (rect_y < player_y + config.IMAGE_SIZE[1]) & (player_y < rect_bottom)
+        self.player_life[self.ids[indexes[collide]]] -= 1
+        self.fitness[indexes[collide]] += 0.1
+
+        min_dist_wall = np.minimum.reduce([
+            rect_x, rect_y, config.WINDOW_WIDTH - rect_right, config.WINDOW_HEIGHT - rect_bottom
+        ])
+        self.fitness[indexes[min_dist_wall == 0]] -= 0.01
+
+        # Removals
+        dead = self.life[indexes] == 0
+        kill = self.player_life[self.ids[indexes]] == 0
+        self.monster_removed += np.count_nonzero(dead)
+        self.player_killed += np.count_nonzero(kill)
+        self.fitness[indexes[kill]] += (config.MAX_STEP_EPISODE - self.current_step) / 25
+        self.alive[indexes[dead | kill]] = False
+
+        if self.recorder is not None:
+            self.recorder.record(self.current_step, self.ids[indexes], rect_x, rect_y, player_x, player_y, next_moves)
+        return ge, nets
+
+    def sync_sprites(self):
+        """Copies the state of the arrays into the sprites (for the display)."""
+        for index, monster in enumerate(self.monsters):
+            monster.pos.update(self.pos_x[index], self.pos_y[index])
+            monster.rect.topleft = int(self.rect_x[index]), int(self.rect_y[index])
+            monster.life = int(self.life[index])
+            if not self.alive[index]:
+                self.all_monsters.remove(monster)
+        if self.players is None:
+            self.player.life = self.player_life.tolist()
+            return
+        for index, (player, monster_id) in enumerate(zip(self.players, self.ids.tolist())):
+            player.pos.update(self.player_pos_x[index], self.player_pos_y[index])
+            player.rect.topleft = int(self.player_rect_x[index]), int(self.player_rect_y[index])
+            player.life[monster_id] = int(self.player_life[monster_id])
+            if not self.alive[index]:
+                self.all_players_alive.remove(player)
+
+    def display_game(self, screen):
+        self.sync_sprites()
+        super().display_game(screen)
+
+
+class VectorizedDuelGame(Game):
+    """
+    Player training simulated as a struct of arrays : each player duels the monster of the same id, and the positions,
+    lives and fitnesses of all the duels are NumPy arrays. At each step, the inputs of all the players are one (N, 6)
+    matrix activated at once, and the moves, collisions and lives of all the duels are updated with array operations.
+
+    It is a drop-in for Game.run_episode (same rules as Player.move, Monster.move and Game.update_players, same
+    fitnesses) and needs a batched network (BatchFeedForwardNetwork). The monsters use the training net they share,
+    or all make the same random move (from the random generator of the game) when there is none.
+    The sprites are only used to initialise the arrays and are synchronised back for the display.
+    """
+
+    def __init__(self, generation: int, training_number: int, episode: int, pop_size: int, seed=None):
+        super().__init__(generation, training_number, episode, pop_size, seed)
+        self.players = []
+        self.monsters = []
+        self.ids = None
+        self.player_pos_x = None
+        self.player_pos_y = None
+        self.player_rect_x = None
+        self.player_rect_y = None
+        self.player_life = None
+        self.pos_x = None
+        self.pos_y = None
+        self.rect_x = None
+        self.rect_y = None
+        self.fitness = None
+        self.alive = None
+        self.monster_nets = None
+        self.local_views = None
+
+    def init_arrays(self, ge):
+        self.players = self.all_players_alive.sprites()
+        self.monsters = [self.monsters_by_id[player.id] for player in self.players]
+        self.ids = np.array([player.id for player in self.players], dtype=int)
+        self.player_pos_x = np.array([player.pos.x for player in self.players])
+        self.player_pos_y = np.array([player.pos.y for player in self.players])
+        self.player_rect_x = np.array([player.rect.x for player in self.players])
+        self.player_rect_y = np.array([player.rect.y for player in self.players])
+        self.player_life = np.array([player.life[0] for player in self.players])
+        self.pos_x = np.array([monster.pos.x for monster in self.monsters])
+        self.pos_y = np.array([monster.pos.y for monster in self.monsters])
+        self.rect_x = np.array([monster.rect.x for monster in self.monsters])
+        self.rect_y = np.array([monster.rect.y for monster in self.monsters])
+        self.fitness = np.array([ge[player_id].fitness for player_id in self.ids], dtype=float)
+        self.alive = np.ones(len(self.players), dtype=bool)
+
+        # All the monsters share the same training net
+        if self.monsters and self.monsters[0].net_monster is not None:
+            self.monster_nets = BatchFeedForwardNetwork.from_networks([self.monsters[0].net_monster])
+        self.local_views = local_view_windows(self.grid)
+
+    def run_episode(self, nets, ge, genome_reporter, screen):
+        self.init_arrays(ge)
+        ge, nets = super().run_episode(nets, ge, genome_reporter, screen)
+        for player_id, fitness in zip(self.ids, self.fitness):
+            ge[player_id].fitness = float(fitness)
+        self.sync_sprites()
+        return ge, nets
+
+    def update_players(self, nets, ge):
+        indexes = np.flatnonzero(self.alive)
+        player_x, player_y = self.player_rect_x[indexes], self.player_rect_y[indexes]
+        rect_x, rect_y = self.rect_x[indexes], self.rect_y[indexes]
+        outputs = self.activate_nets(nets, player_inputs(rect_x, rect_y, player_x, player_y), self.ids[indexes])
+
+        player_pos_x, player_pos_y = self.player_pos_x[indexes], self.player_pos_y[indexes]
+        move_players(player_pos_x, player_pos_y, player_x, player_y, outputs)
+        self.player_pos_x[indexes], self.player_pos_y[indexes] = player_pos_x, player_pos_y
+        self.player_rect_x[indexes], self.player_rect_y[indexes] = player_x, player_y
+
+        # Moves of the monsters, which see the new positions of their players
+        if self.monster_nets is None:
+            next_moves = np.full(len(indexes), self.rng.integers(0, 8))
+        else:
+            local_views = get_local_views(self.local_views, self.grid, rect_x, rect_y, player_x, player_y)
+            next_moves = np.argmax(self.monster_nets.activate(local_views, np.zeros(len(indexes), dtype=int)), axis=1)
+        pos_x, pos_y = self.pos_x[indexes], self.pos_y[indexes]
+        move_monsters(pos_x, pos_y, rect_x, rect_y, next_moves)
+        self.pos_x[indexes], self.pos_y[indexes] = pos_x, pos_y
+        self.rect_x[indexes], self.rect_y[indexes] = rect_x, rect_y
+
+        # Collisions and lives
+        collide = (rect_x < player_x + config.IMAGE_SIZE[0]) & (player_x < rect_x + config.IMAGE_SIZE[0]) & \
+                  (rect_y < player_y + config.IMAGE_SIZE[1]) & (player_y < rect_y + config.IMAGE_SIZE[1])
+        self.player_life[indexes[collide]] -= 1
+        self.fitness[indexes[collide]] += 0.1
+        self.fitness[indexes] += 0.1
+
+        dead = self.player_life[indexes] == 0
+        self.player_killed += np.count_nonzero(dead)
+        self.alive[indexes[dead]] = False
+
+        if self.recorder is not None:
+            self.recorder.record(self.current_step, self.ids[indexes], player_x, player_y, rect_x, rect_y,
+                                 player_actions(outputs))
+        return ge, nets
+
+    def sync_sprites(self):
+        """Copies the state of the arrays into the sprites (for the display)."""
+        for index, (player, monster) in enumerate(zip(self.players, self.monsters)):
+            player.pos.update(self.player_pos_x[index], self.player_pos_y[index])
+            player.rect.topleft = int(self.player_rect_x[index]), int(self.player_rect_y[index])
+            player.life[0] = int(self.player_life[index])
+            monster.pos.update(self.pos_x[index], self.pos_y[index])
+            monster.rect.topleft = int(self.rect_x[index]), int(self.rect_y[index])
+            if not self.alive[index]:
+                self.all_players_alive.remove(player)
+                self.all_monsters.remove(monster)
+
+    def display_game(self, screen):
+        self.sync_sprites()
+        super().display_game(screen)